@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from compiled_model import compile_models, compiled_dir_name
+from recommender import MODEL_FILES, Recommender, default_model_files
+
+# Artefacts de service : tout ce dont un worker a besoin pour recommander,
+# en .npy ouverts en mmap_mode='r'. Les pages restent dans le cache du
+# système et sont partagées par tous les processus (une seule copie physique
+# quel que soit le nombre de workers) ; rien n'est recalculé au démarrage.
+#
+#   <dir>/arrays/      tableaux du Recommender (export_arrays)
+#   <dir>/compiled/    modèles compilés (compiled_model.py), un dossier par modèle
+#   <dir>/models/      pickles des modèles, pour ceux dont la forme compilée
+#                      est plus lente (ensembles d'arbres sur tout un catalogue)
+#   <dir>/manifest.json
+#
+# Chaque worker charge sa propre copie des pickles utilisés : seuls les
+# tableaux et les modèles compilés sont partagés.
+#
+# Placer <dir> sous /dev/shm donne des artefacts en mémoire partagée sans
+# autre chemin de code.
+ARRAYS_DIR = 'arrays'
+COMPILED_DIR = 'compiled'
+MODELS_DIR = 'models'
+MANIFEST_FILE = 'manifest.json'
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def export_artifacts(recommender, directory, model_files=None):
+    model_files = recommender.model_files if model_files is None else model_files
+    arrays_dir = os.path.join(directory, ARRAYS_DIR)
+    compiled_dir = os.path.join(directory, COMPILED_DIR)
+    models_dir = os.path.join(directory, MODELS_DIR)
+
+    start = time.perf_counter()
+    recommender.export_arrays(arrays_dir)
+    compile_models(model_files, compiled_dir)
+    os.makedirs(models_dir, exist_ok=True)
+    for file in model_files.values():
+        shutil.copyfile(file, os.path.join(models_dir, os.path.basename(file)))
+    manifest = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'models': {name: compiled_dir_name(file) for name, file in model_files.items()},
+        'model_files': {name: f'{MODELS_DIR}/{os.path.basename(file)}' for name, file in model_files.items()},
+        'model_sources': {name: os.path.abspath(file) for name, file in model_files.items()},
+        'users': len(recommender.user_positions),
+        'jobs': len(recommender.job_positions),
+        'bytes': {ARRAYS_DIR: _directory_size(arrays_dir), COMPILED_DIR: _directory_size(compiled_dir),
+                  MODELS_DIR: _directory_size(models_dir)},
+        'export_s': round(time.perf_counter() - start, 3)
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# Recommender adossé aux artefacts. warm=True ouvre aussi les modèles
+# (mmap pour les formes compilées, pickles sinon) pour que la première
+# requête ne paie rien.
+def load_artifacts(directory, warm=True, **kwargs):
+    with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    # Forme compilée ou pickle choisie par modèle (compiled_models, par défaut
+    # selon compiled_model.DEFAULT_KINDS) ; les artefacts sans pickles
+    # n'ont que les formes compilées
+    if 'model_files' in manifest:
+        model_files = {name: os.path.join(directory, file) for name, file in manifest['model_files'].items()}
+    else:
+        model_files = manifest['models']
+        if kwargs.get('compiled_models') is None:
+            kwargs['compiled_models'] = list(model_files)
+    recommender = Recommender.from_arrays(os.path.join(directory, ARRAYS_DIR),
+                                          model_files=model_files,
+                                          compiled_dir=os.path.join(directory, COMPILED_DIR), **kwargs)
+    if warm:
+        for name in recommender.model_files:
+            recommender.model(name)
+    return recommender
+
+
+# Mémoire du processus courant en Mo : Rss, Pss (pages partagées réparties
+# entre les processus qui les utilisent) et pages privées. Pss/privé ne sont
+# disponibles que sous Linux (/proc/self/smaps_rollup).
+def process_memory():
+    try:
+        with open('/proc/self/smaps_rollup', encoding='ascii') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        import resource
+        return {'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+    def mb(*names):
+        return sum(int(fields[name].split()[0]) for name in names if name in fields) / 1024
+
+    return {'rss_mb': mb('Rss'), 'pss_mb': mb('Pss'), 'private_mb': mb('Private_Clean', 'Private_Dirty')}
+
+
+# Démarrage d'un worker puis une requête : temps et mémoire du processus
+def _start_worker(source, model_name, user_id, top_n):
+    start = time.perf_counter()
+    if source == 'pickles':
+        recommender = Recommender()
+        recommender.warm()
+    else:
+        recommender = load_artifacts(source)
+    startup = time.perf_counter() - start
+    start = time.perf_counter()
+    recommender.recommend(model_name, user_id, top_n)
+    first_request = time.perf_counter() - start
+    return {'startup_s': startup, 'first_request_s': first_request, **process_memory()}
+
+
+# Démarrer n_workers processus en parallèle (ils restent vivants jusqu'à la
+# fin pour que les pages partagées soient comptées une seule fois dans Pss)
+def compare_worker_startup(directory, n_workers, model_name=None, user_id=None, top_n=5):
+    model_name = model_name or next(iter(MODEL_FILES))
+    if user_id is None:
+        user_id = str(np.load(os.path.join(directory, ARRAYS_DIR, 'user_ids.npy'), mmap_mode='r')[0])
+    report = {}
+    for source in ('pickles', directory):
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_start_worker, [source] * n_workers, [model_name] * n_workers,
+                                    [user_id] * n_workers, [top_n] * n_workers))
+        label = 'pickles' if source == 'pickles' else 'artifacts'
+        report[label] = {
+            'startup_s': float(np.mean([r['startup_s'] for r in results])),
+            'first_request_s': float(np.mean([r['first_request_s'] for r in results])),
+            **{key: float(sum(r[key] for r in results if key in r))
+               for key in ('rss_mb', 'pss_mb', 'private_mb') if key in results[0]}
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export memory-mapped serving artifacts shared by worker processes.")
+    parser.add_argument('--out', default='serving_artifacts')
+    parser.add_argument('--artifacts-dir', default=None, help="Export the models published in this directory (default: models/LATEST, else ./*.pkl)")
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--candidate-k', type=int, default=None,
+                        help="Also export the IVF candidate index for candidate_k scoring")
+    parser.add_argument('--check-workers', type=int, default=0,
+                        help="Start N workers from the pickles and from the artifacts and compare startup and memory")
+    args = parser.parse_args()
+
+    model_files = default_model_files(args.artifacts_dir, args.version)
+
+    recommender = Recommender(model_files=model_files, candidate_k=args.candidate_k)
+    try:
+        recommender.warm(models=False)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        exit(1)
+    manifest = export_artifacts(recommender, args.out)
+    print(f"Exported {manifest['users']} users, {manifest['jobs']} jobs and {len(manifest['models'])} models "
+          f"to {args.out} in {manifest['export_s']:.2f}s "
+          f"({sum(manifest['bytes'].values()) / 1e6:.1f} MB)")
+
+    if args.check_workers:
+        report = compare_worker_startup(args.out, args.check_workers)
+        print(f"\n{args.check_workers} workers (memory summed over workers, MB):")
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(pd.DataFrame(report).T.round(3))
@@ -0,0 +1,335 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from recommender import MODEL_FILES
+
+# Suite de benchmarks du pipeline, reproductible d'un commit à l'autre :
+#
+#   1. jeu de données généré par data_generation.py (graine et date de
+#      référence fixes) puis converti au schéma du Recommender ;
+#   2. les quatre modèles entraînés sur ce jeu (train_model.train) ;
+#   3. pour chaque modèle, dans un processus neuf (spawn) : démarrage à
+#      froid, latence par utilisateur de recommend (chemin de
+#      evaluate_model.recommend_jobs), débit d'un lot, durée de
+#      l'évaluation (evaluate_all_users) et pic de RSS du processus.
+#
+# Les jeux de données et modèles sont gardés dans --data-dir et réutilisés
+# tant que les paramètres ne changent pas ; seules les mesures sont
+# refaites. Les modèles notent les paramètres du jeu sur lequel ils ont été
+# entraînés et sont réentraînés si le jeu a été régénéré. Les résultats (JSON) portent le commit et l'environnement ;
+# --compare affiche l'écart avec un fichier de résultats précédent.
+
+SCALES = {'1k': (1000, 2000), '10k': (10000, 20000), '100k': (100000, 200000)}
+DEFAULT_SCALES = ('1k', '10k', '100k')
+REFERENCE_DATE = datetime(2025, 1, 1)
+# Incrémentée à chaque changement de la génération (2 : générateurs numpy par
+# bloc et tirages vectorisés des interactions)
+DATASET_VERSION = 2
+DATASET_FILE = 'dataset.json'
+SOURCE_FILES = {'users': 'users.csv', 'jobs': 'jobs.csv', 'interactions': 'interactions.csv'}
+
+# Durées des offres générées -> duration_days
+DURATION_DAYS = {'1 semaine': 7, '2 semaines': 14, '1 mois': 30, '3 mois': 90, '6 mois': 180, '1 an': 365}
+# Paires (utilisateur, offre) scorées par bloc : borne la mémoire des
+# matrices de features quand le catalogue est grand (blocs de 256
+# utilisateurs au plus, comme le Recommender par défaut)
+MAX_BLOCK_PAIRS = 1 << 21
+
+# Métriques comparées par --compare ; True si plus grand est meilleur
+COMPARED_METRICS = {
+    'cold_start_s': False, 'latency_p50_ms': False, 'latency_p95_ms': False,
+    'throughput_users_per_s': True, 'evaluation_s': False, 'peak_rss_mb': False
+}
+
+
+# 1. Jeux de données
+# ------------------
+
+# Schéma de data_generation.py -> schéma lu par le Recommender (data.py)
+def to_recommender_schema(table, chunk):
+    if table == 'users':
+        return chunk[['id', 'location', 'skills', 'languages', 'rating', 'jobsCompleted']]
+    if table == 'jobs':
+        salary = chunk['salary_range'].str.extract(r'(\d+)-(\d+)').astype(np.float64)
+        return pd.DataFrame({
+            'job_id': chunk['id'], 'title': chunk['title'], 'category': chunk['domain'],
+            'location': chunk['location'], 'required_skills': chunk['required_skills'],
+            'budget': salary.mean(axis=1), 'duration_days': chunk['duration'].map(DURATION_DAYS),
+            'created_at': chunk['posted_date']
+        })
+    interaction_type = np.where(chunk['applied'], 'applied', np.where(chunk['saved'], 'saved', 'viewed'))
+    return pd.DataFrame({'user_id': chunk['user_id'], 'job_id': chunk['job_id'],
+                         'interaction_type': interaction_type, 'timestamp': chunk['date']})
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Générer (ou réutiliser) le jeu de données d'une échelle ; renvoie ses
+# sources et sa description
+def build_dataset(directory, n_users, n_jobs, seed=42, workers=1, chunk_size=10000):
+    from data_generation import ChunkWriter, iter_dataset_chunks
+
+    params = {'version': DATASET_VERSION, 'users': n_users, 'jobs': n_jobs, 'seed': seed,
+              'reference_date': REFERENCE_DATE.strftime('%Y-%m-%d')}
+    sources = {table: os.path.abspath(os.path.join(directory, name)) for table, name in SOURCE_FILES.items()}
+    dataset = _read_json(os.path.join(directory, DATASET_FILE))
+    if dataset is not None and dataset['params'] == params and all(map(os.path.exists, sources.values())):
+        return sources, dataset
+
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    writers = {table: ChunkWriter(path, 'csv') for table, path in sources.items()}
+    try:
+        for table, chunk in iter_dataset_chunks(n_users, n_jobs, chunk_size, seed,
+                                                reference_date=REFERENCE_DATE, workers=workers):
+            writers[table].write(to_recommender_schema(table, chunk))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    dataset = {'params': params, 'rows': {table: writer.rows for table, writer in writers.items()},
+               'generation_s': time.perf_counter() - start}
+    with open(os.path.join(directory, DATASET_FILE), 'w', encoding='utf-8') as f:
+        json.dump(dataset, f, indent=2)
+    return sources, dataset
+
+
+# 2. Modèles
+# ----------
+
+# Entraîner (ou réutiliser) les quatre modèles d'une échelle : la dernière
+# version n'est réutilisée que si elle a été entraînée sur ce jeu de données
+# (dataset_params) avec la même graine, sinon les modèles sont effacés et
+# réentraînés
+def train_models(sources, store_dir, artifacts_dir, dataset_params, seed=42):
+    from recommender import Recommender
+    from train_model import latest_version, read_metadata, train, version_model_files
+
+    metadata = read_metadata(artifacts_dir) if latest_version(artifacts_dir) is not None else None
+    if metadata is None or metadata.get('dataset') != dataset_params or metadata['sampling']['seed'] != seed:
+        shutil.rmtree(artifacts_dir, ignore_errors=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            train(Recommender(sources, store_dir, cache_size=0), artifacts_dir, seed=seed, dataset=dataset_params)
+        metadata = read_metadata(artifacts_dir)
+    model_files = {name: os.path.abspath(path) for name, path in version_model_files(artifacts_dir).items()}
+    return model_files, {'version': latest_version(artifacts_dir), 'train_s': metadata['timings']['total_s'],
+                         'pairs': metadata['pairs']}
+
+
+# 3. Mesures
+# ----------
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _latency_report(seconds):
+    milliseconds = np.asarray(seconds) * 1000
+    report = {f'latency_p{p}_ms': float(np.percentile(milliseconds, p)) for p in (50, 95, 99)}
+    report['latency_mean_ms'] = float(milliseconds.mean())
+    return report
+
+
+# Un modèle, dans un processus neuf : le démarrage à froid et le pic de RSS
+# ne dépendent pas des mesures précédentes
+def _bench_model(task):
+    import evaluate_model
+    from instrumentation import instruments
+    from recommender import Recommender
+
+    (name, model_file, sources, store_dir, n_jobs, candidate_k, top_n,
+     latency_requests, batch_size, eval_users, seed) = task
+    block_size = min(256, max(1, MAX_BLOCK_PAIRS // (candidate_k or n_jobs)))
+    result = {'block_size': block_size}
+
+    start = time.perf_counter()
+    recommender = Recommender(sources, store_dir, model_files={name: model_file}, block_size=block_size,
+                              cache_size=0, candidate_k=candidate_k)
+    with contextlib.redirect_stdout(io.StringIO()):
+        cold_start = recommender.warm()
+    result['cold_start_s'] = time.perf_counter() - start
+    result['cold_start'] = cold_start
+
+    rng = np.random.default_rng(seed)
+    user_ids = recommender.users_df['id'].astype(str).to_numpy()
+    sample = rng.choice(user_ids, size=min(latency_requests + 1, len(user_ids)), replace=False).tolist()
+    recommender.recommend(name, sample[0], top_n)
+    latencies = []
+    for user_id in sample[1:]:
+        start = time.perf_counter()
+        recommender.recommend(name, user_id, top_n)
+        latencies.append(time.perf_counter() - start)
+    result.update(_latency_report(latencies))
+
+    batch = rng.choice(user_ids, size=min(batch_size, len(user_ids)), replace=False).tolist()
+    start = time.perf_counter()
+    recommender.recommend_indices(name, batch, top_n)
+    seconds = time.perf_counter() - start
+    result['batch_users'] = len(batch)
+    result['throughput_users_per_s'] = len(batch) / seconds
+    result['throughput_pairs_per_s'] = len(batch) * (candidate_k or n_jobs) / seconds
+
+    evaluate_model.recommender = recommender
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = evaluate_model.evaluate_all_users(top_n=top_n, seed=seed, n_users=eval_users)
+    result['evaluation_s'] = time.perf_counter() - start
+    result['evaluation_users'] = min(eval_users, int(recommender.interactions_df['user_id'].nunique()))
+    result['evaluation_metrics'] = {key: float(value) for key, value in metrics.loc[name].items()
+                                    if key != 'wall_clock_s'}
+
+    result['stages_s'] = {stage: stats['total_s'] for stage, stats in instruments.report()['stages'].items()}
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def run_scale(scale, data_dir, seed=42, workers=1, candidate_k=None, top_n=5, latency_requests=200,
+              batch_size=1024, eval_users=2000, models=None):
+    from feature_store import load_feature_store
+
+    n_users, n_jobs = SCALES[scale]
+    directory = os.path.join(data_dir, scale)
+    print(f"\n[{scale}] {n_users} users, {n_jobs} jobs")
+    sources, dataset = build_dataset(directory, n_users, n_jobs, seed, workers)
+    print(f"[{scale}] dataset: {dataset['rows']}")
+
+    store_dir = os.path.abspath(os.path.join(directory, 'feature_store'))
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_feature_store(sources, store_dir)
+    store_s = time.perf_counter() - start
+
+    model_files, training = train_models(sources, store_dir, os.path.join(directory, 'models'), dataset['params'],
+                                         seed)
+    print(f"[{scale}] models {training['version']} (training {training['train_s']:.1f}s)")
+
+    report = {'users': n_users, 'jobs': n_jobs, 'dataset': dataset, 'feature_store_s': store_s,
+              'training': training, 'models': {}}
+    context = multiprocessing.get_context('spawn')
+    for name in models or model_files:
+        task = (name, model_files[name], sources, store_dir, n_jobs, candidate_k, top_n,
+                latency_requests, batch_size, eval_users, seed)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(_bench_model, task).result()
+        report['models'][name] = result
+        print(f"[{scale}] {name}: cold start {result['cold_start_s']:.2f}s, "
+              f"p50 {result['latency_p50_ms']:.1f} ms, p95 {result['latency_p95_ms']:.1f} ms, "
+              f"{result['throughput_users_per_s']:.0f} users/s, evaluation {result['evaluation_s']:.2f}s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    return report
+
+
+# 4. Résultats
+# ------------
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import scipy
+    import sklearn
+
+    versions = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                'scipy': scipy.__version__, 'scikit-learn': sklearn.__version__}
+    try:
+        import xgboost
+        versions['xgboost'] = xgboost.__version__
+    except ImportError:
+        pass
+    return {'commit': _git_commit(), 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'versions': versions}
+
+
+# Écarts relatifs entre deux fichiers de résultats (échelles et modèles
+# communs) ; une dégradation est positive quel que soit le sens de la métrique
+def compare_results(baseline, current):
+    rows = []
+    for scale, report in current['scales'].items():
+        for name, result in report['models'].items():
+            before = baseline.get('scales', {}).get(scale, {}).get('models', {}).get(name)
+            if before is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                if before.get(metric) and metric in result:
+                    change = result[metric] / before[metric] - 1
+                    rows.append({'scale': scale, 'model': name, 'metric': metric, 'baseline': before[metric],
+                                 'current': result[metric], 'change_%': 100 * change,
+                                 'regression_%': 100 * (-change if higher_is_better else change)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline at several dataset scales.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=list(DEFAULT_SCALES),
+                        help=f"Dataset scales (default: {' '.join(DEFAULT_SCALES)})")
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_FILES), default=None,
+                        help="Models to benchmark (default: all four)")
+    parser.add_argument('--data-dir', default='benchmarks/data', help="Generated datasets and models, reused")
+    parser.add_argument('--out', default=None,
+                        help="Results file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument('--compare', default=None, help="Previous results file to compare against")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1, help="Processes used to generate the datasets")
+    parser.add_argument('--candidate-k', type=int, default=None,
+                        help="Score only k candidate jobs per user (default: the whole catalogue)")
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--latency-requests', type=int, default=200, help="Single-user requests per model")
+    parser.add_argument('--batch-size', type=int, default=1024, help="Users in the throughput batch")
+    parser.add_argument('--eval-users', type=int, default=2000, help="Users in the evaluation run")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    results = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'environment': environment(),
+        'params': {'seed': args.seed, 'candidate_k': args.candidate_k, 'top_n': args.top_n,
+                   'latency_requests': args.latency_requests, 'batch_size': args.batch_size,
+                   'eval_users': args.eval_users, 'reference_date': REFERENCE_DATE.strftime('%Y-%m-%d')},
+        'scales': {}
+    }
+    for scale in args.scales:
+        results['scales'][scale] = run_scale(scale, args.data_dir, args.seed, args.workers, args.candidate_k,
+                                             args.top_n, args.latency_requests, args.batch_size,
+                                             args.eval_users, args.models)
+
+    out = args.out
+    if out is None:
+        commit = (results['environment']['commit'] or 'nogit')[:8]
+        out = os.path.join('benchmarks', 'results', f"{started_at:%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\nResults written to {out}")
+
+    if args.compare is not None:
+        comparison = compare_results(_read_json(args.compare), results)
+        if comparison.empty:
+            print(f"Nothing to compare with {args.compare}")
+        else:
+            print(f"\nCompared with {args.compare} (positive regression_% = slower or bigger):")
+            with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', None):
+                print(comparison.round(2).to_string(index=False))
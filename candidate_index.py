@@ -0,0 +1,191 @@
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+
+# Index IVF (inverted file) sur les vecteurs TF-IDF des offres : les offres
+# sont regroupées par k-means sphérique, et une requête ne parcourt que les
+# n_probe listes dont le centroïde est le plus proche du profil utilisateur.
+# Seules les k offres candidates retenues passent ensuite par le modèle.
+class IVFIndex:
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, seed=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    def fit(self, job_vectors):
+        job_vectors = sparse.csr_matrix(job_vectors)
+        n_jobs = job_vectors.shape[0]
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_jobs)))
+        n_lists = min(n_lists, n_jobs)
+        rng = np.random.default_rng(self.seed)
+
+        # k-means sphérique : affectation au centroïde de plus grand cosinus
+        centroids = job_vectors[rng.choice(n_jobs, n_lists, replace=False)].toarray()
+        for _ in range(self.n_iter):
+            assignments = np.asarray((job_vectors @ centroids.T).argmax(axis=1)).ravel()
+            membership = sparse.csr_matrix((np.ones(n_jobs), (assignments, np.arange(n_jobs))),
+                                           shape=(n_lists, n_jobs))
+            centroids = self._normalize(np.asarray((membership @ job_vectors).todense()))
+            empty = np.flatnonzero(np.bincount(assignments, minlength=n_lists) == 0)
+            if len(empty):
+                centroids[empty] = job_vectors[rng.choice(n_jobs, len(empty), replace=False)].toarray()
+        assignments = np.asarray((job_vectors @ centroids.T).argmax(axis=1)).ravel()
+
+        # Listes inversées : offres triées par liste, et bornes de chaque liste
+        self.assignments = assignments
+        self.order = np.argsort(assignments, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+        self.centroids = centroids
+        self.job_vectors = job_vectors
+        self.delta_jobs = np.empty(0, dtype=np.intp)
+        return self
+
+    # Offres ajoutées en fin de catalogue (job_vectors : matrice complète) :
+    # chacune rejoint la liste de son centroïde le plus proche, sans refaire
+    # le k-means ; elles restent dans un segment delta jusqu'au prochain fit
+    def extend(self, job_vectors):
+        job_vectors = sparse.csr_matrix(job_vectors)
+        new = np.arange(self.n_jobs, job_vectors.shape[0])
+        if len(new):
+            assignments = np.asarray((job_vectors[new] @ self.centroids.T).argmax(axis=1)).ravel()
+            self.assignments = np.concatenate([self.assignments, assignments])
+            self.delta_jobs = np.concatenate([self.delta_jobs, new])
+        self.job_vectors = job_vectors
+        return self
+
+    # Index déjà entraîné, reconstruit depuis ses tableaux (sans k-means)
+    @classmethod
+    def from_arrays(cls, arrays, job_vectors, n_probe=8):
+        index = cls(n_lists=len(arrays['centroids']), n_probe=n_probe)
+        index.assignments = arrays['assignments']
+        index.order = arrays['order']
+        index.offsets = arrays['offsets']
+        index.centroids = arrays['centroids']
+        index.job_vectors = sparse.csr_matrix(job_vectors)
+        index.delta_jobs = np.empty(0, dtype=np.intp)
+        return index
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in ('centroids', 'assignments', 'order', 'offsets')}
+
+    @property
+    def n_jobs(self):
+        return self.job_vectors.shape[0]
+
+    # (n_users, k) indices des offres candidates, par similarité décroissante.
+    # On sonde au moins n_probe listes, et plus si elles contiennent moins de
+    # k offres (autorisées par job_mask le cas échéant).
+    def search(self, user_vectors, k, job_mask=None):
+        user_vectors = sparse.csr_matrix(user_vectors)
+        if job_mask is None and not len(self.delta_jobs):
+            list_sizes = np.diff(self.offsets)
+        else:
+            assignments = self.assignments if job_mask is None else self.assignments[job_mask]
+            list_sizes = np.bincount(assignments, minlength=len(self.centroids))
+        k = min(k, int(list_sizes.sum()))
+        list_scores = np.asarray(user_vectors @ self.centroids.T)
+        probe_order = np.argsort(-list_scores, axis=1, kind='stable')
+
+        candidates = np.empty((user_vectors.shape[0], k), dtype=np.intp)
+        for row in range(user_vectors.shape[0]):
+            covered = np.cumsum(list_sizes[probe_order[row]])
+            n_probe = max(min(self.n_probe, len(covered)), int(np.searchsorted(covered, k)) + 1)
+            jobs = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]]
+                                   for c in probe_order[row, :n_probe]])
+            if len(self.delta_jobs):
+                probed = np.isin(self.assignments[self.delta_jobs], probe_order[row, :n_probe])
+                jobs = np.concatenate([jobs, self.delta_jobs[probed]])
+            if job_mask is not None:
+                jobs = jobs[job_mask[jobs]]
+            scores = (self.job_vectors[jobs] @ user_vectors[row].T).toarray().ravel()
+            top = np.argpartition(-scores, k - 1)[:k] if len(jobs) > k else np.arange(len(jobs))
+            top = top[np.lexsort((jobs[top], -scores[top]))]
+            candidates[row] = jobs[top]
+        return candidates
+
+
+# Référence exacte : cosinus contre toutes les offres
+class ExhaustiveIndex:
+    def fit(self, job_vectors):
+        self.job_vectors = sparse.csr_matrix(job_vectors)
+        return self
+
+    def search(self, user_vectors, k, job_mask=None):
+        scores = np.asarray((sparse.csr_matrix(user_vectors) @ self.job_vectors.T).todense())
+        if job_mask is not None:
+            scores[:, ~job_mask] = -np.inf
+            k = min(k, int(job_mask.sum()))
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.lexsort((top, -top_scores), axis=1)
+        return np.take_along_axis(top, order, axis=1)
+
+
+# Rappel et latence du scoring avec candidats face au scoring exhaustif :
+# part des top_n exhaustifs retrouvés dans les top_n obtenus sur k candidats
+def candidate_recall_report(exhaustive, candidate, model, user_ids, top_n=5):
+    # Chargements hors chronométrage
+    for recommender in (exhaustive, candidate):
+        recommender.warm(models=False)
+        if isinstance(model, str):
+            recommender.model(model)
+
+    start = time.perf_counter()
+    reference = exhaustive.recommend_batch(model, user_ids, top_n)
+    exhaustive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    approximate = candidate.recommend_batch(model, user_ids, top_n)
+    candidate_time = time.perf_counter() - start
+
+    recalls = []
+    for user_id in user_ids:
+        expected = set(reference[user_id]['job_id'])
+        if expected:
+            recalls.append(len(expected & set(approximate[user_id]['job_id'])) / len(expected))
+
+    # Rappel de l'index seul : candidats IVF face aux k plus proches exacts
+    user_vectors = candidate.user_skills_tfidf[[candidate.user_positions[u] for u in user_ids]]
+    exact = ExhaustiveIndex().fit(candidate.job_skills_tfidf).search(user_vectors, candidate.candidate_k)
+    found = candidate.candidate_index.search(user_vectors, candidate.candidate_k)
+    index_recall = np.mean([len(np.intersect1d(a, b)) / len(a) for a, b in zip(exact, found)])
+    return {
+        'users': len(user_ids),
+        'candidate_k': candidate.candidate_k,
+        f'recall@{top_n}': float(np.mean(recalls)) if recalls else 0.0,
+        f'index_recall@{candidate.candidate_k}': float(index_recall),
+        'exhaustive_ms_per_user': 1000 * exhaustive_time / len(user_ids),
+        'candidate_ms_per_user': 1000 * candidate_time / len(user_ids),
+        'speedup': exhaustive_time / candidate_time if candidate_time > 0 else float('inf')
+    }
+
+
+if __name__ == "__main__":
+    from recommender import Recommender
+
+    parser = argparse.ArgumentParser(description="Recall vs. latency of ANN candidate generation.")
+    parser.add_argument('--model', default='XGBoost')
+    parser.add_argument('--k', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--index', choices=['ivf', 'inverted'], default='ivf')
+    parser.add_argument('--n-probe', type=int, default=8)
+    parser.add_argument('--n-users', type=int, default=200)
+    parser.add_argument('--top-n', type=int, default=5)
+    args = parser.parse_args()
+
+    exhaustive = Recommender(cache_size=0)
+    user_ids = exhaustive.users_df['id'].sample(min(args.n_users, len(exhaustive.users_df)),
+                                                 random_state=42).tolist()
+    for k in args.k:
+        candidate = Recommender(cache_size=0, candidate_k=k, candidate_index=args.index, n_probe=args.n_probe)
+        report = candidate_recall_report(exhaustive, candidate, args.model, user_ids, args.top_n)
+        print(report)
@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+# Modèles « compilés » : les estimateurs entraînés sont convertis en tableaux
+# NumPy plats (poids du modèle linéaire, nœuds des arbres) et évalués par
+# lots sans scikit-learn ni XGBoost. Les tableaux sont écrits en .npy et
+# relus en mmap_mode='r' : le chargement est quasi instantané et partagé
+# entre processus.
+#
+# Arbres : un seul jeu de tableaux (left, right, feature, threshold, value)
+# pour tout l'ensemble, roots donnant la racine de chaque arbre. On descend
+# à gauche si x <= threshold. Les feuilles bouclent sur elles-mêmes, ce qui
+# permet de descendre tous les arbres de tous les exemples max_depth fois.
+# Comme scikit-learn et XGBoost, les comparaisons se font en float32 : les
+# seuils sont arrondis au float32 inférieur (<= de scikit-learn sur des
+# seuils float64) ou au float32 précédent (< strict de XGBoost).
+#
+# Le chemin de service compilé est limité au modèle linéaire, plus rapide
+# que predict_proba à toute taille de lot. Les arbres descendus en NumPy ne
+# le sont que sur de petits lots (~100 lignes, candidate_k) : sur tout un
+# catalogue (1k-10k lignes par utilisateur) scikit-learn et XGBoost restent
+# 2 à 6 fois plus rapides. Des arbres complétés empilés (arbres x nœuds,
+# enfants calculés 2n+1/2n+2 au lieu d'être lus) ne gagnent que 1.2 à 1.4
+# fois sur la descente actuelle, qui traite déjà tous les arbres à chaque
+# niveau ; des masques de feuilles par seuil (QuickScorer) ne tiennent dans
+# un mot de 64 bits que jusqu'à la profondeur 6, pas pour la forêt
+# (max_depth=12). Le Recommender n'utilise donc par défaut que les formes de
+# DEFAULT_KINDS ; les arbres compilés restent exportés et vérifiés, et
+# s'activent modèle par modèle (compiled_models) pour candidate_k.
+
+LINK_FUNCTIONS = {
+    'identity': lambda raw: raw,
+    'sigmoid': lambda raw: 1.0 / (1.0 + np.exp(-raw))
+}
+
+
+class LinearModel:
+    kind = 'linear'
+
+    def __init__(self, coef, intercept, link='sigmoid'):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.link = link
+
+    def predict_positive(self, X):
+        return LINK_FUNCTIONS[self.link](np.asarray(X, dtype=np.float64) @ self.coef + self.intercept)
+
+    def predict_proba(self, X):
+        positive = self.predict_positive(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def arrays(self):
+        return {'coef': self.coef}
+
+    def spec(self):
+        return {'kind': self.kind, 'intercept': self.intercept, 'link': self.link}
+
+    @classmethod
+    def from_arrays(cls, arrays, spec):
+        return cls(arrays['coef'], spec['intercept'], spec['link'])
+
+
+class TreeEnsemble:
+    kind = 'trees'
+
+    def __init__(self, left, right, feature, threshold, value, roots, max_depth,
+                 base=0.0, scale=1.0, aggregate='sum', link='identity', block_size=8192):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.base = float(base)
+        self.scale = float(scale)
+        self.aggregate = aggregate
+        self.link = link
+        self.block_size = block_size
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    # Enfants entrelacés (droite, gauche) : enfant = children[2 * nœud + go_left]
+    @property
+    def children(self):
+        if getattr(self, '_children', None) is None:
+            self._children = np.stack([self.right, self.left], axis=1).ravel()
+        return self._children
+
+    # Feuille atteinte (n, n_trees) pour chaque exemple et chaque arbre. Tout
+    # est à plat : X.ravel() est indexé par position de ligne + feature.
+    def apply(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        values = X.ravel()
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int32) * n_features, self.n_trees)
+        node = np.tile(np.asarray(self.roots, dtype=np.int32), n_rows)
+        children = self.children
+        for _ in range(self.max_depth):
+            go_left = values[row_offsets + self.feature[node]] <= self.threshold[node]
+            node = children[2 * node + go_left]
+        return node.reshape(n_rows, self.n_trees)
+
+    def raw_predict(self, X):
+        X = np.asarray(X)
+        raw = np.empty(len(X))
+        for start in range(0, len(X), self.block_size):
+            block = slice(start, start + self.block_size)
+            values = self.value[self.apply(X[block])]
+            raw[block] = values.mean(axis=1) if self.aggregate == 'mean' else values.sum(axis=1)
+        return self.base + self.scale * raw
+
+    def predict_positive(self, X):
+        return LINK_FUNCTIONS[self.link](self.raw_predict(X))
+
+    def predict_proba(self, X):
+        positive = self.predict_positive(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in ('left', 'right', 'feature', 'threshold', 'value', 'roots')}
+
+    def spec(self):
+        return {'kind': self.kind, 'max_depth': self.max_depth, 'base': self.base, 'scale': self.scale,
+                'aggregate': self.aggregate, 'link': self.link}
+
+    @classmethod
+    def from_arrays(cls, arrays, spec):
+        return cls(arrays['left'], arrays['right'], arrays['feature'], arrays['threshold'], arrays['value'],
+                   arrays['roots'], spec['max_depth'], spec['base'], spec['scale'], spec['aggregate'], spec['link'])
+
+
+COMPILED_KINDS = {cls.kind: cls for cls in (LinearModel, TreeEnsemble)}
+DEFAULT_KINDS = ('linear',)
+
+
+# 1. Conversion des estimateurs
+# -----------------------------
+
+# Seuils float32 équivalents pour x <= seuil : plus grand float32 <= t pour
+# un seuil float64 (scikit-learn), float32 précédent pour un < strict sur un
+# seuil déjà float32 (XGBoost, dont le dump imprime le float32 en décimal)
+def _float32_below(thresholds, strict=False):
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    rounded = thresholds.astype(np.float32)
+    if strict:
+        return np.nextafter(rounded, np.float32(-np.inf))
+    return np.where(rounded > thresholds, np.nextafter(rounded, np.float32(-np.inf)), rounded).astype(np.float32)
+
+
+# Concaténer des arbres (listes de tableaux par arbre) en un seul jeu de
+# tableaux, avec des feuilles qui bouclent sur elles-mêmes
+def _flatten_trees(trees):
+    offsets = np.concatenate([[0], np.cumsum([len(tree['left']) for tree in trees])])
+    left, right, feature, threshold, value = [], [], [], [], []
+    for offset, tree in zip(offsets, trees):
+        nodes = np.arange(len(tree['left'])) + offset
+        leaf = tree['left'] < 0
+        left.append(np.where(leaf, nodes, tree['left'] + offset))
+        right.append(np.where(leaf, nodes, tree['right'] + offset))
+        feature.append(np.where(leaf, 0, tree['feature']))
+        threshold.append(np.where(leaf, np.float32(np.inf), tree['threshold']).astype(np.float32))
+        value.append(tree['value'])
+    return {
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value).astype(np.float64),
+        'roots': offsets[:-1].astype(np.int32),
+        'max_depth': max(tree['depth'] for tree in trees)
+    }
+
+
+def _sklearn_tree(tree, value):
+    return {
+        'left': tree.children_left,
+        'right': tree.children_right,
+        'feature': tree.feature,
+        'threshold': _float32_below(tree.threshold),
+        'value': value,
+        'depth': tree.max_depth
+    }
+
+
+def _xgboost_trees(booster):
+    feature_names = booster.feature_names
+    feature_index = {name: i for i, name in enumerate(feature_names)} if feature_names else None
+    trees = []
+    for dump in booster.get_dump(dump_format='json'):
+        nodes = {}
+        stack = [(json.loads(dump), 0)]
+        while stack:
+            node, depth = stack.pop()
+            nodes[node['nodeid']] = (node, depth)
+            stack.extend((child, depth + 1) for child in node.get('children', []))
+        size = max(nodes) + 1
+        tree = {'left': np.full(size, -1), 'right': np.full(size, -1), 'feature': np.zeros(size, dtype=np.int64),
+                'threshold': np.zeros(size), 'value': np.zeros(size), 'depth': max(d for _, d in nodes.values())}
+        for node_id, (node, _) in nodes.items():
+            if 'leaf' in node:
+                tree['value'][node_id] = node['leaf']
+                continue
+            split = node['split']
+            tree['feature'][node_id] = feature_index[split] if feature_index else int(split.lstrip('f'))
+            tree['threshold'][node_id] = node['split_condition']
+            tree['left'][node_id] = node['yes']
+            tree['right'][node_id] = node['no']
+        split_nodes = tree['left'] >= 0
+        tree['threshold'][split_nodes] = _float32_below(tree['threshold'][split_nodes], strict=True)
+        trees.append(tree)
+    return trees
+
+
+def compile_model(estimator):
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+    if isinstance(estimator, (LogisticRegression, SGDClassifier)):
+        if estimator.coef_.shape[0] != 1:
+            raise ValueError("Only binary linear models can be compiled")
+        return LinearModel(estimator.coef_[0], estimator.intercept_[0])
+
+    if isinstance(estimator, RandomForestClassifier):
+        trees = []
+        for tree in estimator.estimators_:
+            counts = tree.tree_.value[:, 0, :]
+            trees.append(_sklearn_tree(tree.tree_, counts[:, 1] / counts.sum(axis=1)))
+        flat = _flatten_trees(trees)
+        return TreeEnsemble(**flat, aggregate='mean')
+
+    if isinstance(estimator, GradientBoostingClassifier):
+        if estimator.estimators_.shape[1] != 1:
+            raise ValueError("Only binary gradient boosting can be compiled")
+        if estimator.init_ != 'zero' and type(estimator.init_).__name__ != 'DummyClassifier':
+            raise ValueError("Gradient boosting with a custom init estimator cannot be compiled")
+        base = estimator._raw_predict_init(np.zeros((1, estimator.n_features_in_), dtype=np.float32))[0, 0]
+        trees = [_sklearn_tree(tree.tree_, tree.tree_.value[:, 0, 0]) for tree in estimator.estimators_[:, 0]]
+        flat = _flatten_trees(trees)
+        return TreeEnsemble(**flat, base=base, scale=estimator.learning_rate, link='sigmoid')
+
+    if type(estimator).__name__ == 'XGBClassifier':
+        booster = estimator.get_booster()
+        config = json.loads(booster.save_config())
+        if config['learner']['objective']['name'] != 'binary:logistic':
+            raise ValueError("Only binary:logistic XGBoost models can be compiled")
+        base_score = float(str(config['learner']['learner_model_param']['base_score']).strip('[]'))
+        flat = _flatten_trees(_xgboost_trees(booster))
+        return TreeEnsemble(**flat, base=np.log(base_score / (1.0 - base_score)), link='sigmoid')
+
+    raise TypeError(f"Cannot compile {type(estimator).__name__}")
+
+
+# 2. Sauvegarde et chargement (mmap)
+# ----------------------------------
+
+def save_compiled(model, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in model.arrays().items():
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+    with open(os.path.join(directory, 'model.json'), 'w', encoding='utf-8') as f:
+        json.dump(model.spec(), f, indent=2)
+
+
+def compiled_spec(directory):
+    with open(os.path.join(directory, 'model.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_compiled(directory, mmap_mode='r'):
+    spec = compiled_spec(directory)
+    cls = COMPILED_KINDS[spec['kind']]
+    names = [name[:-4] for name in os.listdir(directory) if name.endswith('.npy')]
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in names}
+    return cls.from_arrays(arrays, spec)
+
+
+def compiled_dir_name(model_file):
+    return os.path.splitext(os.path.basename(model_file))[0]
+
+
+# Compiler tous les modèles d'un registre {nom: fichier .pkl} dans out_dir
+def compile_models(model_files, out_dir):
+    import joblib
+
+    compiled = {}
+    for name, file in model_files.items():
+        compiled[name] = compile_model(joblib.load(file))
+        save_compiled(compiled[name], os.path.join(out_dir, compiled_dir_name(file)))
+    return compiled
+
+
+# Écart maximal avec predict_proba, temps de chargement, et temps
+# d'inférence sur tout X, sur une requête d'un utilisateur (catalogue_rows
+# lignes : tout le catalogue) et sur une requête de request_rows lignes
+# (offres candidates)
+def compare_with_estimator(model_file, compiled_dir, X, catalogue_rows, request_rows=100, repeat=20):
+    import joblib
+    import pandas as pd
+    from scoring import FEATURE_COLUMNS
+
+    def timed(function, n=1):
+        start = time.perf_counter()
+        for _ in range(n):
+            result = function()
+        return result, 1000 * (time.perf_counter() - start) / n
+
+    estimator, load_ms = timed(lambda: joblib.load(model_file))
+    compiled, compiled_load_ms = timed(lambda: load_compiled(compiled_dir))
+    expected, predict_ms = timed(lambda: estimator.predict_proba(pd.DataFrame(X, columns=FEATURE_COLUMNS))[:, 1])
+    actual, compiled_predict_ms = timed(lambda: compiled.predict_positive(X))
+    catalogue = X[:catalogue_rows]
+    _, catalogue_ms = timed(lambda: estimator.predict_proba(pd.DataFrame(catalogue, columns=FEATURE_COLUMNS)),
+                            max(1, repeat // 4))
+    _, compiled_catalogue_ms = timed(lambda: compiled.predict_positive(catalogue), max(1, repeat // 4))
+    request = X[:request_rows]
+    _, request_ms = timed(lambda: estimator.predict_proba(pd.DataFrame(request, columns=FEATURE_COLUMNS)), repeat)
+    _, compiled_request_ms = timed(lambda: compiled.predict_positive(request), repeat)
+    return {
+        'max_abs_diff': float(np.max(np.abs(expected - actual))) if len(X) else 0.0,
+        'load_ms': load_ms,
+        'compiled_load_ms': compiled_load_ms,
+        'batch_ms': predict_ms,
+        'compiled_batch_ms': compiled_predict_ms,
+        'catalogue_ms': catalogue_ms,
+        'compiled_catalogue_ms': compiled_catalogue_ms,
+        'request_ms': request_ms,
+        'compiled_request_ms': compiled_request_ms
+    }
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from recommender import Recommender, default_model_files
+
+    parser = argparse.ArgumentParser(description="Compile the trained models to NumPy arrays and check them.")
+    parser.add_argument('--artifacts-dir', default=None, help="Compile the models published in this directory (default: models/LATEST, else ./*.pkl)")
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--out', default='compiled_models')
+    parser.add_argument('--n-users', type=int, default=50, help="Users whose full feature rows are used for the check")
+    parser.add_argument('--request-rows', type=int, default=100,
+                        help="Rows per candidate_k request for the latency check (a full-catalogue request is "
+                             "always timed too)")
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    model_files = default_model_files(args.artifacts_dir, args.version)
+    compile_models(model_files, args.out)
+
+    # Vérification sur de vraies features (tout le catalogue pour n_users utilisateurs)
+    recommender = Recommender(cache_size=0)
+    user_idx = np.arange(min(args.n_users, len(recommender.user_positions)))
+    X = recommender.pair_features(np.repeat(user_idx, len(recommender.job_features)),
+                                  np.tile(np.arange(len(recommender.job_features)), len(user_idx)))
+    n_jobs = len(recommender.job_features)
+    report = {name: compare_with_estimator(file, os.path.join(args.out, compiled_dir_name(file)), X,
+                                           n_jobs, args.request_rows)
+              for name, file in model_files.items()}
+    print(f"Compiled {len(report)} models to {args.out} (checked on {len(X)} rows, {n_jobs} rows per user)")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(pd.DataFrame(report).T.round(4))
+    slower = [name for name, row in report.items() if row['compiled_catalogue_ms'] > row['catalogue_ms']]
+    if slower:
+        print(f"Slower than predict_proba on a full catalogue, keep the pickles for: {', '.join(slower)}")
+    if any(row['max_abs_diff'] > args.tolerance for row in report.values()):
+        print(f"Error: compiled scores differ from predict_proba by more than {args.tolerance}")
+        exit(1)
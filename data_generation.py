@@ -7,8 +7,14 @@ import numpy as np
 import random
 from datetime import datetime, timedelta
 import json
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import argparse
+import textwrap
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from data_model import JOB_SCHEMA, USER_SCHEMA, encode_table, new_vocabularies
+from instrumentation import instruments, start_metrics_server
 
 # Configuration pour la reproductibilité
 np.random.seed(42)
@@ -239,61 +245,63 @@ job_durations = ['1 semaine', '2 semaines', '1 mois', '3 mois', '6 mois', '1 an'
 # 2. Fonction de génération des utilisateurs
 # -----------------------------------------
 
-def generate_users(num_users=1000):
+@instruments.timed('generate.users')
+def generate_users(num_users=1000, rng=random, start=0, reference_date=None):
+    now = reference_date or datetime.now()
     users = []
     
-    for i in range(num_users):
+    for i in range(start, start + num_users):
         user_id = f"user_{i}"
         
         # Sélectionner un domaine aléatoire pour l'utilisateur
-        user_domain = random.choice(domains)
+        user_domain = rng.choice(domains)
         
         # Sélectionner une profession dans ce domaine
-        user_profession = random.choice(professions_by_domain[user_domain])
+        user_profession = rng.choice(professions_by_domain[user_domain])
         
         # Sélectionner des compétences principalement de ce domaine
         domain_skills = skills_by_domain[user_domain]
-        num_domain_skills = random.randint(3, min(8, len(domain_skills)))
-        user_skills = random.sample(domain_skills, num_domain_skills)
+        num_domain_skills = rng.randint(3, min(8, len(domain_skills)))
+        user_skills = rng.sample(domain_skills, num_domain_skills)
         
         # Ajouter quelques compétences d'autres domaines (interdisciplinarité)
         other_domains = [d for d in domains if d != user_domain]
-        if other_domains and random.random() < 0.7:  # 70% de chance d'avoir des compétences interdisciplinaires
-            num_other_domains = random.randint(1, min(3, len(other_domains)))
-            selected_other_domains = random.sample(other_domains, num_other_domains)
+        if other_domains and rng.random() < 0.7:  # 70% de chance d'avoir des compétences interdisciplinaires
+            num_other_domains = rng.randint(1, min(3, len(other_domains)))
+            selected_other_domains = rng.sample(other_domains, num_other_domains)
             
             for other_domain in selected_other_domains:
                 other_domain_skills = skills_by_domain[other_domain]
-                num_other_skills = random.randint(1, 3)
-                other_skills = random.sample(other_domain_skills, min(num_other_skills, len(other_domain_skills)))
+                num_other_skills = rng.randint(1, 3)
+                other_skills = rng.sample(other_domain_skills, min(num_other_skills, len(other_domain_skills)))
                 user_skills.extend(other_skills)
         
         # Langues
-        user_languages = random.sample(languages, random.randint(1, 3))
-        if 'Arabe' not in user_languages and random.random() < 0.8:  # Majorité parle arabe au Maroc
+        user_languages = rng.sample(languages, rng.randint(1, 3))
+        if 'Arabe' not in user_languages and rng.random() < 0.8:  # Majorité parle arabe au Maroc
             user_languages.append('Arabe')
-        if 'Français' not in user_languages and random.random() < 0.7:  # Beaucoup parlent français au Maroc
+        if 'Français' not in user_languages and rng.random() < 0.7:  # Beaucoup parlent français au Maroc
             user_languages.append('Français')
         
         # Associer un niveau de compétence à chaque skill
         skill_levels = {}
         for skill in user_skills:
             # Niveau entre 1 et 5
-            skill_levels[skill] = random.randint(1, 5)
+            skill_levels[skill] = rng.randint(1, 5)
         
         # Générer des expériences passées
-        num_experiences = random.randint(0, 5)
+        num_experiences = rng.randint(0, 5)
         experiences = []
         for j in range(num_experiences):
-            exp_domain = user_domain if random.random() < 0.8 else random.choice(domains)
-            exp_skills = random.sample(user_skills, random.randint(1, min(3, len(user_skills))))
+            exp_domain = user_domain if rng.random() < 0.8 else rng.choice(domains)
+            exp_skills = rng.sample(user_skills, rng.randint(1, min(3, len(user_skills))))
             
             exp = {
-                'title': f"{random.choice(professions_by_domain[exp_domain])} - Projet {j}",
+                'title': f"{rng.choice(professions_by_domain[exp_domain])} - Projet {j}",
                 'domain': exp_domain,
-                'duration': random.choice(job_durations),
+                'duration': rng.choice(job_durations),
                 'skills_used': exp_skills,
-                'date': (datetime.now() - timedelta(days=random.randint(30, 1000))).strftime('%Y-%m-%d')
+                'date': (now - timedelta(days=rng.randint(30, 1000))).strftime('%Y-%m-%d')
             }
             experiences.append(exp)
         
@@ -301,17 +309,17 @@ def generate_users(num_users=1000):
             'id': user_id,
             'fullName': f"Utilisateur {i}",
             'email': f"user{i}@example.com",
-            'location': random.choice(locations),
+            'location': rng.choice(locations),
             'domain': user_domain,
             'profession': user_profession,
             'skills': user_skills,
             'skill_levels': skill_levels,
             'languages': user_languages,
-            'rating': round(random.uniform(3.0, 5.0), 1),
-            'jobsCompleted': random.randint(0, 50),
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'jobsCompleted': rng.randint(0, 50),
             'experiences': experiences,
             'isWorker': True,
-            'lastActive': (datetime.now() - timedelta(days=random.randint(0, 30))).strftime('%Y-%m-%d')
+            'lastActive': (now - timedelta(days=rng.randint(0, 30))).strftime('%Y-%m-%d')
         }
         users.append(user)
     
@@ -320,65 +328,68 @@ def generate_users(num_users=1000):
 # 3. Fonction de génération des offres d'emploi
 # --------------------------------------------
 
-def generate_jobs(num_jobs=2000):
+@instruments.timed('generate.jobs')
+def generate_jobs(num_jobs=2000, rng=random, start=0, reference_date=None):
+    now = reference_date or datetime.now()
     jobs = []
     
-    for i in range(num_jobs):
+    for i in range(start, start + num_jobs):
         job_id = f"job_{i}"
         
         # Sélectionner un domaine aléatoire pour l'offre
-        job_domain = random.choice(domains)
+        job_domain = rng.choice(domains)
         
         # Sélectionner une profession dans ce domaine
-        job_profession = random.choice(professions_by_domain[job_domain])
+        job_profession = rng.choice(professions_by_domain[job_domain])
         
         # Sélectionner des compétences requises pour ce domaine
         domain_skills = skills_by_domain[job_domain]
-        num_domain_skills = random.randint(2, min(5, len(domain_skills)))
-        required_skills = random.sample(domain_skills, num_domain_skills)
+        num_domain_skills = rng.randint(2, min(5, len(domain_skills)))
+        required_skills = rng.sample(domain_skills, num_domain_skills)
         
         # Eventuellement ajouter quelques compétences d'autres domaines
-        if random.random() < 0.3:  # 30% de chance d'avoir des compétences d'autres domaines
+        if rng.random() < 0.3:  # 30% de chance d'avoir des compétences d'autres domaines
             other_domains = [d for d in domains if d != job_domain]
             if other_domains:
-                other_domain = random.choice(other_domains)
+                other_domain = rng.choice(other_domains)
                 other_domain_skills = skills_by_domain[other_domain]
-                num_other_skills = random.randint(1, 2)
-                other_skills = random.sample(other_domain_skills, min(num_other_skills, len(other_domain_skills)))
+                num_other_skills = rng.randint(1, 2)
+                other_skills = rng.sample(other_domain_skills, min(num_other_skills, len(other_domain_skills)))
                 required_skills.extend(other_skills)
         
         # Niveau de compétence requis pour chaque skill
         skill_requirements = {}
         for skill in required_skills:
-            skill_requirements[skill] = random.randint(1, 5)
+            skill_requirements[skill] = rng.randint(1, 5)
         
         # Générer un titre d'emploi significatif
-        job_title = f"{job_profession} - {random.choice(['Projet', 'Mission', 'Poste'])} {job_domain}"
+        job_title = f"{job_profession} - {rng.choice(['Projet', 'Mission', 'Poste'])} {job_domain}"
         
         # Langues requises
-        required_languages = ['Arabe'] if random.random() < 0.8 else []
-        if random.random() < 0.7:
+        required_languages = ['Arabe'] if rng.random() < 0.8 else []
+        if rng.random() < 0.7:
             required_languages.append('Français')
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             required_languages.append('Anglais')
-        # Éviter les doublons
-        required_languages = list(set(required_languages))
+        # Éviter les doublons (dict.fromkeys garde un ordre reproductible,
+        # contrairement à set() qui dépend de PYTHONHASHSEED)
+        required_languages = list(dict.fromkeys(required_languages))
         
         # Générer les informations de l'emploi
         job = {
             'id': job_id,
             'title': job_title,
             'description': f"Description de l'offre d'emploi {i} dans le domaine {job_domain}",
-            'location': random.choice(locations),
+            'location': rng.choice(locations),
             'domain': job_domain,
             'required_skills': required_skills,
             'skill_requirements': skill_requirements,
-            'job_type': random.choice(job_types),
-            'duration': random.choice(job_durations),
+            'job_type': rng.choice(job_types),
+            'duration': rng.choice(job_durations),
             'required_languages': required_languages,
-            'posted_date': (datetime.now() - timedelta(days=random.randint(0, 60))).strftime('%Y-%m-%d'),
-            'salary_range': f"{random.randint(300, 800)}-{random.randint(800, 1500)} MAD/jour",
-            'employer_id': f"employer_{random.randint(0, 100)}"
+            'posted_date': (now - timedelta(days=rng.randint(0, 60))).strftime('%Y-%m-%d'),
+            'salary_range': f"{rng.randint(300, 800)}-{rng.randint(800, 1500)} MAD/jour",
+            'employer_id': f"employer_{rng.randint(0, 100)}"
         }
         jobs.append(job)
     
@@ -387,110 +398,334 @@ def generate_jobs(num_jobs=2000):
 # 4. Générer les interactions entre utilisateurs et emplois
 # -------------------------------------------------------
 
-def generate_interactions(users_df, jobs_df, interaction_rate=0.05):
+INTERACTION_COLUMNS = ['user_id', 'job_id', 'viewed', 'applied', 'saved', 'date', 'relevance_score']
+
+
+# rng : numpy.random.Generator. Tous les tirages d'un bloc d'utilisateurs
+# sont faits en un appel par usage (diversité, interaction, candidature,
+# sauvegarde, date) : la distribution est celle de la version paire par
+# paire, pas la suite de tirages.
+@instruments.timed('generate.interactions')
+def generate_interactions(users_df, jobs_df, interaction_rate=0.05, block_size=None, rng=None,
+                          reference_date=None):
+    if len(jobs_df) == 0:
+        return pd.DataFrame(columns=INTERACTION_COLUMNS)
+    now = reference_date or datetime.now()
+    rng = np.random.default_rng() if rng is None else rng
+    dates = np.array([(now - timedelta(days=days)).strftime('%Y-%m-%d') for days in range(31)])
     interactions = []
-    
-    for _, user in users_df.iterrows():
-        # Définir des emplois pertinents pour cet utilisateur basés sur ses compétences et son domaine
-        relevant_jobs = []
-        for _, job in jobs_df.iterrows():
-            # Correspondance de domaine
-            domain_match = user['domain'] == job['domain']
-            domain_weight = 0.5 if domain_match else 0.2
-            
-            # Correspondance de compétences
-            common_skills = set(user['skills']).intersection(set(job['required_skills']))
-            skill_match_score = len(common_skills) / len(job['required_skills']) if job['required_skills'] else 0
-            
-            # Correspondance de localisation
-            location_match = user['location'] == job['location']
-            location_weight = 0.3 if location_match else 0.1
-            
-            # Calcul du score de pertinence
-            relevance_score = (skill_match_score * 0.6) + (domain_weight) + (location_weight)
-            
-            if relevance_score > 0.4 or random.random() < 0.1:  # Ajouter un peu de diversité
-                relevant_jobs.append((job['id'], relevance_score))
-        
-        # Trier par pertinence et sélectionner les plus pertinents
-        relevant_jobs.sort(key=lambda x: x[1], reverse=True)
-        relevant_jobs = relevant_jobs[:min(20, len(relevant_jobs))]
-        
-        # Générer des interactions pour ces emplois pertinents
-        for job_id, relevance in relevant_jobs:
-            if random.random() < interaction_rate * relevance * 2:  # Plus de chances pour les emplois pertinents
-                interaction = {
-                    'user_id': user['id'],
-                    'job_id': job_id,
-                    'viewed': True,
-                    'applied': random.random() < 0.4,
-                    'saved': random.random() < 0.3,
-                    'date': (datetime.now() - timedelta(days=random.randint(0, 30))).strftime('%Y-%m-%d'),
-                    'relevance_score': relevance
-                }
-                interactions.append(interaction)
-    
-    return pd.DataFrame(interactions)
-
-# 5. Générer les données et les enregistrer
-# ----------------------------------------
-
-print("Génération des utilisateurs...")
-users_df = generate_users(1000)
-print(f"Nombre d'utilisateurs générés: {len(users_df)}")
-
-print("Génération des offres d'emploi...")
-jobs_df = generate_jobs(2000)
-print(f"Nombre d'offres d'emploi générées: {len(jobs_df)}")
-
-print("Génération des interactions...")
-interactions_df = generate_interactions(users_df, jobs_df)
-print(f"Nombre d'interactions générées: {len(interactions_df)}")
-
-# Visualisation des données
-
-# Distribution des domaines d'utilisateurs
-plt.figure(figsize=(12, 6))
-users_domain_counts = users_df['domain'].value_counts()
-sns.barplot(x=users_domain_counts.values, y=users_domain_counts.index)
-plt.title('Distribution des utilisateurs par domaine')
-plt.tight_layout()
-plt.show()
-
-# Distribution des compétences les plus courantes
-plt.figure(figsize=(12, 6))
-skill_counts = {}
-for skills_list in users_df['skills']:
-    for skill in skills_list:
-        skill_counts[skill] = skill_counts.get(skill, 0) + 1
-
-skill_df = pd.DataFrame({
-    'skill': list(skill_counts.keys()),
-    'count': list(skill_counts.values())
-}).sort_values('count', ascending=False)
-
-sns.barplot(x='count', y='skill', data=skill_df.head(15))
-plt.title('Compétences les plus courantes parmi les utilisateurs')
-plt.tight_layout()
-plt.show()
-
-# Distribution des localisations
-plt.figure(figsize=(12, 6))
-location_counts = users_df['location'].value_counts()
-sns.barplot(x=location_counts.values, y=location_counts.index)
-plt.title('Distribution des utilisateurs par localisation')
-plt.tight_layout()
-plt.show()
-
-# Enregistrer les données générées au format CSV
-users_df.to_csv('freelance_users_maroc.csv', index=False)
-jobs_df.to_csv('freelance_jobs_maroc.csv', index=False)
-interactions_df.to_csv('freelance_interactions_maroc.csv', index=False)
-
-print("\nDonnées sauvegardées dans les fichiers CSV:")
-print("- freelance_users_maroc.csv")
-print("- freelance_jobs_maroc.csv")
-print("- freelance_interactions_maroc.csv")
+
+    # Encodage compact (vocabulaires partagés) : compétences en CSR binaire,
+    # domaines et villes en codes entiers ; le score divise par le nombre de
+    # compétences requises de la liste brute, doublons compris
+    vocabularies = new_vocabularies()
+    jobs = encode_table(jobs_df, JOB_SCHEMA, vocabularies)
+    users = encode_table(users_df, USER_SCHEMA, vocabularies)
+    # Transposée construite une fois (CSR) : le produit par bloc évite la
+    # conversion CSC -> CSR à chaque bloc
+    job_skills_t = jobs.csr('required_skills').T.tocsr()
+    user_skills = users.csr('skills')
+    job_skill_counts = np.array([len(skills) for skills in jobs_df['required_skills']], dtype=np.float64)
+    user_domains, job_domains = users.categories['domain'], jobs.categories['domain']
+    user_locations, job_locations = users.categories['location'], jobs.categories['location']
+    job_ids = jobs_df['id'].to_numpy()
+    user_ids = users_df['id'].to_numpy()
+
+    # Blocs d'utilisateurs de ~4M paires au plus
+    if block_size is None:
+        block_size = max(1, 4_000_000 // max(1, len(jobs_df)))
+
+    for start in range(0, len(users_df), block_size):
+        stop = min(start + block_size, len(users_df))
+
+        # Score de pertinence du bloc (n_users_bloc, n_jobs), calculé dans le
+        # même ordre d'opérations que la version ligne à ligne
+        common_skills = (user_skills[start:stop] @ job_skills_t).toarray()
+        skill_match_score = np.divide(common_skills, job_skill_counts,
+                                      out=np.zeros_like(common_skills), where=job_skill_counts > 0)
+        domain_weight = np.where(user_domains[start:stop, None] == job_domains[None, :], 0.5, 0.2)
+        location_weight = np.where(user_locations[start:stop, None] == job_locations[None, :], 0.3, 0.1)
+        relevance_scores = (skill_match_score * 0.6) + (domain_weight) + (location_weight)
+
+        # Ajouter un peu de diversité : 10 % des offres non pertinentes. Une
+        # offre non pertinente n'entre dans les 20 premières que si
+        # l'utilisateur a moins de 20 offres pertinentes : on ne tire la
+        # diversité que pour ces lignes, la distribution est inchangée
+        relevant = relevance_scores > 0.4
+        short = np.flatnonzero(relevant.sum(axis=1) < 20)
+        relevant[short] |= rng.random((len(short), len(jobs_df))) < 0.1
+        relevance_scores[short] = np.where(relevant[short], relevance_scores[short], -np.inf)
+
+        # Sélectionner les 20 plus pertinents par utilisateur (score
+        # décroissant ; à égalité, l'ordre des offres est conservé) : seuil
+        # par ligne, puis les ex aequo du seuil dans l'ordre des offres
+        top = min(20, len(jobs_df))
+        threshold = -np.partition(-relevance_scores, top - 1, axis=1)[:, top - 1:top]
+        above = relevance_scores > threshold
+        tie_rows, tie_cols = np.nonzero(relevance_scores == threshold)
+        tie_rank = np.arange(len(tie_rows)) - np.searchsorted(tie_rows, tie_rows)
+        ties = tie_rank < top - above.sum(axis=1)[tie_rows]
+        rows, selected = np.nonzero(above)
+        rows = np.concatenate([rows, tie_rows[ties]])
+        selected = np.concatenate([selected, tie_cols[ties]])
+        keep = relevant[rows, selected]
+        rows, selected = rows[keep], selected[keep]
+        selected_scores = relevance_scores[rows, selected]
+        order = np.lexsort((selected, -selected_scores, rows))
+        rows, selected, selected_scores = rows[order], selected[order], selected_scores[order]
+
+        # Générer des interactions pour ces emplois pertinents (plus de
+        # chances pour les emplois pertinents)
+        hit = rng.random(len(selected)) < interaction_rate * selected_scores * 2
+        rows, selected, selected_scores = rows[hit], selected[hit], selected_scores[hit]
+        n_hits = len(selected)
+        interactions.append(pd.DataFrame({
+            'user_id': user_ids[start + rows],
+            'job_id': job_ids[selected],
+            'viewed': np.ones(n_hits, dtype=bool),
+            'applied': rng.random(n_hits) < 0.4,
+            'saved': rng.random(n_hits) < 0.3,
+            'date': dates[rng.integers(0, 31, n_hits)],
+            'relevance_score': selected_scores
+        }, columns=INTERACTION_COLUMNS))
+
+    if not interactions:
+        return pd.DataFrame(columns=INTERACTION_COLUMNS)
+    return pd.concat(interactions, ignore_index=True)
+
+# 5. Génération par blocs et écriture en flux
+# -------------------------------------------
+# Chaque bloc a son propre numpy.random.Generator, issu de l'arbre
+# SeedSequence(seed) -> flux -> indice du bloc (SeedSequence(seed,
+# spawn_key=(flux, bloc)) est l'enfant SeedSequence(seed).spawn()[flux]
+# .spawn()[bloc], sans créer les précédents) : un bloc se régénère seul, à
+# l'identique, sans dépendre des blocs précédents. Les offres sont générées
+# en premier et gardées en mémoire (colonnes utiles aux interactions
+# seulement) ; les utilisateurs et leurs interactions sont ensuite produits
+# et écrits bloc par bloc.
+
+USERS_STREAM, JOBS_STREAM, INTERACTIONS_STREAM = 0, 1, 2
+INTERACTION_JOB_COLUMNS = ['id', 'domain', 'location', 'required_skills']
+
+
+def chunk_generator(seed, stream, chunk_index):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(stream, chunk_index)))
+
+
+# Interface du module random (choice, sample, randint, random, uniform)
+# au-dessus d'un numpy.random.Generator, pour generate_users et generate_jobs
+class GeneratorRandom:
+    def __init__(self, generator):
+        self.generator = generator
+
+    def random(self):
+        return float(self.generator.random())
+
+    def uniform(self, a, b):
+        return float(self.generator.uniform(a, b))
+
+    def randint(self, a, b):
+        return int(self.generator.integers(a, b, endpoint=True))
+
+    def choice(self, seq):
+        return seq[int(self.generator.integers(len(seq)))]
+
+    # permutation()[:k] plutôt que choice(replace=False), environ 3 fois plus
+    # lent sur des listes de cette taille
+    def sample(self, population, k):
+        if k > len(population):
+            raise ValueError("Sample larger than population")
+        return [population[i] for i in self.generator.permutation(len(population))[:k]]
+
+
+def chunk_bounds(total, chunk_size):
+    return [(start, min(chunk_size, total - start)) for start in range(0, total, chunk_size)]
+
+
+def generate_job_chunk(chunk_index, start, size, seed, reference_date=None):
+    rng = GeneratorRandom(chunk_generator(seed, JOBS_STREAM, chunk_index))
+    return generate_jobs(size, rng=rng, start=start, reference_date=reference_date)
+
+
+def generate_user_chunk(chunk_index, start, size, seed, jobs_df, interaction_rate=0.05, reference_date=None):
+    rng = GeneratorRandom(chunk_generator(seed, USERS_STREAM, chunk_index))
+    users_df = generate_users(size, rng=rng, start=start, reference_date=reference_date)
+    interactions_df = generate_interactions(users_df, jobs_df, interaction_rate,
+                                            rng=chunk_generator(seed, INTERACTIONS_STREAM, chunk_index),
+                                            reference_date=reference_date)
+    return users_df, interactions_df
+
+
+# Blocs exécutés dans des processus séparés (--workers) : les résultats sont
+# rendus dans l'ordre des blocs, avec au plus `window` blocs en attente, si
+# bien que les fichiers sont identiques octet pour octet quel que soit N
+_worker_jobs_df = None
+
+
+def _init_worker(jobs_df):
+    global _worker_jobs_df
+    _worker_jobs_df = jobs_df
+
+
+def _job_chunk_task(task):
+    return generate_job_chunk(*task)
+
+
+def _user_chunk_task(task):
+    chunk_index, start, size, seed, interaction_rate, reference_date = task
+    return generate_user_chunk(chunk_index, start, size, seed, _worker_jobs_df, interaction_rate, reference_date)
+
+
+# Mesures (instrumentation) d'un bloc exécuté dans un processus, renvoyées
+# avec son résultat et fusionnées dans le processus principal. Les mesures
+# héritées du processus principal (fork) sont effacées au démarrage.
+def _init_instrumented_worker(initializer, initargs):
+    instruments.reset()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _instrumented_task(function, task):
+    return function(task), instruments.drain()
+
+
+def _ordered_map(function, tasks, workers=1, initializer=None, initargs=()):
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            yield function(task)
+        return
+
+    def result(future):
+        value, snapshot = future.result()
+        instruments.merge(snapshot)
+        return value
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_instrumented_worker,
+                             initargs=(initializer, initargs)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_instrumented_task, function, task))
+            if len(pending) >= 2 * workers:
+                yield result(pending.popleft())
+        while pending:
+            yield result(pending.popleft())
+
+
+def iter_dataset_chunks(num_users=1000, num_jobs=2000, chunk_size=10000, seed=42,
+                        interaction_rate=0.05, reference_date=None, workers=1):
+    jobs_parts = []
+    job_tasks = [(chunk_index, start, size, seed, reference_date)
+                 for chunk_index, (start, size) in enumerate(chunk_bounds(num_jobs, chunk_size))]
+    for jobs_chunk in _ordered_map(_job_chunk_task, job_tasks, workers):
+        jobs_parts.append(jobs_chunk[INTERACTION_JOB_COLUMNS])
+        yield 'jobs', jobs_chunk
+    jobs_df = pd.concat(jobs_parts, ignore_index=True)
+
+    user_tasks = [(chunk_index, start, size, seed, interaction_rate, reference_date)
+                  for chunk_index, (start, size) in enumerate(chunk_bounds(num_users, chunk_size))]
+    for users_chunk, interactions_chunk in _ordered_map(_user_chunk_task, user_tasks, workers,
+                                                        _init_worker, (jobs_df,)):
+        yield 'users', users_chunk
+        yield 'interactions', interactions_chunk
+
+
+# Écriture incrémentale d'un tableau : CSV en ajout (en-tête au premier bloc),
+# JSON (tableau indenté, identique à dataframe_to_json, fermé par close()),
+# JSON Lines (un objet par ligne) ou Parquet (un row group par bloc, pyarrow)
+class ChunkWriter:
+    EXTENSIONS = {'csv': 'csv', 'json': 'json', 'jsonl': 'jsonl', 'parquet': 'parquet'}
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._parquet = None
+        self._json_columns = None
+        # Fichier vide au départ : un tableau sans ligne existe quand même
+        if fmt != 'parquet':
+            open(path, 'w', encoding='utf-8').close()
+
+    def write(self, df):
+        if len(df) == 0:
+            return
+        with instruments.timer(f'generate.write:{self.fmt}'):
+            if self.fmt == 'csv':
+                df.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+            elif self.fmt == 'json':
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    for i, record in enumerate(df.to_dict(orient='records')):
+                        f.write(',\n' if self.rows + i else '[\n')
+                        f.write(textwrap.indent(json.dumps(record, ensure_ascii=False, indent=2), '  '))
+            elif self.fmt == 'jsonl':
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    for record in df.to_dict(orient='records'):
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            else:
+                self._write_parquet(df)
+        self.rows += len(df)
+        instruments.count('generate.rows_written', len(df))
+
+    # Les colonnes de dictionnaires (clés variables) sont sérialisées en JSON
+    # pour garder un schéma Parquet identique d'un bloc à l'autre
+    def _write_parquet(self, df):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Le format parquet nécessite pyarrow (pip install pyarrow)")
+        if self._json_columns is None:
+            self._json_columns = [column for column in df.columns if _is_nested(df[column])]
+        df = df.assign(**{column: df[column].map(lambda value: json.dumps(value, ensure_ascii=False))
+                          for column in self._json_columns})
+        if self._parquet is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self._parquet = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._parquet.schema, preserve_index=False)
+        self._parquet.write_table(table)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self.fmt == 'json':
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n]' if self.rows else '[]')
+
+
+def _is_nested(column):
+    for value in column:
+        if isinstance(value, dict):
+            return True
+        if isinstance(value, list) and value:
+            return isinstance(value[0], dict)
+    return False
+
+
+def write_dataset(output_dir='.', formats=('csv',), num_users=1000, num_jobs=2000, chunk_size=10000,
+                  seed=42, interaction_rate=0.05, reference_date=None, prefix='freelance', workers=1,
+                  counts=None):
+    os.makedirs(output_dir, exist_ok=True)
+    writers = {
+        (table, fmt): ChunkWriter(os.path.join(output_dir, f"{prefix}_{table}_maroc.{ChunkWriter.EXTENSIONS[fmt]}"), fmt)
+        for table in ('users', 'jobs', 'interactions') for fmt in formats
+    }
+    try:
+        for table, chunk in iter_dataset_chunks(num_users, num_jobs, chunk_size, seed,
+                                                interaction_rate, reference_date, workers):
+            for fmt in formats:
+                writers[table, fmt].write(chunk)
+            if counts is not None and table == 'users':
+                update_distribution_counts(counts, chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {writer.path: writer.rows for writer in writers.values()}
+
+
+# 6. Générer les données en mémoire et les enregistrer
+# ---------------------------------------------------
 
 # Exporter également au format JSON pour conserver la structure imbriquée
 def dataframe_to_json(df, filename):
@@ -498,13 +733,160 @@ def dataframe_to_json(df, filename):
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(records, f, ensure_ascii=False, indent=2)
 
-dataframe_to_json(users_df, 'freelance_users_maroc.json')
-dataframe_to_json(jobs_df, 'freelance_jobs_maroc.json')
-dataframe_to_json(interactions_df, 'freelance_interactions_maroc.json')
 
-print("\nDonnées également sauvegardées au format JSON:")
-print("- freelance_users_maroc.json")
-print("- freelance_jobs_maroc.json")
-print("- freelance_interactions_maroc.json")
+def generate_in_memory(num_users=1000, num_jobs=2000, seed=42, reference_date=None, interaction_rate=0.05):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    print("Génération des utilisateurs...")
+    users_df = generate_users(num_users, reference_date=reference_date)
+    print(f"Nombre d'utilisateurs générés: {len(users_df)}")
+
+    print("Génération des offres d'emploi...")
+    jobs_df = generate_jobs(num_jobs, reference_date=reference_date)
+    print(f"Nombre d'offres d'emploi générées: {len(jobs_df)}")
+
+    print("Génération des interactions...")
+    interactions_df = generate_interactions(users_df, jobs_df, interaction_rate, rng=np.random.default_rng(seed),
+                                            reference_date=reference_date)
+    print(f"Nombre d'interactions générées: {len(interactions_df)}")
+
+    return users_df, jobs_df, interactions_df
+
+
+# formats : None pour les fichiers historiques (CSV et JSON indenté), sinon
+# les formats du mode par blocs (ChunkWriter)
+def save_dataset(users_df, jobs_df, interactions_df, output_dir='.', prefix='freelance', formats=None):
+    os.makedirs(output_dir, exist_ok=True)
+    tables = {'users': users_df, 'jobs': jobs_df, 'interactions': interactions_df}
+
+    if formats is not None:
+        print("\nDonnées sauvegardées:")
+        for table, df in tables.items():
+            for fmt in formats:
+                writer = ChunkWriter(os.path.join(output_dir, f"{prefix}_{table}_maroc.{ChunkWriter.EXTENSIONS[fmt]}"),
+                                     fmt)
+                try:
+                    writer.write(df)
+                finally:
+                    writer.close()
+                print(f"- {writer.path}")
+        return
+
+    # Enregistrer les données générées au format CSV
+    print("\nDonnées sauvegardées dans les fichiers CSV:")
+    for table, df in tables.items():
+        path = os.path.join(output_dir, f"{prefix}_{table}_maroc.csv")
+        with instruments.timer('generate.write:csv'):
+            df.to_csv(path, index=False)
+        print(f"- {path}")
+
+    print("\nDonnées également sauvegardées au format JSON:")
+    for table, df in tables.items():
+        path = os.path.join(output_dir, f"{prefix}_{table}_maroc.json")
+        with instruments.timer('generate.write:json'):
+            dataframe_to_json(df, path)
+        print(f"- {path}")
+
+
+# 7. Rapport de distribution (optionnel)
+# -------------------------------------
+# Les comptes sont accumulés pendant la génération (bloc par bloc en mode
+# flux) ; matplotlib et seaborn ne sont importés que pour dessiner le rapport.
+
+def update_distribution_counts(counts, users_df):
+    counts.setdefault('domain', Counter()).update(users_df['domain'])
+    counts.setdefault('location', Counter()).update(users_df['location'])
+    skills = counts.setdefault('skills', Counter())
+    for skills_list in users_df['skills']:
+        skills.update(skills_list)
+    return counts
+
+
+def render_report(counts, output_dir='.', top_skills=15):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    figures = [
+        ('domain', None, 'Distribution des utilisateurs par domaine', 'report_domains.png'),
+        ('skills', top_skills, 'Compétences les plus courantes parmi les utilisateurs', 'report_skills.png'),
+        ('location', None, 'Distribution des utilisateurs par localisation', 'report_locations.png')
+    ]
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for key, limit, title, filename in figures:
+        labels, values = zip(*counts[key].most_common(limit)) if counts.get(key) else ((), ())
+        plt.figure(figsize=(12, 6))
+        sns.barplot(x=list(values), y=list(labels))
+        plt.title(title)
+        plt.tight_layout()
+        path = os.path.join(output_dir, filename)
+        plt.savefig(path)
+        plt.close()
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génération de données synthétiques (freelance, Maroc).")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reference-date', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=None, help="date de référence YYYY-MM-DD (par défaut : aujourd'hui)")
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help="taille des blocs générés et écrits au fil de l'eau (mémoire constante)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processus de génération (sortie identique quel que soit N)")
+    parser.add_argument('--format', nargs='+', choices=sorted(ChunkWriter.EXTENSIONS), default=['csv', 'json'],
+                        help="formats de sortie (par défaut : csv et json)")
+    parser.add_argument('--legacy-stream', action='store_true',
+                        help="ancienne génération en mémoire avec le générateur global (random.seed) ; "
+                             "un seul processus, --chunk-size ignoré")
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--interaction-rate', type=float, default=0.05)
+    parser.add_argument('--report', action='store_true',
+                        help="dessiner les distributions (domaines, compétences, villes) en PNG")
+    parser.add_argument('--metrics-report', default=None,
+                        help="écrire les durées par étape et les compteurs dans ce fichier JSON")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="exposer les métriques Prometheus sur http://0.0.0.0:PORT/metrics")
+    args = parser.parse_args(argv)
+    if args.legacy_stream and args.workers != 1:
+        parser.error("--legacy-stream ne se combine pas avec --workers")
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+
+    counts = {} if args.report else None
+    if args.legacy_stream:
+        users_df, jobs_df, interactions_df = generate_in_memory(args.users, args.jobs, args.seed,
+                                                                args.reference_date, args.interaction_rate)
+        save_dataset(users_df, jobs_df, interactions_df, args.output_dir, formats=args.format)
+        if counts is not None:
+            update_distribution_counts(counts, users_df)
+    else:
+        print(f"Génération par blocs de {args.chunk_size} lignes (seed={args.seed}, workers={args.workers})...")
+        rows = write_dataset(args.output_dir, args.format, args.users, args.jobs, args.chunk_size,
+                             args.seed, args.interaction_rate, args.reference_date, workers=args.workers,
+                             counts=counts)
+        for path, count in rows.items():
+            print(f"- {path}: {count} lignes")
+
+    if counts is not None:
+        print("\nRapport de distribution:")
+        for path in render_report(counts, args.output_dir):
+            print(f"- {path}")
+
+    if args.metrics_report is not None:
+        instruments.write_report(args.metrics_report, script='data_generation', users=args.users, jobs=args.jobs,
+                                 workers=args.workers)
+        print(f"\nRapport de métriques : {args.metrics_report}")
+
+    print("\nLe jeu de données a été généré avec succès et est prêt à être utilisé pour l'entraînement de modèles de recommandation.")
+
 
-print("\nLe jeu de données a été généré avec succès et est prêt à être utilisé pour l'entraînement de modèles de recommandation.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
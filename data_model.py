@@ -0,0 +1,318 @@
+import argparse
+import re
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from feature_store import DEFAULT_SOURCES, safe_eval
+
+# Représentation compacte des utilisateurs, offres et interactions :
+#   - vocabulaires partagés (compétences, domaines, villes, langues) : code entier par token
+#   - identifiants externes ('user_17') -> position de ligne, sans dictionnaire de chaînes
+#   - catégories en codes int32, ensembles (compétences, langues) en CSR indptr/indices,
+#     niveaux de compétence en int8 parallèles aux indices
+# Les schémas couvrent les deux jeux de données : data_generation.py
+# (id, domain, skill_levels, ...) et data.py (job_id, category, budget, ...).
+# Les colonnes absentes sont ignorées.
+
+VOCABULARIES = ('skills', 'domains', 'locations', 'languages', 'interaction_types')
+
+USER_SCHEMA = {
+    'id': ['id'],
+    'categories': {'location': 'locations', 'domain': 'domains'},
+    'sets': {'skills': 'skills', 'languages': 'languages'},
+    'levels': {'skills': 'skill_levels'},
+    'numeric': ['rating', 'jobsCompleted']
+}
+JOB_SCHEMA = {
+    'id': ['id', 'job_id'],
+    'categories': {'location': 'locations', 'domain': 'domains', 'category': 'domains'},
+    'sets': {'required_skills': 'skills', 'required_languages': 'languages'},
+    'levels': {'required_skills': 'skill_requirements'},
+    'numeric': ['budget', 'duration_days']
+}
+INTERACTION_SCHEMA = {
+    'categories': {'interaction_type': 'interaction_types'},
+    'flags': ['viewed', 'applied', 'saved'],
+    'numeric': ['relevance_score']
+}
+
+
+def _parsed(value):
+    return safe_eval(value) if isinstance(value, str) else value
+
+
+# Vocabulaire token <-> code entier (les codes sont attribués dans l'ordre d'apparition)
+class Vocabulary:
+    def __init__(self, tokens=()):
+        self.tokens = []
+        self.index = {}
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def add(self, token):
+        code = self.index.get(token)
+        if code is None:
+            code = self.index[token] = len(self.tokens)
+            self.tokens.append(token)
+        return code
+
+    # Codes int32 ; les tokens inconnus valent -1 si grow=False
+    def encode(self, values, grow=True):
+        lookup = self.add if grow else lambda token: self.index.get(token, -1)
+        return np.fromiter((lookup(value) for value in values), dtype=np.int32, count=len(values))
+
+    def decode(self, codes):
+        return [self.tokens[code] for code in np.asarray(codes).tolist()]
+
+    def nbytes(self):
+        return sum(sys.getsizeof(token) for token in self.tokens)
+
+
+def new_vocabularies():
+    return {name: Vocabulary() for name in VOCABULARIES}
+
+
+# Identifiants externes -> positions de ligne. Les identifiants de la forme
+# '<préfixe><entier>' (user_17, job_42) sont stockés comme un préfixe et un
+# tableau int64 ; sinon on se rabat sur un vocabulaire. S'utilise comme un
+# dict en lecture (in, [], get, len).
+class IdIndex(Mapping):
+    _PATTERN = re.compile(r'(.*?)(0|[1-9][0-9]*)')
+
+    def __init__(self, ids):
+        ids = [str(i) for i in ids]
+        matches = [self._PATTERN.fullmatch(i) for i in ids]
+        prefixes = {match.group(1) for match in matches if match}
+        self.prefix = None
+        self.vocabulary = None
+        if ids and all(matches) and len(prefixes) == 1:
+            self.prefix = prefixes.pop()
+            self.numbers = np.array([int(match.group(2)) for match in matches], dtype=np.int64)
+            self._order = np.argsort(self.numbers, kind='stable')
+            self._sorted = self.numbers[self._order]
+            self._identity = bool(np.array_equal(self.numbers, np.arange(len(ids))))
+        else:
+            self.vocabulary = Vocabulary()
+            self.vocabulary.encode(ids)
+            self.numbers = None
+
+    # Index numérique reconstruit depuis ses tableaux (par exemple relus en
+    # mmap), sans reparser ni retrier les identifiants
+    @classmethod
+    def from_arrays(cls, prefix, arrays):
+        index = cls.__new__(cls)
+        index.prefix = prefix
+        index.vocabulary = None
+        index.numbers = arrays['numbers']
+        index._order = arrays['order']
+        index._sorted = arrays['sorted']
+        index._identity = bool(arrays['identity'])
+        return index
+
+    def arrays(self):
+        if self.numbers is None:
+            return None
+        return {'numbers': self.numbers, 'order': self._order, 'sorted': self._sorted,
+                'identity': np.array(self._identity)}
+
+    def __len__(self):
+        return len(self.vocabulary) if self.numbers is None else len(self.numbers)
+
+    def __iter__(self):
+        return iter(self.external(np.arange(len(self))))
+
+    def __getitem__(self, external_id):
+        row = self.row(external_id)
+        if row < 0:
+            raise KeyError(external_id)
+        return row
+
+    def row(self, external_id):
+        external_id = str(external_id)
+        if self.numbers is None:
+            return self.vocabulary.index.get(external_id, -1)
+        match = self._PATTERN.fullmatch(external_id)
+        if match is None or match.group(1) != self.prefix:
+            return -1
+        number = int(match.group(2))
+        if self._identity:
+            return number if number < len(self.numbers) else -1
+        pos = int(np.searchsorted(self._sorted, number))
+        if pos < len(self._sorted) and self._sorted[pos] == number:
+            return int(self._order[pos])
+        return -1
+
+    # Positions (int64) d'une liste d'identifiants, -1 pour les inconnus
+    def rows(self, external_ids):
+        return np.fromiter((self.row(i) for i in external_ids), dtype=np.int64, count=len(external_ids))
+
+    def external(self, rows):
+        rows = np.asarray(rows)
+        if self.numbers is None:
+            return self.vocabulary.decode(rows)
+        return [f'{self.prefix}{number}' for number in self.numbers[rows].tolist()]
+
+    def nbytes(self):
+        if self.numbers is None:
+            return self.vocabulary.nbytes()
+        return self.numbers.nbytes + self._order.nbytes + self._sorted.nbytes
+
+
+# Table compacte : identifiants, catégories, ensembles CSR, niveaux int8,
+# colonnes numériques et booléennes
+class CompactTable:
+    def __init__(self, n_rows, ids=None, categories=None, sets=None, levels=None, numeric=None, vocabularies=None):
+        self.n_rows = n_rows
+        self.ids = ids
+        self.categories = categories or {}
+        self.sets = sets or {}
+        self.levels = levels or {}
+        self.numeric = numeric or {}
+        self.vocabularies = vocabularies or {}
+        self.source_columns = []
+
+    def __len__(self):
+        return self.n_rows
+
+    # Matrice creuse (lignes x vocabulaire) d'un ensemble : binaire, ou
+    # niveaux de compétence si levels=True
+    def csr(self, column, levels=False, dtype=np.float64):
+        indptr, indices = self.sets[column]
+        data = self.levels[column] if levels else np.ones(len(indices))
+        vocabulary = self.vocabularies[column]
+        return sparse.csr_matrix((data.astype(dtype), indices, indptr), shape=(self.n_rows, len(vocabulary)))
+
+    def items(self, column, row):
+        indptr, indices = self.sets[column]
+        return self.vocabularies[column].decode(indices[indptr[row]:indptr[row + 1]])
+
+    def nbytes(self):
+        arrays = list(self.categories.values()) + list(self.levels.values()) + list(self.numeric.values())
+        arrays += [array for pair in self.sets.values() for array in pair]
+        return sum(array.nbytes for array in arrays) + (self.ids.nbytes() if self.ids is not None else 0)
+
+
+def encode_table(df, schema, vocabularies, id_index=None):
+    columns = set(df.columns)
+    table = CompactTable(len(df))
+    id_column = next((c for c in schema.get('id', []) if c in columns), None)
+    if id_column is not None:
+        table.ids = id_index if id_index is not None else IdIndex(df[id_column])
+        table.source_columns.append(id_column)
+
+    for column, name in schema.get('categories', {}).items():
+        if column in columns:
+            table.categories[column] = vocabularies[name].encode(df[column].tolist())
+            table.vocabularies[column] = vocabularies[name]
+            table.source_columns.append(column)
+
+    for column, name in schema.get('sets', {}).items():
+        if column not in columns:
+            continue
+        # Ensembles : un élément répété dans la liste source n'est gardé qu'une fois
+        values = [list(dict.fromkeys(_parsed(v) or [])) for v in df[column]]
+        lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = vocabularies[name].encode([item for v in values for item in v])
+        table.sets[column] = (indptr, indices)
+        table.vocabularies[column] = vocabularies[name]
+        table.source_columns.append(column)
+
+        level_column = schema.get('levels', {}).get(column)
+        if level_column in columns:
+            level_maps = [_parsed(v) or {} for v in df[level_column]]
+            table.levels[column] = np.fromiter((levels.get(item, 0) for levels, v in zip(level_maps, values)
+                                                for item in v), dtype=np.int8, count=int(indptr[-1]))
+            table.source_columns.append(level_column)
+
+    for column in schema.get('numeric', []):
+        if column in columns:
+            table.numeric[column] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+            table.source_columns.append(column)
+    for column in schema.get('flags', []):
+        if column in columns:
+            table.numeric[column] = df[column].to_numpy(dtype=bool)
+            table.source_columns.append(column)
+    return table
+
+
+# Jeu de données compact : utilisateurs, offres et interactions (positions
+# de ligne int32 au lieu des identifiants texte), vocabulaires partagés
+class CompactDataset:
+    def __init__(self, users, jobs, interactions, vocabularies):
+        self.users = users
+        self.jobs = jobs
+        self.interactions = interactions
+        self.vocabularies = vocabularies
+
+    @classmethod
+    def from_frames(cls, users_df, jobs_df, interactions_df=None, vocabularies=None):
+        vocabularies = new_vocabularies() if vocabularies is None else vocabularies
+        users = encode_table(users_df, USER_SCHEMA, vocabularies)
+        jobs = encode_table(jobs_df, JOB_SCHEMA, vocabularies)
+        interactions = None
+        if interactions_df is not None:
+            interactions = encode_table(interactions_df, INTERACTION_SCHEMA, vocabularies)
+            interactions.numeric['user_row'] = users.ids.rows(interactions_df['user_id'].tolist()).astype(np.int32)
+            interactions.numeric['job_row'] = jobs.ids.rows(interactions_df['job_id'].tolist()).astype(np.int32)
+            interactions.source_columns += ['user_id', 'job_id']
+        return cls(users, jobs, interactions, vocabularies)
+
+    def nbytes(self):
+        tables = [t for t in (self.users, self.jobs, self.interactions) if t is not None]
+        return sum(t.nbytes() for t in tables) + sum(v.nbytes() for v in self.vocabularies.values())
+
+
+# Mémoire des colonnes encodées des DataFrames (objets Python compris) face
+# à la forme compacte ; les colonnes non encodées (texte libre, expériences)
+# ne sont comptées d'aucun côté
+def memory_report(frames, dataset):
+    tables = {'users': dataset.users, 'jobs': dataset.jobs, 'interactions': dataset.interactions}
+    report = {}
+    for name, df in frames.items():
+        if df is None or tables.get(name) is None:
+            continue
+        before = int(df[tables[name].source_columns].memory_usage(deep=True, index=False).sum())
+        after = tables[name].nbytes()
+        report[name] = {'dataframe_bytes': before, 'compact_bytes': after,
+                        'ratio': before / after if after else float('inf')}
+    report['vocabularies'] = {'compact_bytes': sum(v.nbytes() for v in dataset.vocabularies.values())}
+    total_before = sum(r.get('dataframe_bytes', 0) for r in report.values())
+    report['total'] = {'dataframe_bytes': total_before, 'compact_bytes': dataset.nbytes(),
+                       'ratio': total_before / dataset.nbytes() if dataset.nbytes() else float('inf')}
+    return report
+
+
+def print_memory_report(report):
+    print(f"{'table':<14}{'dataframe':>14}{'compact':>14}{'ratio':>9}")
+    for name, row in report.items():
+        before = f"{row['dataframe_bytes'] / 1e6:.2f} MB" if 'dataframe_bytes' in row else '-'
+        ratio = f"{row['ratio']:.1f}x" if 'ratio' in row else '-'
+        print(f"{name:<14}{before:>14}{row['compact_bytes'] / 1e6:>11.2f} MB{ratio:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode the datasets compactly and report the memory savings.")
+    parser.add_argument('--users', default=DEFAULT_SOURCES['users'])
+    parser.add_argument('--jobs', default=DEFAULT_SOURCES['jobs'])
+    parser.add_argument('--interactions', default=DEFAULT_SOURCES['interactions'])
+    args = parser.parse_args()
+
+    # Colonnes imbriquées parsées comme dans le pipeline (listes/dicts Python)
+    frames = {}
+    for name, path in (('users', args.users), ('jobs', args.jobs), ('interactions', args.interactions)):
+        df = pd.read_csv(path)
+        for column in df.columns:
+            first = df[column].dropna()
+            if len(first) and isinstance(first.iloc[0], str) and first.iloc[0].lstrip()[:1] in ('[', '{'):
+                df[column] = df[column].apply(safe_eval)
+        frames[name] = df
+    dataset = CompactDataset.from_frames(frames['users'], frames['jobs'], frames['interactions'])
+    print_memory_report(memory_report(frames, dataset))
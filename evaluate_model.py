@@ -1,107 +1,24 @@
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-import ast
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MinMaxScaler
 import numpy as np
-import joblib
-
-# Charger les données
-try:
-    users_df = pd.read_csv('users_synthetic.csv')
-    jobs_df = pd.read_csv('jobs_synthetic.csv')
-    interactions_df = pd.read_csv('interactions_synthetic.csv')
-except FileNotFoundError as e:
-    print(f"Error: {e}. Please ensure the CSV files exist in the directory.")
-    exit(1)
-
-# Nettoyage des données
-def safe_eval(x):
-    try:
-        return ast.literal_eval(x)
-    except (ValueError, SyntaxError):
-        return []
-
-users_df['skills'] = users_df['skills'].apply(safe_eval)
-jobs_df['required_skills'] = jobs_df['required_skills'].apply(safe_eval)
-
-# Gérer les valeurs nulles
-users_df['rating'] = users_df['rating'].fillna(users_df['rating'].mean())
-users_df['jobsCompleted'] = users_df['jobsCompleted'].fillna(0)
-users_df['location'] = users_df['location'].str.capitalize()
-jobs_df['location'] = jobs_df['location'].str.capitalize()
-
-# Vérifier les doublons
-users_df = users_df.drop_duplicates(subset=['id'])
-jobs_df = jobs_df.drop_duplicates(subset=['job_id'])
-
-# Normaliser jobsCompleted et duration_days
-scaler = MinMaxScaler()
-users_df['jobsCompleted_scaled'] = scaler.fit_transform(users_df[['jobsCompleted']])
-jobs_df['duration_scaled'] = scaler.fit_transform(jobs_df[['duration_days']])
-jobs_df['budget_scaled'] = scaler.fit_transform(jobs_df[['budget']])
-
-# Préparer les features pour le content-based
-users_df['skills_str'] = users_df['skills'].apply(lambda x: ' '.join(x))
-jobs_df['required_skills_str'] = jobs_df['required_skills'].apply(lambda x: ' '.join(x))
-
-tfidf = TfidfVectorizer()
-user_skills_tfidf = tfidf.fit_transform(users_df['skills_str'])
-job_skills_tfidf = tfidf.transform(jobs_df['required_skills_str'])
-skills_similarity = cosine_similarity(user_skills_tfidf, job_skills_tfidf)
-
-location_similarity = np.zeros((len(users_df), len(jobs_df)))
-for i, user_loc in enumerate(users_df['location']):
-    for j, job_loc in enumerate(jobs_df['location']):
-        location_similarity[i, j] = 1 if user_loc == job_loc else 0.5
-
-experience_similarity = np.zeros((len(users_df), len(jobs_df)))
-for i, user_exp in enumerate(users_df['jobsCompleted_scaled']):
-    for j, job_duration in enumerate(jobs_df['duration_scaled']):
-        experience_similarity[i, j] = 1 - abs(user_exp - job_duration)
-
-# Charger les modèles
-model_files = {
-    'Logistic Regression': 'logistic_regression.pkl',
-    'Random Forest': 'random_forest.pkl',
-    'Gradient Boosting': 'gradient_boosting.pkl',
-    'XGBoost': 'xgboost.pkl'
-}
-best_models = {}
-for name, file in model_files.items():
-    try:
-        best_models[name] = joblib.load(file)
-        print(f"Loaded {name} from {file}")
-    except FileNotFoundError:
-        print(f"Error: {file} not found. Please run the training script first.")
-        exit(1)
+
+from instrumentation import instruments, start_metrics_server
+from metrics import ranking_metrics, relevance_matrix
+from recommender import Recommender, default_model_files
+
+# Service de recommandation chargé paresseusement : importer ce module ne
+# charge ni les données ni les modèles
+recommender = Recommender()
 
 # Fonction pour générer des recommandations avec un modèle
 def recommend_jobs(model, user_id, top_n=5):
-    try:
-        user_idx = users_df[users_df['id'] == user_id].index[0]
-    except IndexError:
-        print(f"Error: User {user_id} not found in the dataset.")
-        return pd.DataFrame()
-    
-    test_data = []
-    for job_idx in range(len(jobs_df)):
-        test_data.append({
-            'skill_similarity': skills_similarity[user_idx, job_idx],
-            'location_similarity': location_similarity[user_idx, job_idx],
-            'experience_similarity': experience_similarity[user_idx, job_idx],
-            'user_rating': users_df.loc[user_idx, 'rating'],
-            'user_jobsCompleted': users_df.loc[user_idx, 'jobsCompleted_scaled'],
-            'job_budget': jobs_df.loc[job_idx, 'budget_scaled'],
-            'job_duration': jobs_df.loc[job_idx, 'duration_scaled']
-        })
-    
-    test_df = pd.DataFrame(test_data)
-    scores = model.predict_proba(test_df)[:, 1]
-    top_indices = np.argsort(scores)[::-1][:top_n]
-    recommended_jobs = jobs_df.iloc[top_indices][['job_id', 'title', 'category', 'location', 'required_skills']]
-    recommended_jobs['score'] = scores[top_indices]
-    return recommended_jobs
+    return recommender.recommend(model, user_id, top_n)
 
 # Fonction pour calculer nDCG@K
 def calculate_ndcg(recommended_jobs, relevant_jobs, top_n):
@@ -113,15 +30,37 @@ def calculate_ndcg(recommended_jobs, relevant_jobs, top_n):
         idcg += 1.0 / np.log2(i + 1)
     return dcg / idcg if idcg > 0 else 0.0
 
+# Cache des recommandations par (modèle, top_n) : chaque couple (modèle,
+# utilisateur) n'est scoré qu'une fois, et toutes les métriques en découlent
+_score_cache = {}
+
+def cached_recommendations(model, user_ids, top_n=5):
+    cache = _score_cache.setdefault((model, top_n), {})
+    missing = [user_id for user_id in user_ids if user_id not in cache]
+    if missing:
+        cache.update(recommender.recommend_batch(model, missing, top_n))
+    return {user_id: cache[user_id] for user_id in user_ids}
+
+def clear_score_cache():
+    _score_cache.clear()
+
+# Index user_id -> offres candidatées, construit une fois au premier usage
+_relevant_index = None
+
+def relevant_jobs_for(user_id):
+    global _relevant_index
+    if _relevant_index is None:
+        _relevant_index = build_relevant_index(recommender.interactions_df)
+    return _relevant_index.get(user_id, set())
+
 # Fonction pour évaluer les recommandations
 def evaluate_recommendations(model, user_id, top_n=5):
-    recommended_jobs = recommend_jobs(model, user_id, top_n)
-    recommended_job_ids = set(recommended_jobs['job_id'].values)
-    
-    relevant_jobs = set(interactions_df[
-        (interactions_df['user_id'] == user_id) & 
-        (interactions_df['interaction_type'] == 'applied')
-    ]['job_id'].values)
+    recommended_jobs = cached_recommendations(model, [user_id], top_n)[user_id]
+    return recommendation_metrics(recommended_jobs, relevant_jobs_for(user_id), top_n)
+
+# Métriques d'un utilisateur à partir de ses recommandations et de ses offres pertinentes
+def recommendation_metrics(recommended_jobs, relevant_jobs, top_n=5):
+    recommended_job_ids = set(recommended_jobs['job_id'].values) if not recommended_jobs.empty else set()
     
     if len(recommended_job_ids) == 0:
         precision = 0.0
@@ -141,7 +80,7 @@ def evaluate_recommendations(model, user_id, top_n=5):
         f1_score = 2 * (precision * recall) / (precision + recall)
     
     mrr = 0.0
-    for rank, job_id in enumerate(recommended_jobs['job_id'], 1):
+    for rank, job_id in enumerate(recommended_jobs.get('job_id', []), 1):
         if job_id in relevant_jobs:
             mrr = 1.0 / rank
             break
@@ -161,18 +100,24 @@ def evaluate_recommendations(model, user_id, top_n=5):
 # Fonction pour évaluer tous les modèles
 def evaluate_model(n_users=20, top_n=5):
     results = {}
-    for name, model in best_models.items():
+    users_df = recommender.users_df
+    for name, model in recommender.models.items():
         print(f"\nEvaluating {name}...")
         metrics_list = []
-        for user_id in users_df['id'].sample(n_users, random_state=42):
-            recommendations = recommend_jobs(model, user_id, top_n)
+        user_ids = list(users_df['id'].sample(n_users, random_state=42))
+        # Un seul passage de scoring par lot pour tous les utilisateurs échantillonnés
+        with instruments.timer('evaluate.recommend'):
+            all_recommendations = cached_recommendations(model, user_ids, top_n)
+        for user_id in user_ids:
+            recommendations = all_recommendations[user_id]
             if not recommendations.empty and user_id == 'user_1':
                 print(f"\nUser: {user_id}")
                 print("Recommended jobs:")
                 print(recommendations[['job_id', 'title', 'category', 'location', 'score']])
                 print("-" * 50)
             
-            metrics = evaluate_recommendations(model, user_id, top_n)
+            with instruments.timer('evaluate.metrics'):
+                metrics = evaluate_recommendations(model, user_id, top_n)
             metrics['user_id'] = user_id
             metrics_list.append(metrics)
         
@@ -193,8 +138,131 @@ def evaluate_model(n_users=20, top_n=5):
     print(metrics_comparison)
     
     # Afficher le meilleur modèle
-    best_model_name = metrics_comparison['precision@5'].idxmax()
+    best_model_name = metrics_comparison[f'precision@{top_n}'].idxmax()
     print(f"\nBest Model: {best_model_name}")
 
+# Index user_id -> ensemble des offres auxquelles l'utilisateur a candidaté
+def build_relevant_index(interactions_df):
+    applied = interactions_df[interactions_df['interaction_type'] == 'applied']
+    return {user_id: set(job_ids) for user_id, job_ids in
+            applied.groupby('user_id', observed=True)['job_id']}
+
+# Initialisation d'un processus d'évaluation : les tableaux exportés par le
+# processus principal sont ouverts en mémoire mappée (lecture seule, une seule
+# copie physique partagée) et les générateurs aléatoires sont fixés. Les
+# mesures héritées du processus principal (fork) sont effacées.
+def _init_worker(arrays_dir, seed, model_files):
+    global recommender
+    instruments.reset()
+    random.seed(seed)
+    np.random.seed(seed)
+    recommender = Recommender.from_arrays(arrays_dir, model_files=model_files)
+
+# Recommandations (indices d'offres) d'un lot d'utilisateurs pour un modèle
+def _recommend_shard(model_name, user_ids, top_n):
+    indices, _ = recommender.recommend_indices(model_name, user_ids, top_n)
+    return indices
+
+# Version exécutée dans un processus : les mesures du processus sont
+# renvoyées avec les indices et fusionnées par le processus principal
+def _recommend_shard_task(model_name, user_ids, top_n):
+    return _recommend_shard(model_name, user_ids, top_n), instruments.drain()
+
+# Évaluer tous les modèles sur tous les utilisateurs ayant des interactions,
+# répartis en lots sur `workers` processus. Les processus ne renvoient que les
+# indices recommandés ; les métriques sont calculées ensuite pour toute la
+# population et pour chaque K de `ks` (module metrics). Le résultat ne dépend
+# pas du nombre de processus : lots et ordre de fusion sont déterministes.
+def evaluate_all_users(top_n=5, workers=1, seed=42, n_users=None, shard_size=None, ks=None):
+    ks = sorted(set(ks or [top_n]))
+    interactions_df = recommender.interactions_df
+    user_ids = sorted(str(user_id) for user_id in interactions_df['user_id'].unique()
+                      if user_id in recommender.user_positions)
+    if n_users is not None and n_users < len(user_ids):
+        user_ids = sorted(random.Random(seed).sample(user_ids, n_users))
+    if shard_size is None:
+        shard_size = max(1, min(256, -(-len(user_ids) // (4 * workers))))
+    shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+    print(f"Evaluating {len(user_ids)} users in {len(shards)} shards with {workers} worker(s)")
+
+    with instruments.timer('evaluate.relevance'):
+        job_positions = {str(job_id): pos for pos, job_id in enumerate(recommender.jobs_df['job_id'])}
+        relevance = relevance_matrix(interactions_df, {u: i for i, u in enumerate(user_ids)}, job_positions)
+
+    arrays_dir = None
+    pool = None
+    if workers > 1:
+        arrays_dir = tempfile.mkdtemp(prefix='recommender_arrays_')
+        recommender.export_arrays(arrays_dir)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(arrays_dir, seed, recommender.model_files))
+
+    results = {}
+    try:
+        for name in recommender.model_files:
+            start = time.perf_counter()
+            if pool is None:
+                recommender.model(name)
+                shard_indices = [_recommend_shard(name, shard, ks[-1]) for shard in shards]
+            else:
+                shard_indices = []
+                for indices, snapshot in pool.map(_recommend_shard_task, [name] * len(shards), shards,
+                                                  [ks[-1]] * len(shards)):
+                    shard_indices.append(indices)
+                    instruments.merge(snapshot)
+            recommended = np.vstack(shard_indices)
+            scoring_time = time.perf_counter() - start
+            instruments.observe('evaluate.score', scoring_time)
+            with instruments.timer('evaluate.metrics'):
+                results[name] = ranking_metrics(recommended, relevance, ks, n_jobs=len(job_positions))
+            instruments.count('evaluate.users', len(user_ids))
+            results[name]['wall_clock_s'] = time.perf_counter() - start
+            print(f"{name}: {len(user_ids)} users scored in {scoring_time:.2f}s, "
+                  f"total {results[name]['wall_clock_s']:.2f}s")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if arrays_dir is not None:
+            shutil.rmtree(arrays_dir, ignore_errors=True)
+
+    print("\nComparison of Models:")
+    metrics_comparison = pd.DataFrame(results).T
+    print(metrics_comparison)
+    return metrics_comparison
+
 if __name__ == "__main__":
-    evaluate_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the recommendation models.")
+    parser.add_argument('--all-users', action='store_true',
+                        help="Evaluate every user with interactions instead of a sample")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for --all-users (default: 1)")
+    parser.add_argument('--n-users', type=int, default=None)
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--k', type=int, nargs='+', default=None,
+                        help="Cutoffs for --all-users metrics, e.g. --k 5 10 20 (default: --top-n)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--artifacts-dir', default=None,
+                        help="Evaluate the models published in this directory (default: models/LATEST, else ./*.pkl)")
+    parser.add_argument('--version', default=None, help="Published model version to evaluate (default: LATEST)")
+    parser.add_argument('--metrics-report', default=None, help="Write per-stage timings and counters to this JSON file")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Expose Prometheus metrics on http://0.0.0.0:PORT/metrics during the evaluation")
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+    try:
+        recommender = Recommender(model_files=default_model_files(args.artifacts_dir, args.version))
+        cold_start = recommender.warm()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Cold start: {cold_start['total']:.2f}s (data {cold_start['data']:.2f}s)")
+    if args.all_users:
+        evaluate_all_users(top_n=args.top_n, workers=max(1, args.workers), seed=args.seed,
+                           n_users=args.n_users, ks=args.k)
+    else:
+        evaluate_model(n_users=args.n_users or 20, top_n=args.top_n)
+    if args.metrics_report is not None:
+        instruments.write_report(args.metrics_report, script='evaluate_model', cold_start=cold_start)
+        print(f"Metrics report written to {args.metrics_report}")
\ No newline at end of file
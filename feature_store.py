@@ -0,0 +1,329 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from instrumentation import instruments
+
+# Version du format : un changement invalide les stores existants
+FEATURE_STORE_VERSION = 1
+DEFAULT_STORE_DIR = 'feature_store'
+MANIFEST_FILE = 'manifest.json'
+
+# Fichiers sources du pipeline d'entraînement / évaluation
+DEFAULT_SOURCES = {
+    'users': 'users_synthetic.csv',
+    'jobs': 'jobs_synthetic.csv',
+    'interactions': 'interactions_synthetic.csv'
+}
+DEFAULT_UNIQUE_KEYS = {'users': 'id', 'jobs': 'job_id'}
+
+# Colonnes partageant un même vocabulaire (les compétences des utilisateurs
+# et des offres doivent avoir les mêmes identifiants)
+SHARED_VOCABULARIES = {
+    'skills': ['skills', 'skill_levels', 'required_skills', 'skill_requirements'],
+    'languages': ['languages', 'required_languages']
+}
+
+
+# Nettoyage des données
+def safe_eval(x):
+    try:
+        return ast.literal_eval(x)
+    except (ValueError, SyntaxError):
+        return []
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_info(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# 1. Analyse des colonnes
+# -----------------------
+
+def _is_literal_column(series):
+    values = series.dropna()
+    if values.empty or not isinstance(values.iloc[0], str):
+        return False
+    return values.iloc[0].lstrip()[:1] in ('[', '{')
+
+
+# Type de stockage d'une colonne déjà parsée :
+#   numeric  -> .npy tel quel
+#   category -> codes int32 + catégories
+#   list     -> CSR (indptr, indices) sur un vocabulaire
+#   dict     -> CSR (indptr, indices, data) pour des dict {str: int}
+#   json     -> structures imbriquées, sérialisées en JSON
+def _column_kind(values, parsed):
+    if not parsed:
+        return 'numeric' if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values) else 'category'
+    non_empty = [v for v in values if v]
+    if all(isinstance(v, list) and all(isinstance(x, str) for x in v) for v in non_empty):
+        return 'list'
+    if all(isinstance(v, dict) and all(isinstance(k, str) and isinstance(x, int) for k, x in v.items())
+           for v in non_empty):
+        return 'dict'
+    return 'json'
+
+
+def _vocabulary_name(table, column):
+    for name, columns in SHARED_VOCABULARIES.items():
+        if column in columns:
+            return name
+    return f'{table}__{column}'
+
+
+def _keys(value):
+    return list(value.keys()) if isinstance(value, dict) else list(value or [])
+
+
+# 2. Construction du store
+# ------------------------
+
+def build_feature_store(sources=None, store_dir=DEFAULT_STORE_DIR, unique_keys=None):
+    sources = dict(DEFAULT_SOURCES if sources is None else sources)
+    unique_keys = DEFAULT_UNIQUE_KEYS if unique_keys is None else unique_keys
+    start = time.perf_counter()
+
+    # Lecture et parsing (une seule fois) de toutes les tables
+    tables = {}
+    for table, path in sources.items():
+        with instruments.timer('load.read_csv'):
+            df = pd.read_csv(path)
+        instruments.count('load.rows', len(df))
+        key = unique_keys.get(table)
+        if key is not None and key in df.columns:
+            df = df.drop_duplicates(subset=[key]).reset_index(drop=True)
+        columns = {}
+        with instruments.timer('load.safe_eval'):
+            for column in df.columns:
+                parsed = _is_literal_column(df[column])
+                values = df[column].apply(safe_eval).tolist() if parsed else df[column]
+                columns[column] = (_column_kind(values, parsed), values)
+        tables[table] = (len(df), columns)
+
+    # Vocabulaires (partagés entre colonnes de même nature)
+    vocabularies = {}
+    for table, (_, columns) in tables.items():
+        for column, (kind, values) in columns.items():
+            if kind in ('list', 'dict'):
+                vocabulary = vocabularies.setdefault(_vocabulary_name(table, column), {})
+                for value in values:
+                    for item in _keys(value):
+                        vocabulary.setdefault(item, len(vocabulary))
+
+    write_start = time.perf_counter()
+    tmp_dir = store_dir.rstrip('/\\') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    def save(name, array):
+        np.save(os.path.join(tmp_dir, name + '.npy'), array, allow_pickle=False)
+
+    for name, vocabulary in vocabularies.items():
+        save(f'vocabulary__{name}', np.array(list(vocabulary), dtype=str))
+
+    manifest = {
+        'version': FEATURE_STORE_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sources': {},
+        'tables': {}
+    }
+    for table, (n_rows, columns) in tables.items():
+        specs = {}
+        for column, (kind, values) in columns.items():
+            prefix = f'{table}__{column}'
+            spec = {'kind': kind}
+            if kind == 'numeric':
+                save(prefix, values.to_numpy())
+            elif kind == 'category':
+                codes, categories = pd.factorize(values)
+                save(prefix, codes.astype(np.int32))
+                save(prefix + '__categories', np.array([str(c) for c in categories], dtype=str))
+            elif kind in ('list', 'dict'):
+                spec['vocabulary'] = _vocabulary_name(table, column)
+                vocabulary = vocabularies[spec['vocabulary']]
+                lengths = np.fromiter((len(_keys(v)) for v in values), dtype=np.int64, count=n_rows)
+                indptr = np.concatenate([[0], np.cumsum(lengths)])
+                indices = np.fromiter((vocabulary[k] for v in values for k in _keys(v)),
+                                      dtype=np.int32, count=int(indptr[-1]))
+                save(prefix + '__indptr', indptr)
+                save(prefix + '__indices', indices)
+                if kind == 'dict':
+                    data = np.fromiter((x for v in values if isinstance(v, dict) for x in v.values()),
+                                       dtype=np.int64, count=int(indptr[-1]))
+                    fits_int8 = data.size == 0 or (data.min() >= -128 and data.max() <= 127)
+                    save(prefix + '__data', data.astype(np.int8 if fits_int8 else np.int32))
+            else:
+                with open(os.path.join(tmp_dir, prefix + '.json'), 'w', encoding='utf-8') as f:
+                    json.dump(list(values), f, ensure_ascii=False, default=str)
+            specs[column] = spec
+        manifest['tables'][table] = {'rows': n_rows, 'columns': specs}
+        manifest['sources'][table] = dict(_source_info(sources[table]), sha256=file_hash(sources[table]))
+
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    # Remplacer l'ancien store seulement une fois le nouveau complet
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    instruments.observe('load.store_write', time.perf_counter() - write_start)
+    print(f"Feature store built in {store_dir} ({time.perf_counter() - start:.2f}s)")
+    return FeatureStore(store_dir, manifest)
+
+
+# 3. Lecture du store
+# -------------------
+
+class FeatureStore:
+    def __init__(self, store_dir, manifest):
+        self.store_dir = store_dir
+        self.manifest = manifest
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def _load(self, name):
+        return np.load(self._path(name + '.npy'), mmap_mode='r')
+
+    def columns(self, table):
+        return self.manifest['tables'][table]['columns']
+
+    def n_rows(self, table):
+        return self.manifest['tables'][table]['rows']
+
+    def vocabulary(self, name):
+        return self._load(f'vocabulary__{name}')
+
+    # Tableau mappé en mémoire d'une colonne numérique ou des codes d'une catégorie
+    def array(self, table, column):
+        return self._load(f'{table}__{column}')
+
+    def categories(self, table, column):
+        return self._load(f'{table}__{column}__categories')
+
+    # Matrice CSR (lignes x vocabulaire) d'une colonne list/dict
+    def csr(self, table, column):
+        spec = self.columns(table)[column]
+        prefix = f'{table}__{column}'
+        indptr = self._load(prefix + '__indptr')
+        indices = self._load(prefix + '__indices')
+        if spec['kind'] == 'dict':
+            data = np.asarray(self._load(prefix + '__data'))
+        else:
+            data = np.ones(len(indices), dtype=np.float64)
+        vocabulary = self.vocabulary(spec['vocabulary'])
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(self.n_rows(table), len(vocabulary)))
+        return matrix, vocabulary
+
+    # Listes Python d'une colonne list/dict (toutes les lignes ou une sélection)
+    def lists(self, table, column, rows=None):
+        spec = self.columns(table)[column]
+        prefix = f'{table}__{column}'
+        indptr = self._load(prefix + '__indptr')
+        indices = self._load(prefix + '__indices')
+        vocabulary = self.vocabulary(spec['vocabulary'])
+        rows = range(self.n_rows(table)) if rows is None else rows
+        if spec['kind'] == 'dict':
+            data = self._load(prefix + '__data')
+            return [dict(zip(vocabulary[indices[indptr[r]:indptr[r + 1]]].tolist(),
+                             data[indptr[r]:indptr[r + 1]].tolist())) for r in rows]
+        return [vocabulary[indices[indptr[r]:indptr[r + 1]]].tolist() for r in rows]
+
+    def objects(self, table, column):
+        with open(self._path(f'{table}__{column}.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    # DataFrame des colonnes demandées (par défaut les colonnes scalaires)
+    def frame(self, table, columns=None):
+        specs = self.columns(table)
+        if columns is None:
+            columns = [c for c, spec in specs.items() if spec['kind'] in ('numeric', 'category')]
+        data = {}
+        for column in columns:
+            kind = specs[column]['kind']
+            if kind == 'numeric':
+                data[column] = np.asarray(self.array(table, column))
+            elif kind == 'category':
+                data[column] = pd.Categorical.from_codes(np.asarray(self.array(table, column)),
+                                                         np.asarray(self.categories(table, column)))
+            elif kind in ('list', 'dict'):
+                data[column] = self.lists(table, column)
+            else:
+                data[column] = self.objects(table, column)
+        return pd.DataFrame(data, columns=columns)
+
+
+def read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# Le store est à jour si la version correspond et si chaque source est
+# inchangée (taille et date identiques, sinon même hash SHA-256)
+def is_up_to_date(manifest, sources):
+    if manifest is None or manifest.get('version') != FEATURE_STORE_VERSION:
+        return False
+    if set(manifest['sources']) != set(sources):
+        return False
+    for table, path in sources.items():
+        recorded = manifest['sources'][table]
+        if not os.path.exists(path):
+            # Déploiement sans les CSV : on se fie au store existant
+            continue
+        info = _source_info(path)
+        if info['size'] == recorded['size'] and info['mtime_ns'] == recorded['mtime_ns']:
+            continue
+        if info['size'] != recorded['size'] or file_hash(path) != recorded['sha256']:
+            return False
+    return True
+
+
+# Charger le store, en le reconstruisant seulement si les sources ont changé
+def load_feature_store(sources=None, store_dir=DEFAULT_STORE_DIR, unique_keys=None, rebuild=False):
+    sources = dict(DEFAULT_SOURCES if sources is None else sources)
+    manifest = read_manifest(store_dir)
+    if not rebuild and is_up_to_date(manifest, sources):
+        return FeatureStore(store_dir, manifest)
+    for path in sources.values():
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"[Errno 2] No such file or directory: '{path}'")
+    return build_feature_store(sources, store_dir, unique_keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse the CSV sources once and write the feature store.")
+    parser.add_argument('--users', default=DEFAULT_SOURCES['users'])
+    parser.add_argument('--jobs', default=DEFAULT_SOURCES['jobs'])
+    parser.add_argument('--interactions', default=DEFAULT_SOURCES['interactions'])
+    parser.add_argument('--job-key', default=DEFAULT_UNIQUE_KEYS['jobs'],
+                        help="Identifier column of the jobs table ('id' for freelance_jobs_maroc.csv)")
+    parser.add_argument('--out', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the sources are unchanged")
+    args = parser.parse_args()
+
+    load_feature_store(
+        {'users': args.users, 'jobs': args.jobs, 'interactions': args.interactions},
+        store_dir=args.out,
+        unique_keys={'users': 'id', 'jobs': args.job_key},
+        rebuild=args.force
+    )
@@ -0,0 +1,209 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+# Instrumentation légère du pipeline : chronomètres et compteurs par étape
+# (chargement, features, scoring, classement...), agrégés en mémoire
+# (nombre d'appels, total, min, max) et exportés en rapport JSON par
+# exécution ou au format texte Prometheus.
+#
+#   with instruments.timer('score.predict'):
+#       ...
+#   @instruments.timed('generate.users')
+#   def generate_users(...):
+#   instruments.count('score.pairs', n)
+#
+# Un chronomètre coûte ~1 µs (deux perf_counter et un verrou) : il entoure
+# des étapes (un bloc d'utilisateurs, un fichier), jamais une ligne, et peut
+# rester actif en production. JOBREC_INSTRUMENTATION=0 désactive
+# l'enregistrement ; timer().seconds reste mesuré.
+#
+# Les processus de travail renvoient drain() avec leurs résultats et le
+# processus principal les fusionne avec merge().
+
+DEFAULT_PREFIX = 'jobrec'
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'start', 'seconds')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        self.registry.observe(self.name, self.seconds)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # nom -> [appels, total, min, max] (secondes)
+            self._timers = {}
+            self._counters = {}
+            self._gauges = {}
+            self.started_at = datetime.now(timezone.utc)
+            self._start = time.perf_counter()
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def timed(self, name):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with _Timer(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds, calls=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                self._timers[name] = [calls, seconds, seconds, seconds]
+            else:
+                stats[0] += calls
+                stats[1] += seconds
+                stats[2] = min(stats[2], seconds)
+                stats[3] = max(stats[3], seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    # Mesures brutes (sérialisables), remises à zéro : à renvoyer depuis un
+    # processus de travail
+    def drain(self):
+        with self._lock:
+            snapshot = {'timers': self._timers, 'counters': self._counters}
+            self._timers = {}
+            self._counters = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        if not snapshot:
+            return
+        with self._lock:
+            for name, (calls, total, low, high) in snapshot['timers'].items():
+                stats = self._timers.setdefault(name, [0, 0.0, low, high])
+                stats[0] += calls
+                stats[1] += total
+                stats[2] = min(stats[2], low)
+                stats[3] = max(stats[3], high)
+            for name, value in snapshot['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    # Rapport structuré de l'exécution : étapes triées par temps total
+    def report(self, **extra):
+        with self._lock:
+            timers = sorted(self._timers.items(), key=lambda item: -item[1][1])
+            counters = dict(sorted(self._counters.items()))
+            gauges = dict(sorted(self._gauges.items()))
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_s': time.perf_counter() - self._start,
+            'pid': os.getpid(),
+            'stages': {name: {'calls': calls, 'total_s': total, 'mean_s': total / calls,
+                              'min_s': low, 'max_s': high}
+                       for name, (calls, total, low, high) in timers},
+            'counters': counters,
+            'gauges': gauges,
+            **extra
+        }
+
+    def write_report(self, path, **extra):
+        report = self.report(**extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        return report
+
+    # Format texte d'exposition Prometheus : un résumé <prefix>_stage_seconds
+    # étiqueté par étape, un compteur <prefix>_<nom>_total par compteur
+    def prometheus(self, prefix=DEFAULT_PREFIX):
+        with self._lock:
+            timers = sorted(self._timers.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        lines = []
+        if timers:
+            metric = f'{prefix}_stage_seconds'
+            lines += [f'# HELP {metric} Time spent in pipeline stages.', f'# TYPE {metric} summary']
+            for name, (calls, total, _, _) in timers:
+                label = _label(name)
+                lines += [f'{metric}_count{{stage="{label}"}} {calls}',
+                          f'{metric}_sum{{stage="{label}"}} {total!r}']
+            lines += [f'# HELP {metric}_max Longest single call of each stage.', f'# TYPE {metric}_max gauge']
+            lines += [f'{metric}_max{{stage="{_label(name)}"}} {high!r}' for name, (_, _, _, high) in timers]
+        for name, value in counters:
+            metric = f'{prefix}_{_metric_name(name)}_total'
+            lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+        for name, value in gauges:
+            metric = f'{prefix}_{_metric_name(name)}'
+            lines += [f'# TYPE {metric} gauge', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Point d'accès Prometheus optionnel pour les scripts (GET /metrics), dans un
+# thread démon : il s'arrête avec le processus
+def start_metrics_server(port, host='0.0.0.0', registry=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = instruments if registry is None else registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            payload = registry.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Registre du processus, partagé par tous les modules
+instruments = Instrumentation(enabled=os.environ.get('JOBREC_INSTRUMENTATION', '1') != '0')
@@ -0,0 +1,381 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_model import IdIndex
+from scoring import JobFeatures
+
+# Catalogue d'offres modifiable sans tout recalculer. Ajouter, modifier ou
+# faire expirer des offres ne coûte que O(offres modifiées) :
+#   - l'encodage des offres est figé (JobEncoder) : vocabulaire de
+#     compétences, idf TF-IDF appris sur les utilisateurs, paramètres des
+#     MinMaxScaler et codes de localisation ;
+#   - les tableaux côté offre sont en ajout seul (GrowableArray/GrowableCSR,
+#     capacité doublée), une offre modifiée est ajoutée en fin de tableau et
+#     son ancienne ligne devient une pierre tombale (job_active) ;
+#   - les index inversés et l'IVF reçoivent les nouvelles offres dans un
+#     segment delta.
+# La compaction retire les pierres tombales et reconstruit les index ; elle
+# est lancée dès que pierres tombales ou segment delta dépassent
+# compact_ratio du catalogue.
+
+# Colonnes mises à l'échelle comme dans Recommender._load_data
+SCALED_COLUMNS = {'budget': 'budget_scaled', 'duration_days': 'duration_scaled'}
+POSTED_COLUMNS = ('posted_date', 'created_at')
+REQUIRED_COLUMNS = ('job_id', 'location', 'required_skills', *SCALED_COLUMNS)
+
+
+# 1. Encodage figé des offres
+# ---------------------------
+
+class JobEncoder:
+    def __init__(self, skill_columns, skill_tfidf, scalers, locations, pairwise_names):
+        self.skill_columns = dict(skill_columns)
+        self.skill_tfidf = skill_tfidf
+        self.scalers = dict(scalers)
+        self.locations = dict(locations)
+        self.pairwise_names = list(pairwise_names)
+        unsupported = set(self.pairwise_names) - {'location_similarity', 'experience_similarity'}
+        if unsupported:
+            raise ValueError(f"No incremental encoder for pairwise features {sorted(unsupported)}")
+
+    # Paramètres appris au chargement des données (avant toute modification)
+    @classmethod
+    def from_recommender(cls, recommender):
+        from sklearn.preprocessing import MinMaxScaler
+        from similarity import skills_tfidf
+
+        store = recommender.store
+        if store is None:
+            raise ValueError("The job encoder needs the feature store (or a job_encoder.json export)")
+        user_skills, vocabulary = store.csr('users', 'skills')
+        job_skills, _ = store.csr('jobs', 'required_skills')
+        _, _, skill_tfidf = skills_tfidf(user_skills, job_skills, vocabulary, return_encoder=True)
+
+        jobs_df = recommender.jobs_df
+        scalers = {}
+        for column in SCALED_COLUMNS:
+            scaler = MinMaxScaler().fit(jobs_df[[column]])
+            scalers[column] = (float(scaler.scale_[0]), float(scaler.min_[0]))
+        _, uniques = pd.factorize(pd.concat([pd.Series(recommender.users_df['location']),
+                                             pd.Series(jobs_df['location'])], ignore_index=True))
+        locations = {str(value): code for code, value in enumerate(uniques)}
+        return cls({str(skill): column for column, skill in enumerate(vocabulary)}, skill_tfidf, scalers,
+                   locations, recommender.similarity_provider.pairwise_features.names)
+
+    def to_dict(self):
+        return {'skill_columns': self.skill_columns,
+                'token_columns': self.skill_tfidf.token_columns,
+                'idf': self.skill_tfidf.idf.tolist(),
+                'scalers': self.scalers, 'locations': self.locations, 'pairwise_names': self.pairwise_names}
+
+    @classmethod
+    def from_dict(cls, state):
+        from similarity import SkillTfidfEncoder
+
+        return cls(state['skill_columns'], SkillTfidfEncoder(state['token_columns'], state['idf']),
+                   {column: tuple(params) for column, params in state['scalers'].items()},
+                   state['locations'], state['pairwise_names'])
+
+    # Tableaux côté offre de nouvelles offres (DataFrame au format des
+    # offres du store : job_id, location, required_skills, budget, duration_days...)
+    def encode(self, jobs_df):
+        from similarity import _as_list
+
+        missing = [column for column in REQUIRED_COLUMNS if column not in jobs_df.columns]
+        if missing:
+            raise ValueError(f"New jobs are missing columns {missing}")
+        jobs_df = jobs_df.copy()
+        jobs_df['job_id'] = jobs_df['job_id'].astype(str)
+        jobs_df['location'] = jobs_df['location'].str.capitalize()
+        jobs_df['required_skills'] = jobs_df['required_skills'].map(_as_list)
+        for column, scaled in SCALED_COLUMNS.items():
+            scale, offset = self.scalers[column]
+            jobs_df[scaled] = jobs_df[column].to_numpy(dtype=np.float64) * scale + offset
+
+        indptr, indices = [0], []
+        for skills in jobs_df['required_skills']:
+            columns = sorted({self.skill_columns[skill] for skill in skills if skill in self.skill_columns})
+            indices.extend(columns)
+            indptr.append(len(indices))
+        job_skills = sparse.csr_matrix((np.ones(len(indices)), np.asarray(indices, dtype=np.int32),
+                                        np.asarray(indptr, dtype=np.int32)),
+                                       shape=(len(jobs_df), len(self.skill_columns)))
+
+        # Localisation inconnue : code jamais égal à celui d'un utilisateur
+        pairwise = {
+            'location_similarity': np.array([self.locations.get(location, -2) for location in jobs_df['location']],
+                                            dtype=np.int64),
+            'experience_similarity': jobs_df['duration_scaled'].to_numpy(dtype=np.float64)
+        }
+        return {'jobs_df': jobs_df, 'job_skills': job_skills,
+                'job_skills_tfidf': self.skill_tfidf.transform(jobs_df['required_skills']),
+                'budget': jobs_df['budget_scaled'].to_numpy(dtype=np.float64),
+                'duration': jobs_df['duration_scaled'].to_numpy(dtype=np.float64),
+                'pairwise': {name: pairwise[name] for name in self.pairwise_names}}
+
+
+# 2. Tableaux en ajout seul
+# -------------------------
+
+class GrowableArray:
+    def __init__(self, values):
+        values = np.asarray(values)
+        self._buffer = np.empty((len(values) + len(values) // 4 + 16,) + values.shape[1:], dtype=values.dtype)
+        self._buffer[:len(values)] = values
+        self.n = len(values)
+
+    def __len__(self):
+        return self.n
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self._buffer.dtype)
+        if self.n + len(values) > len(self._buffer):
+            buffer = np.empty((max(2 * len(self._buffer), self.n + len(values)),) + self._buffer.shape[1:],
+                              dtype=self._buffer.dtype)
+            buffer[:self.n] = self._buffer[:self.n]
+            self._buffer = buffer
+        self._buffer[self.n:self.n + len(values)] = values
+        self.n += len(values)
+
+    def view(self):
+        return self._buffer[:self.n]
+
+
+class GrowableCSR:
+    def __init__(self, matrix):
+        matrix = sparse.csr_matrix(matrix)
+        self.n_columns = matrix.shape[1]
+        self.data = GrowableArray(matrix.data)
+        self.indices = GrowableArray(matrix.indices)
+        self.indptr = GrowableArray(matrix.indptr)
+
+    def append(self, rows):
+        rows = sparse.csr_matrix(rows)
+        offset = self.indptr.view()[-1]
+        self.data.append(rows.data)
+        self.indices.append(rows.indices)
+        self.indptr.append(rows.indptr[1:] + offset)
+
+    # Matrice CSR sur les tampons, sans copie
+    def matrix(self):
+        return sparse.csr_matrix((self.data.view(), self.indices.view(), self.indptr.view()),
+                                 shape=(len(self.indptr) - 1, self.n_columns), copy=False)
+
+
+# Identifiants -> position courante : index compacté, plus les offres
+# ajoutées depuis, moins les offres retirées ou remplacées
+class CatalogueIds(Mapping):
+    def __init__(self, base):
+        self.base = base
+        self.appended = []
+        self.current = {}
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.base) + len(self.appended)
+
+    def __iter__(self):
+        return iter(self.external(np.arange(len(self))))
+
+    def __getitem__(self, job_id):
+        row = self.row(job_id)
+        if row < 0:
+            raise KeyError(job_id)
+        return row
+
+    def row(self, job_id):
+        job_id = str(job_id)
+        if job_id in self.current:
+            return self.current[job_id]
+        if job_id in self.removed:
+            return -1
+        return self.base.row(job_id)
+
+    def rows(self, job_ids):
+        return np.fromiter((self.row(j) for j in job_ids), dtype=np.int64, count=len(job_ids))
+
+    def external(self, rows):
+        n_base = len(self.base)
+        return [self.base.external([row])[0] if row < n_base else self.appended[row - n_base]
+                for row in np.asarray(rows).tolist()]
+
+    def add(self, job_id, row):
+        self.appended.append(job_id)
+        self.current[job_id] = row
+
+    def remove(self, job_id):
+        self.current.pop(job_id, None)
+        self.removed.add(job_id)
+
+
+# 3. Catalogue
+# ------------
+
+class JobCatalogue:
+    def __init__(self, recommender, encoder=None, compact_ratio=0.25):
+        recommender._ensure_data()
+        self.recommender = recommender
+        if encoder is None:
+            encoder = recommender.job_encoder or JobEncoder.from_recommender(recommender)
+        recommender.job_encoder = self.encoder = encoder
+        self.compact_ratio = compact_ratio
+        self.n_compactions = 0
+        self._wrap()
+
+    # Reprendre les tableaux (compactés) du Recommender dans des tampons extensibles
+    def _wrap(self, posted=None):
+        recommender = self.recommender
+        pairwise = recommender.similarity_provider.pairwise_features
+        n_jobs = len(recommender.job_features)
+        self.budget = GrowableArray(recommender.job_features.budget)
+        self.duration = GrowableArray(recommender.job_features.duration)
+        self.pairwise_jobs = {name: GrowableArray(pairwise.encoded(name)[1]) for name in pairwise.names}
+        self.job_skills = GrowableCSR(recommender.job_skills)
+        self.job_skills_tfidf = GrowableCSR(recommender.job_skills_tfidf)
+        self.active = GrowableArray(np.ones(n_jobs, dtype=bool))
+        self.posted = GrowableArray(self._posted_dates(n_jobs) if posted is None else posted)
+        self.ids = CatalogueIds(recommender.job_positions)
+        self.n_indexed = n_jobs
+        self.n_removed = 0
+
+    # Dates de publication : colonne des offres, sinon du store (chargement initial)
+    def _posted_dates(self, n_jobs):
+        jobs_df = self.recommender.jobs_df
+        store = self.recommender.store
+        for column in POSTED_COLUMNS:
+            if column in jobs_df.columns:
+                values = jobs_df[column]
+            elif store is not None and column in store.columns('jobs'):
+                values = store.frame('jobs', [column])[column]
+            else:
+                continue
+            return pd.to_datetime(pd.Series(values).astype(object), errors='coerce').to_numpy(dtype='datetime64[s]')
+        return np.full(n_jobs, np.datetime64('NaT'), dtype='datetime64[s]')
+
+    def __len__(self):
+        return len(self.active) - self.n_removed
+
+    # Pierres tombales ou segment delta en attente de compaction
+    def has_changes(self):
+        return self.n_removed > 0 or len(self.active) != self.n_indexed
+
+    # Rendre les tableaux courants visibles du Recommender
+    def _publish(self):
+        recommender = self.recommender
+        provider = recommender.similarity_provider
+        recommender.job_skills = self.job_skills.matrix()
+        recommender.job_skills_tfidf = provider.job_skills_tfidf = self.job_skills_tfidf.matrix()
+        for name, job_values in self.pairwise_jobs.items():
+            user_values, _ = provider.pairwise_features.encoded(name)
+            provider.pairwise_features._encoded[name] = (user_values, job_values.view())
+        recommender.job_features = JobFeatures(self.budget.view(), self.duration.view())
+        recommender.job_positions = self.ids
+        recommender.job_active = self.active.view() if self.n_removed else None
+        # Les lignes de similarités en cache n'ont pas les nouvelles colonnes
+        provider.clear_cache()
+        recommender.catalogue_version += 1
+
+    # Ajouter des offres (DataFrame ou liste de dicts) ; une offre dont
+    # l'identifiant existe déjà remplace l'ancienne. Renvoie leurs positions.
+    def add(self, jobs):
+        recommender = self.recommender
+        jobs_df = pd.DataFrame(jobs)
+        if 'job_id' not in jobs_df.columns:
+            raise ValueError("New jobs need a job_id")
+        jobs_df['job_id'] = jobs_df['job_id'].astype(str)
+        jobs_df = jobs_df.drop_duplicates('job_id', keep='last').reset_index(drop=True)
+        replaced = [row for row in self.ids.rows(jobs_df['job_id'].tolist()) if row >= 0]
+        encoded = self.encoder.encode(jobs_df)
+        positions = np.arange(len(self.active), len(self.active) + len(jobs_df))
+
+        self.budget.append(encoded['budget'])
+        self.duration.append(encoded['duration'])
+        for name, job_values in encoded['pairwise'].items():
+            self.pairwise_jobs[name].append(job_values)
+        self.job_skills.append(encoded['job_skills'])
+        self.job_skills_tfidf.append(encoded['job_skills_tfidf'])
+        self.active.append(np.ones(len(jobs_df), dtype=bool))
+        posted = next((encoded['jobs_df'][column] for column in POSTED_COLUMNS if column in jobs_df.columns), None)
+        self.posted.append(np.full(len(jobs_df), np.datetime64('NaT'), dtype='datetime64[s]') if posted is None
+                           else pd.to_datetime(posted, errors='coerce').to_numpy(dtype='datetime64[s]'))
+        self._tombstone(replaced)
+        for job_id, row in zip(jobs_df['job_id'], positions.tolist()):
+            self.ids.add(job_id, row)
+
+        columns = [column for column in recommender.jobs_df.columns if column in encoded['jobs_df'].columns]
+        recommender.jobs_df = pd.concat([recommender.jobs_df, encoded['jobs_df'][columns]], ignore_index=True)
+        recommender.skill_index.skills.append(encoded['job_skills'])
+        recommender.skill_index.tfidf.append(encoded['job_skills_tfidf'])
+        self._publish()
+        if hasattr(recommender.candidate_index, 'extend'):
+            recommender.candidate_index.extend(recommender.job_skills_tfidf)
+
+        recommender.invalidate_jobs(replaced)
+        recommender.jobs_added(positions)
+        self._maybe_compact()
+        return positions
+
+    def _tombstone(self, rows):
+        rows = [row for row in rows if self.active.view()[row]]
+        self.active.view()[rows] = False
+        self.n_removed += len(rows)
+        return rows
+
+    # Retirer des offres par identifiant ; renvoie le nombre d'offres retirées
+    def remove(self, job_ids):
+        job_ids = [str(job_id) for job_id in job_ids]
+        rows = self._tombstone([row for row in self.ids.rows(job_ids) if row >= 0])
+        for job_id in job_ids:
+            self.ids.remove(job_id)
+        self._publish()
+        self.recommender.invalidate_jobs(rows)
+        self._maybe_compact()
+        return len(rows)
+
+    # Retirer les offres publiées avant `before`, ou depuis plus de
+    # max_age_days jours (par rapport à `now`) ; sans date, une offre n'expire pas
+    def expire(self, max_age_days=None, before=None, now=None):
+        if before is None:
+            now = np.datetime64(pd.Timestamp.now() if now is None else pd.Timestamp(now), 's')
+            before = now - np.timedelta64(int(max_age_days * 86400), 's')
+        before = np.datetime64(pd.Timestamp(before), 's')
+        posted = self.posted.view()
+        rows = np.flatnonzero(self.active.view() & ~np.isnat(posted) & (posted < before))
+        return self.remove(self.ids.external(rows)) if len(rows) else 0
+
+    def _maybe_compact(self):
+        n_jobs = len(self.active)
+        if self.n_removed + (n_jobs - self.n_indexed) > self.compact_ratio * max(self.n_indexed, 1):
+            self.compact()
+
+    # Retirer les pierres tombales et reconstruire index inversés, IVF et
+    # positions sur les offres actives. Les positions changent : le cache de
+    # résultats est vidé.
+    def compact(self):
+        from similarity import PairwiseFeatures
+
+        recommender = self.recommender
+        keep = np.flatnonzero(self.active.view())
+        provider = recommender.similarity_provider
+        pairwise = PairwiseFeatures.from_encoded({
+            name: (provider.pairwise_features.encoded(name)[0], self.pairwise_jobs[name].view()[keep].copy())
+            for name in provider.pairwise_features.names
+        })
+        posted = self.posted.view()[keep]
+        recommender._build_indexes(self.job_skills.matrix()[keep], recommender.user_skills_tfidf,
+                                   self.job_skills_tfidf.matrix()[keep], pairwise)
+        recommender.job_features = JobFeatures(self.budget.view()[keep], self.duration.view()[keep])
+        recommender.jobs_df = recommender.jobs_df.iloc[keep].reset_index(drop=True)
+        recommender.job_positions = IdIndex(recommender.jobs_df['job_id'])
+        recommender.job_active = None
+        recommender.invalidate_all()
+        recommender.catalogue_version += 1
+        self.n_compactions += 1
+        self._wrap(posted)
+
+    def info(self):
+        return {'jobs': len(self), 'positions': len(self.active), 'tombstones': self.n_removed,
+                'delta': len(self.active) - self.n_indexed, 'compactions': self.n_compactions}
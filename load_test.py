@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+# Générateur de charge pour service.py : `concurrency` connexions keep-alive
+# envoient en boucle GET /recommend/{user_id} jusqu'à `n_requests` requêtes.
+# Rapporte latences p50/p95/p99 côté client, débit et taille moyenne des lots
+# (lue dans /stats du service).
+
+
+async def _get(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(host, port, paths, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while paths:
+            path = paths.pop()
+            start = time.perf_counter()
+            status, _ = await _get(reader, writer, host, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(path)
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, user_ids, n_requests=2000, concurrency=32, top_n=5, model=None, seed=42):
+    rng = random.Random(seed)
+    suffix = f"?top_n={top_n}" + (f"&model={model.replace(' ', '%20')}" if model else '')
+    paths = [f"/recommend/{rng.choice(user_ids)}{suffix}" for _ in range(n_requests)]
+
+    reader, writer = await asyncio.open_connection(host, port)
+    await _get(reader, writer, host, '/stats?reset')
+    writer.close()
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, paths, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, server_stats = await _get(reader, writer, host, '/stats')
+    writer.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies), 'errors': len(errors), 'concurrency': concurrency,
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_batch_size': server_stats.get('mean_batch_size', 0.0)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the recommendation service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--users-file', default='users_synthetic.csv', help="CSV with an 'id' column")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    user_ids = pd.read_csv(args.users_file, usecols=['id'])['id'].astype(str).tolist()
+    try:
+        report = {concurrency: asyncio.run(run_load(args.host, args.port, user_ids, args.requests, concurrency,
+                                                    args.top_n, args.model, args.seed))
+                  for concurrency in args.concurrency}
+    except ConnectionRefusedError:
+        print(f"Error: no service on {args.host}:{args.port}. Start it with `python service.py`.")
+        exit(1)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(pd.DataFrame(report).T.drop(columns='concurrency').round(2).rename_axis('concurrency'))
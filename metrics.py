@@ -0,0 +1,77 @@
+import numpy as np
+from scipy import sparse
+
+# Métriques de classement vectorisées pour toute une population :
+#   recommended : matrice (n_users, K) d'indices d'offres, -1 en remplissage
+#   relevance   : matrice creuse (n_users, n_jobs), non nulle si l'offre est pertinente
+# Plusieurs valeurs de K sont calculées en un seul passage sur le top max(K).
+# nDCG suit la définition de evaluate_model.calculate_ndcg : le DCG est
+# normalisé par celui d'une liste entièrement pertinente de même longueur.
+
+
+# Matrice de pertinence (n_users, n_jobs) à partir des interactions 'applied'
+def relevance_matrix(interactions_df, user_positions, job_positions):
+    applied = interactions_df[interactions_df['interaction_type'] == 'applied']
+    rows = applied['user_id'].map(user_positions)
+    cols = applied['job_id'].map(job_positions)
+    known = rows.notna().to_numpy() & cols.notna().to_numpy()
+    rows = rows.to_numpy()[known].astype(np.intp)
+    cols = cols.to_numpy()[known].astype(np.intp)
+    relevance = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                  shape=(len(user_positions), len(job_positions)))
+    relevance.sum_duplicates()
+    relevance.data[:] = 1.0
+    return relevance
+
+
+# Booléens (n_users, K) : l'offre recommandée au rang k est-elle pertinente ?
+def hit_matrix(recommended, relevance):
+    recommended = np.asarray(recommended)
+    relevance = sparse.csr_matrix(relevance)
+    n_users, n_jobs = relevance.shape
+    relevant_keys = (np.repeat(np.arange(n_users, dtype=np.int64), np.diff(relevance.indptr)) * n_jobs
+                     + relevance.indices)
+    recommended_keys = np.arange(n_users, dtype=np.int64)[:, None] * n_jobs + recommended
+    return np.isin(recommended_keys, relevant_keys) & (recommended >= 0)
+
+
+def ranking_metrics(recommended, relevance, ks=(5,), n_jobs=None, per_user=False):
+    recommended = np.asarray(recommended)
+    relevance = sparse.csr_matrix(relevance)
+    n_jobs = relevance.shape[1] if n_jobs is None else n_jobs
+    ks = sorted(set(int(k) for k in ks))
+    if ks[-1] > recommended.shape[1]:
+        raise ValueError(f"K={ks[-1]} exceeds the {recommended.shape[1]} recommendations per user")
+
+    hits = hit_matrix(recommended[:, :ks[-1]], relevance)
+    valid = recommended[:, :ks[-1]] >= 0
+    n_relevant = np.diff(relevance.indptr).astype(np.float64)
+    cum_hits = np.cumsum(hits, axis=1)
+    ranks = np.arange(1, ks[-1] + 1)
+    discounts = 1.0 / np.log2(ranks + 1)
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1), ks[-1])
+
+    def ratio(num, den):
+        return np.divide(num, den, out=np.zeros(len(num)), where=den > 0)
+
+    results = {}
+    for k in ks:
+        n_hits = cum_hits[:, k - 1].astype(np.float64)
+        precision = ratio(n_hits, valid[:, :k].sum(axis=1).astype(np.float64))
+        recall = ratio(n_hits, n_relevant)
+        values = {
+            f'precision@{k}': precision,
+            f'recall@{k}': recall,
+            f'f1_score@{k}': ratio(2 * precision * recall, precision + recall),
+            f'mrr@{k}': np.where(first_hit < k, 1.0 / (first_hit + 1), 0.0),
+            f'ndcg@{k}': ratio((hits[:, :k] * discounts[:k]).sum(axis=1),
+                               (valid[:, :k] * discounts[:k]).sum(axis=1)),
+            f'hit_rate@{k}': (n_hits > 0).astype(np.float64),
+            f'map@{k}': ratio((hits[:, :k] * cum_hits[:, :k] / ranks[:k]).sum(axis=1),
+                              np.minimum(n_relevant, k))
+        }
+        for name, value in values.items():
+            results[name] = value if per_user else float(value.mean()) if len(value) else 0.0
+        top_k = recommended[:, :k]
+        results[f'coverage@{k}'] = len(np.unique(top_k[top_k >= 0])) / n_jobs if n_jobs else 0.0
+    return results
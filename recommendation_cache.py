@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Cache des recommandations calculées : (version du modèle, user_id)
+# -> (indices, scores) de la plus longue liste calculée ; une demande de
+# top_n plus petit est servie par son début (listes triées par score
+# décroissant). LRU borné à max_size entrées, chaque entrée expirant
+# ttl secondes après son calcul. Des index secondaires par utilisateur et
+# par offre permettent d'invalider précisément :
+#   - invalidate_user : profil modifié, nouvelle candidature/sauvegarde ;
+#   - invalidate_jobs : offres retirées ou modifiées (seules les entrées qui
+#     les recommandent sont touchées) ;
+#   - invalidate_model : nouvelle version d'un modèle.
+# Les accès viennent à la fois du thread de scoring et de la boucle du
+# service : toutes les opérations passent par un verrou.
+class RecommendationCache:
+    def __init__(self, max_size=10000, ttl=300.0, clock=time.monotonic):
+        self.max_size = int(max_size)
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._by_job = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # record_miss=False pour une consultation suivie d'un second get (le
+    # défaut n'est alors compté qu'une fois)
+    def get(self, model_version, user_id, top_n, record_miss=True):
+        key = (model_version, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None or len(entry[1]) < top_n:
+                self.misses += record_miss
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1][:top_n], entry[2][:top_n]
+
+    # Une liste plus courte que celle déjà en cache (et valide) ne la
+    # remplace pas
+    def put(self, model_version, user_id, indices, scores):
+        key = (model_version, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock() and len(entry[1]) >= len(indices):
+                self._entries.move_to_end(key)
+                return
+            if entry is not None:
+                self._remove(key)
+            self._entries[key] = (self.clock() + self.ttl, indices, scores)
+            self._by_user.setdefault(user_id, set()).add(key)
+            for job in indices.tolist():
+                self._by_job.setdefault(job, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, indices, _ = self._entries.pop(key)
+        keys = self._by_user[key[1]]
+        keys.discard(key)
+        if not keys:
+            del self._by_user[key[1]]
+        for job in indices.tolist():
+            keys = self._by_job.get(job)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_job[job]
+
+    # Invalidations : renvoient le nombre d'entrées supprimées
+    def invalidate_keys(self, keys):
+        with self._lock:
+            keys = [key for key in keys if key in self._entries]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            keys = list(self._by_user.get(user_id, ()))
+        return self.invalidate_keys(keys)
+
+    def invalidate_jobs(self, job_indices):
+        with self._lock:
+            keys = {key for job in job_indices for key in self._by_job.get(int(job), ())}
+        return self.invalidate_keys(keys)
+
+    def invalidate_model(self, model_version):
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == model_version]
+        return self.invalidate_keys(keys)
+
+    # Entrées (clé, indices, scores) encore valides, par exemple pour
+    # vérifier lesquelles de nouvelles offres pourraient modifier
+    def items(self):
+        with self._lock:
+            now = self.clock()
+            return [(key, indices, scores) for key, (expires_at, indices, scores) in self._entries.items()
+                    if expires_at > now]
+
+    def cache_info(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired, 'evictions': self.evictions, 'invalidations': self.invalidations,
+                'size': len(self._entries), 'max_size': self.max_size, 'ttl': self.ttl}
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_user.clear()
+            self._by_job.clear()
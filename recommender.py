@@ -0,0 +1,618 @@
+import json
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_model import IdIndex
+from feature_store import DEFAULT_STORE_DIR, load_feature_store
+from instrumentation import instruments
+from recommendation_cache import RecommendationCache
+from scoring import (FEATURE_COLUMNS, JobFeatures, TopN, build_feature_matrix, predict_scores,
+                     top_n_indices, format_recommendations)
+
+# Modèles entraînés (registre nom -> fichier)
+MODEL_FILES = {
+    'Logistic Regression': 'logistic_regression.pkl',
+    'Random Forest': 'random_forest.pkl',
+    'Gradient Boosting': 'gradient_boosting.pkl',
+    'XGBoost': 'xgboost.pkl'
+}
+
+
+# Modèles par défaut : dernière version publiée par train_model.py
+# (models/LATEST), sinon les fichiers ./*.pkl de MODEL_FILES. Un répertoire
+# ou une version explicites doivent exister.
+def default_model_files(artifacts_dir=None, version=None):
+    from train_model import DEFAULT_ARTIFACTS_DIR, latest_version, version_model_files
+    if artifacts_dir is None and version is None and latest_version(DEFAULT_ARTIFACTS_DIR) is None:
+        return dict(MODEL_FILES)
+    return version_model_files(artifacts_dir or DEFAULT_ARTIFACTS_DIR, version)
+
+
+# Interactions qui marquent un intérêt pour une offre
+POSITIVE_TYPES = ('applied', 'saved')
+
+
+# Service de recommandation : rien n'est chargé à l'import ni à la
+# construction. Les données et les modèles sont chargés au premier usage
+# (ou explicitement via warm()) et les durées de démarrage à froid sont
+# mesurées dans self.timings. Les étapes du chargement et du scoring sont
+# aussi chronométrées dans instrumentation.instruments (load.*, featurize.*,
+# score.*, rank.*).
+class Recommender:
+    def __init__(self, sources=None, store_dir=DEFAULT_STORE_DIR, model_files=None,
+                 block_size=256, dtype=np.float64, cache_size=0, candidate_k=None, candidate_index='ivf', n_probe=8,
+                 compiled_dir=None, compiled_models=None, result_cache_size=0, result_ttl=300.0,
+                 job_shard_size=None):
+        self.sources = sources
+        self.store_dir = store_dir
+        self.model_files = default_model_files() if model_files is None else dict(model_files)
+        # Modèles compilés (compiled_model.py) : tableaux NumPy en mmap au lieu
+        # des pickles, pour les modèles de compiled_models (par défaut ceux dont
+        # la forme compilée est plus rapide, compiled_model.DEFAULT_KINDS)
+        self.compiled_dir = compiled_dir
+        self.compiled_models = None if compiled_models is None else set(compiled_models)
+        self.block_size = block_size
+        self.dtype = dtype
+        # LRU des lignes de similarité (similarity.SimilarityProvider),
+        # désactivé par défaut : une entrée garde une ligne par feature de
+        # n_jobs valeurs, soit ~4.9 Go pour 1024 utilisateurs à 200k offres
+        self.cache_size = cache_size
+        self.candidate_k = candidate_k
+        # Scoring exhaustif par tranches de job_shard_size offres (None : tout
+        # le catalogue d'un coup), top_n fusionnés au fil des tranches
+        self.job_shard_size = job_shard_size
+        self.candidate_index_type = candidate_index
+        self.n_probe = n_probe
+        # Cache des recommandations calculées (recommendation_cache.py),
+        # désactivé par défaut
+        self.result_cache = RecommendationCache(result_cache_size, result_ttl) if result_cache_size > 0 else None
+        # Catalogue modifiable (job_catalogue.py) : offres retirées marquées
+        # dans job_active, version incrémentée à chaque modification
+        self.job_active = None
+        self.job_encoder = None
+        self.catalogue_version = 0
+        self._catalogue = None
+        self.timings = {}
+        self._models = {}
+        self._model_versions = {}
+        self._data_loaded = False
+        self._lock = threading.RLock()
+
+    # 1. Données et features
+    # ----------------------
+
+    def _ensure_data(self):
+        if self._data_loaded:
+            return
+        with self._lock:
+            if not self._data_loaded:
+                start = time.perf_counter()
+                self._load_data()
+                self.timings['data'] = time.perf_counter() - start
+                self._data_loaded = True
+
+    def _load_data(self):
+        # scikit-learn n'est importé qu'ici pour garder l'import du module léger
+        from sklearn.preprocessing import MinMaxScaler
+        from similarity import PairwiseFeatures, skills_tfidf
+
+        # Les doublons (id, job_id) sont retirés à la construction du store
+        with instruments.timer('load.feature_store'):
+            store = load_feature_store(self.sources, self.store_dir)
+        with instruments.timer('load.frames'):
+            users_df = store.frame('users', ['id', 'location', 'rating', 'jobsCompleted'])
+            job_columns = ['job_id', 'title', 'category', 'location', 'required_skills', 'budget', 'duration_days']
+            # Langues requises (filtre skill_index.job_filter_mask), si les offres en ont
+            if 'required_languages' in store.columns('jobs'):
+                job_columns.append('required_languages')
+            jobs_df = store.frame('jobs', job_columns)
+            interaction_columns = ['user_id', 'job_id', 'interaction_type']
+            if 'timestamp' in store.columns('interactions'):
+                interaction_columns.append('timestamp')
+            interactions_df = store.frame('interactions', interaction_columns)
+
+        # Gérer les valeurs nulles
+        users_df['rating'] = users_df['rating'].fillna(users_df['rating'].mean())
+        users_df['jobsCompleted'] = users_df['jobsCompleted'].fillna(0)
+        users_df['location'] = users_df['location'].str.capitalize()
+        jobs_df['location'] = jobs_df['location'].str.capitalize()
+
+        # Normaliser jobsCompleted et duration_days
+        scaler = MinMaxScaler()
+        users_df['jobsCompleted_scaled'] = scaler.fit_transform(users_df[['jobsCompleted']])
+        jobs_df['duration_scaled'] = scaler.fit_transform(jobs_df[['duration_days']])
+        jobs_df['budget_scaled'] = scaler.fit_transform(jobs_df[['budget']])
+
+        # TF-IDF des compétences depuis les matrices CSR du store
+        with instruments.timer('featurize.tfidf'):
+            user_skills, skill_vocabulary = store.csr('users', 'skills')
+            job_skills, _ = store.csr('jobs', 'required_skills')
+            user_skills_tfidf, job_skills_tfidf = skills_tfidf(user_skills, job_skills, skill_vocabulary)
+
+        # Features par paire (localisation, expérience), encodées une fois
+        with instruments.timer('featurize.pairwise_encode'):
+            pairwise_features = PairwiseFeatures(users_df, jobs_df, ['location_similarity', 'experience_similarity'])
+        with instruments.timer('load.indexes'):
+            self._build_indexes(job_skills, user_skills_tfidf, job_skills_tfidf, pairwise_features)
+
+        # Colonnes NumPy pour le scoring : features offre calculées une seule
+        # fois, features utilisateur indexées par position
+        self.user_positions = IdIndex(users_df['id'])
+        self.job_positions = IdIndex(jobs_df['job_id'])
+        self.user_rating = users_df['rating'].to_numpy(dtype=np.float64)
+        self.user_jobs_completed = users_df['jobsCompleted_scaled'].to_numpy(dtype=np.float64)
+        self.job_features = JobFeatures.from_dataframe(jobs_df)
+
+        self.store = store
+        self.users_df = users_df
+        self.jobs_df = jobs_df
+        self.interactions_df = interactions_df
+
+    def _build_indexes(self, job_skills, user_skills_tfidf, job_skills_tfidf, pairwise_features,
+                       skill_index=None, ivf_index=None):
+        from similarity import SimilarityProvider
+        from skill_index import SkillIndex
+
+        # Index inversé compétence/token -> offres (fourni tel quel s'il a été
+        # relu depuis des tableaux exportés)
+        self.skill_index = skill_index or SkillIndex(job_skills, job_skills_tfidf)
+
+        # Similarités calculées uniquement pour les utilisateurs scorés, par blocs
+        self.similarity_provider = SimilarityProvider(
+            user_skills_tfidf, job_skills_tfidf, pairwise_features,
+            block_size=self.block_size, dtype=self.dtype, cache_size=self.cache_size
+        )
+
+        # Génération de candidats : seules les candidate_k offres les plus
+        # proches en compétences passent par le modèle ('ivf' approché, ou
+        # 'inverted' exact sur les offres partageant une compétence)
+        self.candidate_index = None
+        if self.candidate_k and self.candidate_index_type == 'inverted':
+            self.candidate_index = self.skill_index
+        elif self.candidate_k and ivf_index is not None:
+            ivf_index.n_probe = self.n_probe
+            self.candidate_index = ivf_index
+        elif self.candidate_k:
+            from candidate_index import IVFIndex
+            self.candidate_index = IVFIndex(n_probe=self.n_probe).fit(job_skills_tfidf)
+
+        self.job_skills = job_skills
+        self.user_skills_tfidf = user_skills_tfidf
+        self.job_skills_tfidf = job_skills_tfidf
+
+    # Exporter les tableaux dérivés (TF-IDF, features encodées, colonnes de
+    # scoring, index inversés, listes IVF, positions des identifiants) en
+    # .npy : d'autres processus les ouvrent en mmap_mode='r' via from_arrays()
+    # et partagent ainsi une seule copie physique, sans rien recalculer.
+    def export_arrays(self, directory):
+        from job_catalogue import JobEncoder
+
+        self._ensure_data()
+        # Les index exportés ne portent ni segment delta ni pierre tombale
+        if self._catalogue is not None and self._catalogue.has_changes():
+            self._catalogue.compact()
+        os.makedirs(directory, exist_ok=True)
+        pairwise = self.similarity_provider.pairwise_features
+        arrays = {
+            'user_ids': np.array([str(u) for u in self.users_df['id']], dtype=str),
+            'job_ids': np.array([str(j) for j in self.jobs_df['job_id']], dtype=str),
+            'user_rating': self.user_rating,
+            'user_jobs_completed': self.user_jobs_completed,
+            'job_budget': self.job_features.budget,
+            'job_duration': self.job_features.duration
+        }
+        for name in pairwise.names:
+            arrays[f'pairwise__{name}__users'], arrays[f'pairwise__{name}__jobs'] = pairwise.encoded(name)
+        for name in ('job_skills', 'user_skills_tfidf', 'job_skills_tfidf'):
+            matrix = sparse.csr_matrix(getattr(self, name))
+            arrays[f'{name}__data'] = matrix.data
+            arrays[f'{name}__indices'] = matrix.indices
+            arrays[f'{name}__indptr'] = matrix.indptr
+            arrays[f'{name}__shape'] = np.array(matrix.shape)
+        for name in ('skills', 'tfidf'):
+            postings = getattr(self.skill_index, name).postings_arrays()
+            arrays.update({f'postings__{name}__{key}': value for key, value in postings.items()})
+        from candidate_index import IVFIndex
+        ivf = isinstance(self.candidate_index, IVFIndex)
+        if ivf:
+            arrays.update({f'ivf__{key}': value for key, value in self.candidate_index.arrays().items()})
+        id_prefixes = {}
+        for name, index in (('user', self.user_positions), ('job', self.job_positions)):
+            if index.arrays() is not None:
+                id_prefixes[name] = index.prefix
+                arrays.update({f'{name}_positions__{key}': value for key, value in index.arrays().items()})
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + '.npy'), np.asarray(array), allow_pickle=False)
+        with open(os.path.join(directory, 'arrays.json'), 'w', encoding='utf-8') as f:
+            json.dump({'pairwise': pairwise.names, 'n_jobs': len(self.job_positions),
+                       'ivf': ivf, 'id_prefixes': id_prefixes}, f)
+        # Encodage figé des offres, pour modifier le catalogue des workers
+        encoder = self.job_encoder
+        if encoder is None and self.store is not None:
+            encoder = JobEncoder.from_recommender(self)
+        if encoder is not None:
+            with open(os.path.join(directory, 'job_encoder.json'), 'w', encoding='utf-8') as f:
+                json.dump(encoder.to_dict(), f)
+
+    # Recommender adossé aux tableaux exportés (mmap, lecture seule). Les
+    # DataFrames ne contiennent que les identifiants ; interactions_df est None.
+    @classmethod
+    def from_arrays(cls, directory, **kwargs):
+        from candidate_index import IVFIndex
+        from similarity import PairwiseFeatures
+        from skill_index import InvertedIndex, SkillIndex
+
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        def load_csr(name):
+            return sparse.csr_matrix((load(f'{name}__data'), load(f'{name}__indices'), load(f'{name}__indptr')),
+                                     shape=tuple(load(f'{name}__shape')))
+
+        with open(os.path.join(directory, 'arrays.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        recommender = cls(**kwargs)
+        start = time.perf_counter()
+        users_df = pd.DataFrame({'id': load('user_ids')})
+        jobs_df = pd.DataFrame({'job_id': load('job_ids')})
+        encoded = {name: (load(f'pairwise__{name}__users'), load(f'pairwise__{name}__jobs'))
+                   for name in meta['pairwise']}
+        pairwise_features = PairwiseFeatures.from_encoded(encoded)
+        job_skills_tfidf = load_csr('job_skills_tfidf')
+        skill_index = SkillIndex.from_indexes(*(
+            InvertedIndex.from_postings(load(f'postings__{name}__indptr'), load(f'postings__{name}__job_ids'),
+                                        load(f'postings__{name}__weights'), meta['n_jobs'])
+            for name in ('skills', 'tfidf')
+        ))
+        ivf_index = None
+        if meta['ivf']:
+            ivf_index = IVFIndex.from_arrays(
+                {key: load(f'ivf__{key}') for key in ('centroids', 'assignments', 'order', 'offsets')},
+                job_skills_tfidf
+            )
+        recommender._build_indexes(load_csr('job_skills'), load_csr('user_skills_tfidf'),
+                                   job_skills_tfidf, pairwise_features, skill_index, ivf_index)
+
+        def positions(name, ids):
+            if name not in meta['id_prefixes']:
+                return IdIndex(ids)
+            keys = ('numbers', 'order', 'sorted', 'identity')
+            return IdIndex.from_arrays(meta['id_prefixes'][name], {key: load(f'{name}_positions__{key}') for key in keys})
+
+        recommender.user_positions = positions('user', users_df['id'])
+        recommender.job_positions = positions('job', jobs_df['job_id'])
+        recommender.user_rating = load('user_rating')
+        recommender.user_jobs_completed = load('user_jobs_completed')
+        recommender.job_features = JobFeatures(load('job_budget'), load('job_duration'))
+        recommender.store = None
+        recommender.users_df = users_df
+        recommender.jobs_df = jobs_df
+        recommender.interactions_df = None
+        if os.path.exists(os.path.join(directory, 'job_encoder.json')):
+            from job_catalogue import JobEncoder
+            with open(os.path.join(directory, 'job_encoder.json'), encoding='utf-8') as f:
+                recommender.job_encoder = JobEncoder.from_dict(json.load(f))
+        recommender.timings['data'] = time.perf_counter() - start
+        instruments.observe('load.arrays', recommender.timings['data'])
+        recommender._data_loaded = True
+        return recommender
+
+    def __getattr__(self, name):
+        # Attributs de données (users_df, jobs_df, ...) chargés au premier accès
+        if name.startswith('_') or self.__dict__.get('_data_loaded', True):
+            raise AttributeError(name)
+        self._ensure_data()
+        return getattr(self, name)
+
+    # 2. Registre des modèles
+    # -----------------------
+
+    def model(self, name):
+        if name not in self._models:
+            with self._lock:
+                if name not in self._models:
+                    file = self.model_files[name]
+                    start = time.perf_counter()
+                    try:
+                        if self._use_compiled(name):
+                            from compiled_model import compiled_dir_name, load_compiled
+                            file = os.path.join(self.compiled_dir, compiled_dir_name(file))
+                            self._models[name] = load_compiled(file)
+                        else:
+                            self._models[name] = joblib.load(file)
+                        # Version : fichier (ou dossier compilé) et date de modification
+                        self._model_versions[name] = f"{name}@{os.path.abspath(file)}:{os.stat(file).st_mtime_ns}"
+                    except FileNotFoundError:
+                        raise FileNotFoundError(f"{file} not found. Please run the training script first.")
+                    self.timings[f'model:{name}'] = time.perf_counter() - start
+                    instruments.observe('load.model', self.timings[f'model:{name}'])
+                    print(f"Loaded {name} from {file}")
+        return self._models[name]
+
+    def _use_compiled(self, name):
+        if self.compiled_dir is None:
+            return False
+        if self.compiled_models is not None:
+            return name in self.compiled_models
+        from compiled_model import DEFAULT_KINDS, compiled_dir_name, compiled_spec
+        directory = os.path.join(self.compiled_dir, compiled_dir_name(self.model_files[name]))
+        return compiled_spec(directory)['kind'] in DEFAULT_KINDS
+
+    @property
+    def models(self):
+        return {name: self.model(name) for name in self.model_files}
+
+    def model_version(self, name):
+        self.model(name)
+        return self._model_versions[name]
+
+    def _resolve_model(self, model):
+        return self.model(model) if isinstance(model, str) else model
+
+    # Charger explicitement données et modèles, et renvoyer les durées
+    def warm(self, models=True):
+        start = time.perf_counter()
+        self._ensure_data()
+        if models:
+            self.models
+        self.timings['warm'] = time.perf_counter() - start
+        return self.cold_start_report()
+
+    def cold_start_report(self):
+        report = dict(self.timings)
+        report['total'] = sum(v for k, v in self.timings.items() if k != 'warm')
+        return report
+
+    # 3. Scoring et recommandations
+    # -----------------------------
+
+    # Scorer un lot d'utilisateurs (positions), bloc par bloc. Renvoie
+    # (tranche, scores, job_idx) : job_idx vaut None si toutes les offres sont
+    # scorées, sinon il donne les offres candidates (n_users, k) de chaque ligne.
+    # job_mask (booléen par offre, cf. skill_index.job_filter_mask) exclut des
+    # offres : leur score vaut -inf, ou elles ne sont pas candidates.
+    def iter_user_scores(self, model, user_idx, use_candidates=True, job_mask=None):
+        self._ensure_data()
+        model = self._resolve_model(model)
+        user_idx = np.asarray(user_idx, dtype=np.intp)
+        use_candidates = use_candidates and self.candidate_index is not None
+        for start in range(0, len(user_idx), self.similarity_provider.block_size):
+            block = slice(start, min(start + self.similarity_provider.block_size, len(user_idx)))
+            block_idx = user_idx[block]
+            job_idx = None
+            if use_candidates:
+                with instruments.timer('score.candidates'):
+                    job_idx = self.candidate_index.search(self.user_skills_tfidf[block_idx], self.candidate_k,
+                                                          job_mask)
+            scores = self._score_block(model, block_idx, job_idx)
+            if job_mask is not None and job_idx is None:
+                scores[:, ~job_mask] = -np.inf
+            yield block, scores, job_idx
+
+    # Scores d'un bloc d'utilisateurs : tout le catalogue (job_idx None),
+    # offres candidates (n_users, k) ou tranche d'offres (slice)
+    def _score_block(self, model, block_idx, job_idx=None):
+        job_features = self.job_features if job_idx is None else self.job_features.take(job_idx)
+        with instruments.timer('featurize.similarity'):
+            sims = self.similarity_provider.rows(block_idx, job_idx)
+        with instruments.timer('featurize.matrix'):
+            features = build_feature_matrix(
+                sims['skill_similarity'],
+                sims['location_similarity'],
+                sims['experience_similarity'],
+                self.user_rating[block_idx],
+                self.user_jobs_completed[block_idx],
+                job_features
+            )
+        with instruments.timer('score.predict'):
+            scores = predict_scores(model, features, len(block_idx))
+        instruments.count('score.users', len(block_idx))
+        instruments.count('score.pairs', scores.size)
+        return scores
+
+    # Top_n par bloc d'utilisateurs : (tranche, indices, scores), par score
+    # décroissant et à égalité par indice d'offre croissant. Avec
+    # job_shard_size (et sans offres candidates), le catalogue est scoré
+    # tranche par tranche et les top_n sont fusionnés (scoring.TopN) : la
+    # mémoire d'un bloc est bornée par block_size x job_shard_size paires,
+    # quelle que soit la taille du catalogue.
+    def iter_top_n(self, model, user_idx, top_n, job_mask=None):
+        self._ensure_data()
+        n_jobs = len(self.job_features)
+        shard_size = self.job_shard_size
+        if self.candidate_index is not None or not shard_size or shard_size >= n_jobs:
+            for block, block_scores, job_idx in self.iter_user_scores(model, user_idx, job_mask=job_mask):
+                with instruments.timer('rank.top_n'):
+                    top_indices = top_n_indices(block_scores, top_n)
+                    top_scores = np.take_along_axis(block_scores, top_indices, axis=1)
+                    if job_idx is not None:
+                        top_indices = np.take_along_axis(job_idx, top_indices, axis=1)
+                yield block, top_indices, top_scores
+            return
+
+        model = self._resolve_model(model)
+        user_idx = np.asarray(user_idx, dtype=np.intp)
+        for start in range(0, len(user_idx), self.similarity_provider.block_size):
+            block = slice(start, min(start + self.similarity_provider.block_size, len(user_idx)))
+            block_idx = user_idx[block]
+            top = TopN(len(block_idx), top_n)
+            for job_start in range(0, n_jobs, shard_size):
+                jobs = slice(job_start, min(job_start + shard_size, n_jobs))
+                scores = self._score_block(model, block_idx, jobs)
+                if job_mask is not None:
+                    scores[:, ~job_mask[jobs]] = -np.inf
+                with instruments.timer('rank.top_n'):
+                    top.push_scores(scores, job_start)
+            yield (block,) + top.result()
+
+    # Matrice de features (n_paires, 7) de paires (utilisateur, offre) données
+    # par positions, calculée par blocs avec le même code que le scoring :
+    # l'entraînement voit exactement les features servies en production
+    def pair_features(self, user_idx, job_idx, block_size=65536):
+        self._ensure_data()
+        user_idx = np.asarray(user_idx, dtype=np.intp)
+        job_idx = np.asarray(job_idx, dtype=np.intp)
+        features = np.empty((len(user_idx), len(FEATURE_COLUMNS)), dtype=self.similarity_provider.dtype)
+        timer = instruments.timer('featurize.pairs')
+        for start in range(0, len(user_idx), block_size):
+            block = slice(start, min(start + block_size, len(user_idx)))
+            pairs = job_idx[block][:, None]
+            with timer:
+                sims = self.similarity_provider.rows(user_idx[block], pairs)
+                features[block] = build_feature_matrix(
+                    sims['skill_similarity'],
+                    sims['location_similarity'],
+                    sims['experience_similarity'],
+                    self.user_rating[user_idx[block]],
+                    self.user_jobs_completed[user_idx[block]],
+                    self.job_features.take(pairs)
+                )
+        instruments.count('featurize.pairs', len(user_idx))
+        return features
+
+    # Scores (n_users, n_jobs) sur tout le catalogue
+    def score_users(self, model, user_idx):
+        blocks = [scores for _, scores, _ in self.iter_user_scores(model, user_idx, use_candidates=False)]
+        return np.vstack(blocks) if blocks else np.empty((0, len(self.job_features)))
+
+    # Indices (n_users, top_n) des offres recommandées, par score décroissant,
+    # et leurs scores ; -1 et NaN pour les utilisateurs inconnus. Avec le
+    # cache de résultats, seuls les utilisateurs absents du cache sont scorés
+    # (modèles désignés par leur nom et sans job_mask uniquement).
+    def recommend_indices(self, model, user_ids, top_n=5, job_mask=None):
+        self._ensure_data()
+        use_cache = self.result_cache is not None and isinstance(model, str) and job_mask is None
+        job_mask = self._active_mask(job_mask)
+        n_allowed = len(self.job_features) if job_mask is None else int(np.count_nonzero(job_mask))
+        top_n = max(0, min(top_n, n_allowed))
+        if not use_cache:
+            return self._compute_indices(model, user_ids, top_n, job_mask)
+
+        version = self.model_version(model)
+        indices = np.full((len(user_ids), top_n), -1, dtype=np.intp)
+        scores = np.full((len(user_ids), top_n), np.nan)
+        missing = []
+        for row, user_id in enumerate(user_ids):
+            cached = self.result_cache.get(version, user_id, top_n)
+            if cached is None:
+                missing.append(row)
+            else:
+                indices[row, :len(cached[0])], scores[row, :len(cached[1])] = cached
+        if missing:
+            missing_ids = [user_ids[row] for row in missing]
+            indices[missing], scores[missing] = self._compute_indices(model, missing_ids, top_n, job_mask)
+            for row, user_id in zip(missing, missing_ids):
+                if user_id in self.user_positions:
+                    self.result_cache.put(version, user_id, indices[row].copy(), scores[row].copy())
+        return indices, scores
+
+    def _compute_indices(self, model, user_ids, top_n, job_mask=None):
+        indices = np.full((len(user_ids), top_n), -1, dtype=np.intp)
+        scores = np.full((len(user_ids), top_n), np.nan)
+        rows = np.array([row for row, user_id in enumerate(user_ids) if user_id in self.user_positions],
+                        dtype=np.intp)
+        user_idx = [self.user_positions[user_ids[row]] for row in rows]
+        for block, top_indices, top_scores in self.iter_top_n(model, user_idx, top_n, job_mask):
+            width = top_indices.shape[1]
+            indices[rows[block], :width] = top_indices
+            scores[rows[block], :width] = top_scores
+        return indices, scores
+
+    # Offres retirées du catalogue exclues en plus de job_mask
+    def _active_mask(self, job_mask=None):
+        if self.job_active is None:
+            return job_mask
+        return self.job_active if job_mask is None else job_mask & self.job_active
+
+    # Recommandations en cache d'un utilisateur, (indices, scores) ou None.
+    # Un défaut n'est pas compté : il sera suivi de recommend_indices.
+    def cached_recommendation(self, model, user_id, top_n=5):
+        if self.result_cache is None:
+            return None
+        self._ensure_data()
+        active = self._active_mask()
+        top_n = max(0, min(top_n, len(self.job_features) if active is None else int(np.count_nonzero(active))))
+        return self.result_cache.get(self.model_version(model), user_id, top_n, record_miss=False)
+
+    # Recommandations pour un lot d'utilisateurs : {user_id: DataFrame}
+    def recommend_batch(self, model, user_ids, top_n=5, job_mask=None):
+        indices, scores = self.recommend_indices(model, user_ids, top_n, job_mask)
+        recommendations = {}
+        with instruments.timer('rank.format'):
+            for row, user_id in enumerate(user_ids):
+                if user_id not in self.user_positions:
+                    print(f"Error: User {user_id} not found in the dataset.")
+                    recommendations[user_id] = pd.DataFrame()
+                    continue
+                valid = indices[row] >= 0
+                recommendations[user_id] = format_recommendations(self.jobs_df, indices[row][valid],
+                                                                  scores[row][valid])
+        return recommendations
+
+    def recommend(self, model, user_id, top_n=5, job_mask=None):
+        return self.recommend_batch(model, [user_id], top_n, job_mask)[user_id]
+
+    # 4. Invalidation du cache de résultats
+    # -------------------------------------
+
+    # Profil modifié : les recommandations de l'utilisateur sont à refaire
+    def invalidate_user(self, user_id):
+        return self.result_cache.invalidate_user(user_id) if self.result_cache is not None else 0
+
+    # Nouvelle interaction : une candidature ou une sauvegarde invalide les
+    # recommandations de l'utilisateur
+    def record_interaction(self, user_id, job_id, interaction_type):
+        if interaction_type in POSITIVE_TYPES:
+            return self.invalidate_user(user_id)
+        return 0
+
+    # Offres retirées ou modifiées (positions) : seules les entrées qui les
+    # recommandent sont invalidées
+    def invalidate_jobs(self, job_idx):
+        return self.result_cache.invalidate_jobs(job_idx) if self.result_cache is not None else 0
+
+    # Offres ajoutées (positions, déjà présentes dans les tableaux) : une
+    # entrée n'est invalidée que si l'une des nouvelles offres atteint le
+    # score de sa dernière recommandation
+    def jobs_added(self, job_idx):
+        if self.result_cache is None:
+            return 0
+        job_idx = np.asarray(job_idx, dtype=np.intp)
+        names = {version: name for name, version in self._model_versions.items()}
+        stale = []
+        by_version = {}
+        for key, indices, scores in self.result_cache.items():
+            if key[0] not in names:
+                stale.append(key)
+            else:
+                by_version.setdefault(key[0], []).append((key, indices, scores))
+        for version, entries in by_version.items():
+            users = [self.user_positions.row(key[1]) for key, _, _ in entries]
+            features = self.pair_features(np.repeat(users, len(job_idx)), np.tile(job_idx, len(users)))
+            new_scores = predict_scores(self.model(names[version]), features, len(users)).max(axis=1)
+            for (key, indices, scores), best in zip(entries, new_scores):
+                if len(scores) == 0 or np.isnan(scores[-1]) or best >= scores[-1]:
+                    stale.append(key)
+        return self.result_cache.invalidate_keys(stale)
+
+    def invalidate_all(self):
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    # 5. Catalogue d'offres modifiable
+    # --------------------------------
+
+    # Catalogue (job_catalogue.JobCatalogue) créé au premier usage : ajout,
+    # modification, expiration et compaction des offres
+    def catalogue(self, compact_ratio=0.25):
+        if self._catalogue is None:
+            from job_catalogue import JobCatalogue
+            self._catalogue = JobCatalogue(self, compact_ratio=compact_ratio)
+        return self._catalogue
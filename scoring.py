@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+# Ordre des features attendu par les modèles (identique à l'entraînement)
+FEATURE_COLUMNS = [
+    'skill_similarity',
+    'location_similarity',
+    'experience_similarity',
+    'user_rating',
+    'user_jobsCompleted',
+    'job_budget',
+    'job_duration'
+]
+
+# Colonnes des offres renvoyées avec les recommandations
+RECOMMENDATION_COLUMNS = ['job_id', 'title', 'category', 'location', 'required_skills']
+
+
+# Features côté offre : calculées une seule fois pour tout le catalogue
+class JobFeatures:
+    def __init__(self, budget_scaled, duration_scaled):
+        self.budget = np.asarray(budget_scaled, dtype=np.float64)
+        self.duration = np.asarray(duration_scaled, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.budget)
+
+    # Features des offres candidates : tableaux de même forme que job_idx
+    def take(self, job_idx):
+        return JobFeatures(self.budget[job_idx], self.duration[job_idx])
+
+    @classmethod
+    def from_dataframe(cls, jobs_df):
+        return cls(jobs_df['budget_scaled'].to_numpy(), jobs_df['duration_scaled'].to_numpy())
+
+
+# Construire la matrice (n_users * n_jobs, 7) à partir des colonnes NumPy :
+# les similarités sont des blocs (n_users, n_jobs), les features utilisateur
+# sont diffusées sur les offres et les features offre sur les utilisateurs.
+# Avec des offres candidates par utilisateur, similarités et features offre
+# sont des tableaux (n_users, k). La matrice reste en float32 si les
+# similarités le sont.
+def build_feature_matrix(skill_sim, location_sim, experience_sim,
+                         user_rating, user_jobs_completed, job_features):
+    skill_sim = np.atleast_2d(skill_sim)
+    n_users, n_jobs = skill_sim.shape
+    dtype = skill_sim.dtype if skill_sim.dtype == np.float32 else np.float64
+    features = np.empty((n_users, n_jobs, len(FEATURE_COLUMNS)), dtype=dtype)
+    features[:, :, 0] = skill_sim
+    features[:, :, 1] = np.atleast_2d(location_sim)
+    features[:, :, 2] = np.atleast_2d(experience_sim)
+    features[:, :, 3] = np.asarray(user_rating).reshape(n_users, 1)
+    features[:, :, 4] = np.asarray(user_jobs_completed).reshape(n_users, 1)
+    features[:, :, 5] = job_features.budget
+    features[:, :, 6] = job_features.duration
+    return features.reshape(n_users * n_jobs, len(FEATURE_COLUMNS))
+
+
+# Probabilités de la classe positive, remises en forme (n_users, n_jobs).
+# Le DataFrame n'enveloppe que la matrice existante pour garder les noms de
+# features vus par les modèles à l'entraînement. Les modèles compilés
+# (compiled_model.py) prennent directement la matrice.
+def predict_scores(model, features, n_users):
+    if hasattr(model, 'predict_positive'):
+        return model.predict_positive(features).reshape(n_users, -1)
+    features_df = pd.DataFrame(features, columns=FEATURE_COLUMNS, copy=False)
+    return model.predict_proba(features_df)[:, 1].reshape(n_users, -1)
+
+
+# Indices des top_n meilleurs scores par ligne, triés par score décroissant,
+# à égalité par indice croissant (NaN classés comme -inf). Sélection
+# partielle : argpartition puis tri des seuls top_n, O(n_jobs + top_n log
+# top_n) par ligne au lieu d'un tri complet. Les lignes dont des ex aequo
+# au seuil de sélection restent hors du top_n sont reprises en prenant les
+# plus petits indices : le résultat ne dépend pas de l'ordre interne
+# d'argpartition (les modèles à arbres donnent beaucoup d'ex aequo).
+def top_n_indices(scores, top_n):
+    scores = np.atleast_2d(scores)
+    n_rows, n_columns = scores.shape
+    top_n = min(top_n, n_columns)
+    if top_n <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+    if np.isnan(scores).any():
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+    if top_n < n_columns:
+        kth = n_columns - top_n
+        top = np.argpartition(scores, kth, axis=1)[:, kth:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        threshold = top_scores.min(axis=1, keepdims=True)
+        ties = (scores == threshold).sum(axis=1) > (top_scores == threshold).sum(axis=1)
+        for row in np.flatnonzero(ties).tolist():
+            # Les scores au-dessus du seuil sont tous dans top ; les ex aequo
+            # au seuil sont pris par indice croissant
+            row_top = top[row]
+            kept = row_top[scores[row, row_top] > threshold[row, 0]]
+            top[row, :len(kept)] = kept
+            top[row, len(kept):] = np.flatnonzero(scores[row] == threshold[row, 0])[:top_n - len(kept)]
+    else:
+        top = np.broadcast_to(np.arange(n_columns), (n_rows, n_columns))
+    order = np.lexsort((top, -np.take_along_axis(scores, top, axis=1)), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+# Top_n en flux sur un catalogue découpé en tranches d'offres (shards) :
+# chaque tranche est réduite à ses top_n (top_n_indices), puis fusionnée
+# avec le meilleur courant. La mémoire reste bornée à top_n candidats par
+# ligne quel que soit le nombre de tranches, et le résultat est celui d'une
+# sélection sur le catalogue entier, égalités comprises (score décroissant,
+# indice global croissant).
+class TopN:
+    def __init__(self, n_rows, top_n):
+        self.top_n = max(0, int(top_n))
+        self.indices = np.empty((n_rows, 0), dtype=np.intp)
+        self.scores = np.empty((n_rows, 0), dtype=np.float64)
+
+    # Scores (n_rows, n_jobs_tranche) d'une tranche commençant à l'offre offset
+    def push_scores(self, scores, offset=0):
+        top = top_n_indices(scores, self.top_n)
+        self.push(top + offset, np.take_along_axis(np.atleast_2d(scores), top, axis=1))
+
+    # Candidats déjà sélectionnés (indices globaux et scores), par exemple
+    # les top_n d'une tranche scorée dans un autre processus. Fusion par
+    # concaténation + lexsort plutôt qu'un tas borné (heapq) : au plus
+    # 2 x top_n valeurs par ligne, triées pour toutes les lignes du bloc en
+    # un appel NumPy, là où un tas ferait une boucle Python par ligne et par
+    # candidat (~7 fois plus lent sur 256 lignes, top 10, 20 tranches)
+    def push(self, indices, scores):
+        indices = np.concatenate([self.indices, np.asarray(indices, dtype=np.intp)], axis=1)
+        scores = np.concatenate([self.scores, np.asarray(scores, dtype=np.float64)], axis=1)
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        order = np.lexsort((indices, -scores), axis=1)[:, :self.top_n]
+        self.indices = np.take_along_axis(indices, order, axis=1)
+        self.scores = np.take_along_axis(scores, order, axis=1)
+
+    def result(self):
+        return self.indices, self.scores
+
+
+# Fusion des top_n de plusieurs tranches : [(indices, scores), ...]
+def merge_top_n(parts, top_n):
+    parts = list(parts)
+    merged = TopN(len(parts[0][0]) if parts else 0, top_n)
+    for indices, scores in parts:
+        merged.push(indices, scores)
+    return merged.result()
+
+
+# Mettre en forme les recommandations d'un utilisateur
+def format_recommendations(jobs_df, top_indices, top_scores):
+    columns = [column for column in RECOMMENDATION_COLUMNS if column in jobs_df.columns]
+    recommended_jobs = jobs_df.iloc[top_indices][columns].copy()
+    recommended_jobs['score'] = top_scores
+    return recommended_jobs
@@ -0,0 +1,414 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from instrumentation import instruments
+from recommender import MODEL_FILES, Recommender, default_model_files
+from scoring import RECOMMENDATION_COLUMNS
+
+# Service HTTP de recommandation (asyncio, bibliothèque standard uniquement)
+#
+#   GET  /recommend/{user_id}?top_n=5&model=XGBoost
+#   POST /interactions              {"user_id", "job_id", "interaction_type"}
+#   POST /users/{user_id}/profile   profil modifié
+#   POST /jobs                      offre(s) ajoutée(s) ou modifiée(s) (JSON)
+#   DELETE /jobs/{job_id}
+#   POST /jobs/expire?max_age_days=30
+#   GET  /stats     latences côté serveur, débit, taille des lots, cache
+#   GET  /metrics   étapes chronométrées et compteurs (texte Prometheus)
+#   GET  /health
+#
+# Les requêtes qui arrivent à quelques millisecondes d'intervalle sont
+# regroupées (MicroBatcher) en un seul appel recommend_indices : une seule
+# matrice de features empilée et un seul predict_proba par bloc
+# d'utilisateurs, puis chaque requête reçoit sa part du résultat. Avec le
+# cache de résultats du Recommender, une requête déjà servie ne passe pas
+# par la file ; interactions et profils modifiés l'invalident. Les
+# modifications du catalogue passent par le thread de scoring, entre deux
+# lots : une nouvelle offre est recommandable dès la requête suivante.
+
+DEFAULT_TOP_N = 5
+MAX_TOP_N = 100
+
+
+# 1. Regroupement des requêtes
+# ----------------------------
+
+# score(user_ids, top_n) est appelé dans l'exécuteur et renvoie, pour chaque
+# utilisateur, sa liste de recommandations triée par score décroissant
+class MicroBatcher:
+    def __init__(self, score, executor, max_wait=0.002, max_batch=256):
+        self.score = score
+        self.executor = executor
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batch_sizes = deque(maxlen=10000)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # Recommandations (top_n) d'un utilisateur connu, et taille du lot
+    async def recommend(self, user_id, top_n):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((user_id, top_n, future))
+        return await future
+
+    # Attendre la première requête, puis au plus max_wait secondes les
+    # suivantes ; pendant le scoring d'un lot, le suivant se forme déjà.
+    # Si le lot précédent ne contenait qu'une requête (trafic faible),
+    # attendre ne ferait qu'ajouter max_wait à la latence : on ne prend que
+    # les requêtes déjà en file.
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_size = 1
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + (self.max_wait if last_size > 1 else 0)
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._score(batch)
+            last_size = len(batch)
+
+    async def _score(self, batch):
+        user_ids = [user_id for user_id, _, _ in batch]
+        top_n = max(top_n for _, top_n, _ in batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.score, user_ids, top_n)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batch_sizes.append(len(batch))
+        instruments.count('service.batches')
+        instruments.count('service.batched_requests', len(batch))
+        # Le top_n d'une requête est le début du top_n du lot (tri décroissant)
+        for result, (_, request_top_n, future) in zip(results, batch):
+            if not future.done():
+                future.set_result((result[:request_top_n], len(batch)))
+
+
+# 2. Service
+# ----------
+
+class RecommendationService:
+    def __init__(self, recommender, default_model=None, max_wait=0.002, max_batch=256):
+        self.recommender = recommender
+        self.default_model = default_model or next(iter(recommender.model_files))
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        # Un seul thread de scoring : les lots sont traités l'un après l'autre
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batchers = {}
+        # Verrou pris par les modifications du catalogue et par les réponses
+        # servies depuis le cache (hors du thread de scoring) : positions en
+        # cache et colonnes des offres restent cohérentes
+        self.catalogue_lock = threading.Lock()
+        self._job_columns = (None, None)
+        self.latencies = deque(maxlen=100000)
+        self.started_at = time.perf_counter()
+        self.n_requests = 0
+        self.n_errors = 0
+
+    def batcher(self, model):
+        if model not in self.batchers:
+            self.batchers[model] = MicroBatcher(lambda user_ids, top_n: self.score(model, user_ids, top_n),
+                                                self.executor, self.max_wait, self.max_batch)
+            self.batchers[model].start()
+        return self.batchers[model]
+
+    async def handle_recommend(self, user_id, query):
+        try:
+            top_n = int(query.get('top_n', [DEFAULT_TOP_N])[0])
+        except ValueError:
+            return 400, {'error': "top_n must be an integer"}
+        if not 1 <= top_n <= MAX_TOP_N:
+            return 400, {'error': f"top_n must be between 1 and {MAX_TOP_N}"}
+        model = query.get('model', [self.default_model])[0]
+        if model not in self.recommender.model_files:
+            return 400, {'error': f"Unknown model {model!r}", 'models': list(self.recommender.model_files)}
+        if user_id not in self.recommender.user_positions:
+            return 404, {'error': f"User {user_id} not found in the dataset."}
+
+        with self.catalogue_lock:
+            cached = self.recommender.cached_recommendation(model, user_id, top_n)
+            recommendations = self.records(*cached) if cached is not None else None
+        batch_size = 0
+        if recommendations is None:
+            recommendations, batch_size = await self.batcher(model).recommend(user_id, top_n)
+        return 200, {'user_id': user_id, 'model': model, 'batch_size': batch_size,
+                     'recommendations': recommendations}
+
+    # Lot scoré et mis en forme dans le thread de scoring
+    def score(self, model, user_ids, top_n):
+        indices, scores = self.recommender.recommend_indices(model, user_ids, top_n)
+        return [self.records(row_indices, row_scores) for row_indices, row_scores in zip(indices, scores)]
+
+    # Colonnes des offres en tableaux NumPy, refaites à chaque version du
+    # catalogue : mettre en forme une réponse ne coûte que quelques
+    # indexations (format_recommendations passe par pandas, ~1,5 ms)
+    def job_columns(self):
+        version, columns = self._job_columns
+        if version != self.recommender.catalogue_version:
+            jobs_df = self.recommender.jobs_df
+            columns = {column: jobs_df[column].to_numpy()
+                       for column in RECOMMENDATION_COLUMNS if column in jobs_df.columns}
+            self._job_columns = (self.recommender.catalogue_version, columns)
+        return columns
+
+    def records(self, indices, scores):
+        valid = indices >= 0
+        columns = {column: values[indices[valid]].tolist() for column, values in self.job_columns().items()}
+        columns['score'] = scores[valid].tolist()
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    # Modification du catalogue dans le thread de scoring, sous le verrou
+    async def update_catalogue(self, change):
+        def apply():
+            with self.catalogue_lock:
+                catalogue = self.recommender.catalogue()
+                try:
+                    result = change(catalogue)
+                except ValueError as e:
+                    return 400, {'error': str(e)}
+                return 200, {'result': result, 'catalogue': catalogue.info()}
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, apply)
+
+    async def handle_jobs(self, method, path, query, body):
+        if method == 'POST' and path == '/jobs/expire':
+            try:
+                max_age_days = float(query['max_age_days'][0])
+            except (KeyError, ValueError):
+                return 400, {'error': "max_age_days is required"}
+            return await self.update_catalogue(lambda catalogue: {'expired': catalogue.expire(max_age_days)})
+        if method == 'POST' and path == '/jobs':
+            try:
+                jobs = json.loads(body or b'null')
+                jobs = [jobs] if isinstance(jobs, dict) else jobs
+                if not jobs or any('job_id' not in job for job in jobs):
+                    raise ValueError
+            except (ValueError, TypeError):
+                return 400, {'error': "Expected a JSON job object or list of jobs, each with a job_id"}
+            return await self.update_catalogue(lambda catalogue: {'positions': catalogue.add(jobs).tolist()})
+        if method == 'DELETE' and path.startswith('/jobs/'):
+            job_id = unquote(path[len('/jobs/'):])
+            return await self.update_catalogue(lambda catalogue: {'removed': catalogue.remove([job_id])})
+        return 405, {'error': f"Method {method} not allowed on {path}"}
+
+    def handle_interaction(self, body):
+        try:
+            event = json.loads(body or b'{}')
+            user_id, job_id, interaction_type = event['user_id'], event['job_id'], event['interaction_type']
+        except (ValueError, KeyError, TypeError):
+            return 400, {'error': "Expected a JSON body with user_id, job_id and interaction_type"}
+        return 200, {'invalidated': self.recommender.record_interaction(str(user_id), str(job_id), interaction_type)}
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        elapsed = time.perf_counter() - self.started_at
+        batch_sizes = [size for batcher in self.batchers.values() for size in batcher.batch_sizes]
+        report = {'requests': self.n_requests, 'errors': self.n_errors,
+                  'throughput_rps': self.n_requests / elapsed if elapsed > 0 else 0.0,
+                  'mean_batch_size': float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+                  'max_batch_size': int(max(batch_sizes, default=0))}
+        if len(latencies):
+            for p in (50, 95, 99):
+                report[f'p{p}_ms'] = float(np.percentile(latencies, p))
+        if self.recommender.result_cache is not None:
+            report['cache'] = self.recommender.result_cache.cache_info()
+        return report
+
+    # Texte Prometheus : mesures de instrumentation.instruments et état du
+    # service au moment de la requête
+    def metrics(self):
+        instruments.gauge('service.jobs', len(self.recommender.job_positions))
+        instruments.gauge('service.catalogue_version', self.recommender.catalogue_version)
+        if self.recommender.result_cache is not None:
+            info = self.recommender.result_cache.cache_info()
+            for key in ('size', 'hits', 'misses', 'evictions', 'invalidations'):
+                instruments.gauge(f'service.cache_{key}', info[key])
+        return instruments.prometheus()
+
+    def reset_stats(self):
+        self.latencies.clear()
+        for batcher in self.batchers.values():
+            batcher.batch_sizes.clear()
+        self.started_at = time.perf_counter()
+        self.n_requests = 0
+        self.n_errors = 0
+
+    async def route(self, method, target, body=b''):
+        url = urlsplit(target)
+        query = parse_qs(url.query, keep_blank_values=True)
+        if method == 'POST' and url.path == '/interactions':
+            return self.handle_interaction(body)
+        if url.path == '/jobs' or url.path.startswith('/jobs/'):
+            return await self.handle_jobs(method, url.path, query, body)
+        if method == 'POST' and url.path.startswith('/users/') and url.path.endswith('/profile'):
+            user_id = unquote(url.path[len('/users/'):-len('/profile')])
+            return 200, {'invalidated': self.recommender.invalidate_user(user_id)}
+        if method != 'GET':
+            return 405, {'error': f"Method {method} not allowed on {url.path}"}
+        if url.path.startswith('/recommend/') and len(url.path) > len('/recommend/'):
+            return await self.handle_recommend(unquote(url.path[len('/recommend/'):]), query)
+        if url.path == '/stats':
+            report = self.stats()
+            if 'reset' in query:
+                self.reset_stats()
+            return 200, report
+        if url.path == '/metrics':
+            return 200, self.metrics()
+        if url.path == '/health':
+            return 200, {'status': 'ok', 'users': len(self.recommender.user_positions),
+                         'jobs': len(self.recommender.job_positions),
+                         'models': list(self.recommender.model_files)}
+        return 404, {'error': f"No route for {url.path}"}
+
+    # Connexion HTTP/1.1 (keep-alive) : une requête à la fois
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length', '0')
+                body = await reader.readexactly(int(length)) if length.isdigit() and int(length) > 0 else b''
+
+                start = time.perf_counter()
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    parts = ['', '', 'HTTP/1.1']
+                    status, response = 400, {'error': "Malformed request line"}
+                else:
+                    try:
+                        status, response = await self.route(parts[0], parts[1], body)
+                    except Exception as e:
+                        status, response = 500, {'error': str(e)}
+                method, target, version = parts
+                if target.startswith('/recommend/'):
+                    latency = time.perf_counter() - start
+                    self.latencies.append(latency)
+                    self.n_requests += 1
+                    self.n_errors += status != 200
+                    instruments.observe('service.recommend', latency)
+                    instruments.count('service.errors', status != 200)
+
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                if isinstance(response, str):
+                    payload, content_type = response.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    payload, content_type = json.dumps(response, default=str).encode('utf-8'), 'application/json'
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"Serving recommendations on http://{host}:{port}/recommend/{{user_id}}?top_n={DEFAULT_TOP_N} "
+              f"(max wait {self.max_wait * 1000:.1f} ms, max batch {self.max_batch})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for batcher in self.batchers.values():
+                await batcher.stop()
+            self.executor.shutdown()
+
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve job recommendations over HTTP with request micro-batching.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model', default=None, help=f"Default model (default: {next(iter(MODEL_FILES))})")
+    parser.add_argument('--artifacts', default=None,
+                        help="Serve from memory-mapped artifacts (artifacts.py) instead of the CSV files and pickles")
+    parser.add_argument('--compiled-models', nargs='*', default=None,
+                        help="With --artifacts, models evaluated from their compiled arrays "
+                             "(default: linear models; tree ensembles use their pickle)")
+    parser.add_argument('--artifacts-dir', default=None,
+                        help="Serve the models published in this directory (default: models/LATEST, else ./*.pkl)")
+    parser.add_argument('--version', default=None, help="Published model version to serve (default: LATEST)")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help="How long the first request of a batch waits for others (default: 2 ms)")
+    parser.add_argument('--max-batch', type=int, default=256,
+                        help="Largest batch scored at once; 1 disables batching")
+    parser.add_argument('--candidate-k', type=int, default=None)
+    parser.add_argument('--job-shard-size', type=int, default=None,
+                        help="Score the catalogue in shards of this many jobs to bound memory on large catalogues")
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help="Cached recommendation lists (LRU); 0 disables the cache")
+    parser.add_argument('--cache-ttl', type=float, default=300.0, help="Seconds before a cached list expires")
+    args = parser.parse_args()
+    if args.artifacts is not None and (args.artifacts_dir is not None or args.version is not None):
+        parser.error("--artifacts already fixes the model version; drop --artifacts-dir/--version")
+
+    options = {'candidate_k': args.candidate_k, 'job_shard_size': args.job_shard_size,
+               'result_cache_size': args.cache_size, 'result_ttl': args.cache_ttl}
+    if args.artifacts is not None:
+        from artifacts import load_artifacts
+        recommender = load_artifacts(args.artifacts, compiled_models=args.compiled_models, **options)
+    else:
+        try:
+            recommender = Recommender(model_files=default_model_files(args.artifacts_dir, args.version), **options)
+            recommender.warm()
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            exit(1)
+    if args.model is not None and args.model not in recommender.model_files:
+        print(f"Error: unknown model {args.model!r}. Choose from {list(recommender.model_files)}")
+        exit(1)
+
+    service = RecommendationService(recommender, args.model, args.max_wait_ms / 1000, max(1, args.max_batch))
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,307 @@
+import ast
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+
+
+# Registre des features par paire (utilisateur, offre).
+# Chaque feature est définie par :
+#   - encode(users_df, jobs_df) -> (valeurs utilisateur, valeurs offre), calculé une fois
+#   - compute(valeurs utilisateur du bloc, valeurs offre) -> matrice (n_users_bloc, n_jobs)
+PAIRWISE_FEATURES = {}
+
+
+def register_pairwise_feature(name, encode, compute):
+    PAIRWISE_FEATURES[name] = (encode, compute)
+
+
+def _as_list(x):
+    if isinstance(x, str):
+        try:
+            x = ast.literal_eval(x)
+        except (ValueError, SyntaxError):
+            return []
+    return list(x) if isinstance(x, (list, tuple, set)) else []
+
+
+# Codes catégoriels partagés entre utilisateurs et offres. Les valeurs
+# manquantes reçoivent des codes distincts pour ne jamais être égales.
+def encode_shared_categories(user_values, job_values):
+    codes, _ = pd.factorize(pd.concat([pd.Series(user_values), pd.Series(job_values)], ignore_index=True))
+    user_codes = codes[:len(user_values)].astype(np.int64)
+    job_codes = codes[len(user_values):].astype(np.int64)
+    user_codes[user_codes < 0] = -1
+    job_codes[job_codes < 0] = -2
+    return user_codes, job_codes
+
+
+# Masques de bits (uint64) pour des colonnes de listes : tableaux
+# (n, n_mots), un mot de 64 bits par tranche de 64 valeurs du vocabulaire
+# (un seul mot pour les langues)
+def encode_bitmasks(user_lists, job_lists):
+    user_lists = [_as_list(x) for x in user_lists]
+    job_lists = [_as_list(x) for x in job_lists]
+    vocabulary = {}
+    for values in user_lists + job_lists:
+        for value in values:
+            vocabulary.setdefault(value, len(vocabulary))
+    n_words = max(1, -(-len(vocabulary) // 64))
+
+    def to_masks(lists):
+        bits = [sum(1 << vocabulary[v] for v in set(values)) for values in lists]
+        masks = np.zeros((len(lists), n_words), dtype=np.uint64)
+        for word in range(n_words):
+            masks[:, word] = [(b >> (64 * word)) & 0xFFFFFFFFFFFFFFFF for b in bits]
+        return masks
+
+    return to_masks(user_lists), to_masks(job_lists)
+
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(masks):
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    return _POPCOUNT_TABLE[masks.view(np.uint8)].reshape(masks.shape + (8,)).sum(axis=-1)
+
+
+# Les fonctions compute sont élément par élément : elles reçoivent des
+# valeurs utilisateur (n, 1) et des valeurs offre (1, n_jobs) ou (n, k)
+# (candidats par utilisateur) et s'appuient sur le broadcasting NumPy.
+
+# 1. Localisation : 1 si même ville, 0.5 sinon
+def _encode_location(users_df, jobs_df):
+    return encode_shared_categories(users_df['location'], jobs_df['location'])
+
+
+def _location_similarity(user_codes, job_codes):
+    return np.where(user_codes == job_codes, 1.0, 0.5)
+
+
+# 2. Expérience : 1 - |jobsCompleted normalisé - durée normalisée|
+def _encode_experience(users_df, jobs_df):
+    return (users_df['jobsCompleted_scaled'].to_numpy(dtype=np.float64),
+            jobs_df['duration_scaled'].to_numpy(dtype=np.float64))
+
+
+def _experience_similarity(user_exp, job_duration):
+    return 1 - np.abs(user_exp - job_duration)
+
+
+# 3. Langues : part des langues requises parlées par l'utilisateur
+def _encode_languages(users_df, jobs_df):
+    return encode_bitmasks(users_df['languages'], jobs_df['required_languages'])
+
+
+def _language_overlap(user_languages, job_languages):
+    required = popcount(job_languages).sum(axis=-1).astype(np.float64)
+    shared = popcount(user_languages & job_languages).sum(axis=-1).astype(np.float64)
+    return np.divide(shared, required, out=np.ones(np.broadcast(shared, required).shape), where=required > 0)
+
+
+# 4. Domaine : 1 si le domaine de l'utilisateur est celui de l'offre
+def _encode_domain(users_df, jobs_df):
+    job_domain = jobs_df['domain'] if 'domain' in jobs_df.columns else jobs_df['category']
+    return encode_shared_categories(users_df['domain'], job_domain)
+
+
+def _domain_match(user_codes, job_codes):
+    return (user_codes == job_codes).astype(np.float64)
+
+
+register_pairwise_feature('location_similarity', _encode_location, _location_similarity)
+register_pairwise_feature('experience_similarity', _encode_experience, _experience_similarity)
+register_pairwise_feature('language_overlap', _encode_languages, _language_overlap)
+register_pairwise_feature('domain_match', _encode_domain, _domain_match)
+
+
+# TF-IDF des compétences à partir des matrices CSR (lignes x compétences) du
+# feature store, sans repasser par les chaînes. Les compétences sont découpées
+# en tokens comme le ferait TfidfVectorizer sur ' '.join(skills), et le
+# vocabulaire est restreint aux tokens vus chez les utilisateurs (fit sur les
+# utilisateurs, transform sur les offres).
+# Avec return_encoder=True, renvoie aussi le SkillTfidfEncoder figé qui
+# encode de nouvelles offres exactement comme transform.
+def skills_tfidf(user_skills, job_skills, skill_vocabulary, return_encoder=False):
+    vectorizer = CountVectorizer()
+    skill_tokens = vectorizer.fit_transform(list(skill_vocabulary))
+    user_counts = (user_skills @ skill_tokens).tocsr()
+    job_counts = (job_skills @ skill_tokens).tocsr()
+    seen = np.flatnonzero(user_counts.getnnz(axis=0))
+    tfidf = TfidfTransformer()
+    user_skills_tfidf = tfidf.fit_transform(user_counts[:, seen])
+    job_skills_tfidf = tfidf.transform(job_counts[:, seen])
+    if not return_encoder:
+        return user_skills_tfidf, job_skills_tfidf
+    columns = {column: position for position, column in enumerate(seen.tolist())}
+    token_columns = {token: columns[column] for token, column in vectorizer.vocabulary_.items() if column in columns}
+    return user_skills_tfidf, job_skills_tfidf, SkillTfidfEncoder(token_columns, tfidf.idf_)
+
+
+# TF-IDF figé : vocabulaire de tokens et idf appris sur les utilisateurs.
+# transform(listes de compétences) donne les mêmes lignes que skills_tfidf
+# pour les compétences connues ; les tokens inconnus sont ignorés.
+class SkillTfidfEncoder:
+    def __init__(self, token_columns, idf):
+        self.token_columns = dict(token_columns)
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self._analyzer = CountVectorizer().build_analyzer()
+
+    @property
+    def n_tokens(self):
+        return len(self.idf)
+
+    def transform(self, skill_lists):
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+
+        indptr, indices, counts = [0], [], []
+        for skills in skill_lists:
+            row = {}
+            for skill in dict.fromkeys(_as_list(skills)):
+                for token in self._analyzer(skill):
+                    column = self.token_columns.get(token)
+                    if column is not None:
+                        row[column] = row.get(column, 0) + 1
+            for column in sorted(row):
+                indices.append(column)
+                counts.append(row[column])
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix((np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int32),
+                                    np.asarray(indptr, dtype=np.int32)), shape=(len(indptr) - 1, self.n_tokens))
+        return normalize(matrix @ sparse.diags(self.idf), norm='l2')
+
+
+# Calcul à la demande des features par paire, bloc d'utilisateurs par bloc
+class PairwiseFeatures:
+    def __init__(self, users_df, jobs_df, names=None):
+        self.users_df = users_df
+        self.jobs_df = jobs_df
+        self.names = list(PAIRWISE_FEATURES) if names is None else list(names)
+        self._encoded = {}
+
+    # Features déjà encodées (par exemple relues depuis des tableaux exportés)
+    @classmethod
+    def from_encoded(cls, encoded):
+        features = cls(None, None, list(encoded))
+        features._encoded = dict(encoded)
+        return features
+
+    def encoded(self, name):
+        if name not in self._encoded:
+            encode, _ = PAIRWISE_FEATURES[name]
+            self._encoded[name] = encode(self.users_df, self.jobs_df)
+        return self._encoded[name]
+
+    # Matrice (n_users, n_jobs) pour tout le catalogue ou pour une tranche
+    # d'offres (job_idx slice), ou (n_users, k) si job_idx donne les offres
+    # candidates de chaque utilisateur
+    def compute(self, name, user_idx, job_idx=None):
+        _, compute = PAIRWISE_FEATURES[name]
+        user_values, job_values = self.encoded(name)
+        user_values = user_values[np.asarray(user_idx, dtype=np.intp)][:, None]
+        if job_idx is None:
+            job_values = job_values[None, :]
+        elif isinstance(job_idx, slice):
+            job_values = job_values[None, job_idx]
+        else:
+            job_values = job_values[job_idx]
+        return compute(user_values, job_values)
+
+    def block(self, user_idx, names=None, job_idx=None):
+        return {name: self.compute(name, user_idx, job_idx) for name in (names or self.names)}
+
+
+# Fournisseur paresseux de similarités : ne calcule que les lignes des
+# utilisateurs scorés, par blocs de taille fixe, avec un LRU optionnel
+# sur les lignes des utilisateurs fréquents. La similarité de compétences
+# d'un bloc est un seul produit creux (utilisateurs x offres) ; l'index
+# inversé (skill_index.py) ne sert qu'à la génération de candidats.
+class SimilarityProvider:
+    def __init__(self, user_skills_tfidf, job_skills_tfidf, pairwise_features,
+                 block_size=256, dtype=np.float64, cache_size=0):
+        self.user_skills_tfidf = user_skills_tfidf
+        self.job_skills_tfidf = job_skills_tfidf
+        self.pairwise_features = pairwise_features
+        self.block_size = max(1, int(block_size))
+        self.dtype = np.dtype(dtype)
+        self.cache_size = int(cache_size)
+        self.names = ['skill_similarity'] + list(pairwise_features.names)
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def n_jobs(self):
+        return self.job_skills_tfidf.shape[0]
+
+    def _compute(self, user_idx):
+        skill = (self.user_skills_tfidf[user_idx] @ self.job_skills_tfidf.T).toarray()
+        rows = {'skill_similarity': skill}
+        rows.update(self.pairwise_features.block(user_idx))
+        return {name: np.asarray(rows[name], dtype=self.dtype) for name in self.names}
+
+    # Similarités restreintes aux offres candidates job_idx (n_users, k).
+    # Les vecteurs TF-IDF étant normalisés (L2), le produit scalaire est le cosinus.
+    def _compute_pairs(self, user_idx, job_idx):
+        n_users, k = job_idx.shape
+        users = self.user_skills_tfidf[np.repeat(user_idx, k)]
+        jobs = self.job_skills_tfidf[job_idx.ravel()]
+        skill = np.asarray(users.multiply(jobs).sum(axis=1)).reshape(n_users, k)
+        rows = {'skill_similarity': skill}
+        rows.update(self.pairwise_features.block(user_idx, job_idx=job_idx))
+        return {name: np.asarray(rows[name], dtype=self.dtype) for name in self.names}
+
+    # Similarités avec une tranche contiguë d'offres (slice) : produit creux
+    # restreint aux lignes de la tranche
+    def _compute_shard(self, user_idx, jobs):
+        skill = (self.user_skills_tfidf[user_idx] @ self.job_skills_tfidf[jobs].T).toarray()
+        rows = {'skill_similarity': skill}
+        rows.update(self.pairwise_features.block(user_idx, job_idx=jobs))
+        return {name: np.asarray(rows[name], dtype=self.dtype) for name in self.names}
+
+    # Similarités (len(user_idx), n_jobs) pour chaque feature,
+    # (len(user_idx), k) pour les offres candidates job_idx, ou limitées à
+    # une tranche d'offres si job_idx est un slice (sans cache)
+    def rows(self, user_idx, job_idx=None):
+        user_idx = np.asarray(user_idx, dtype=np.intp)
+        if isinstance(job_idx, slice):
+            return self._compute_shard(user_idx, job_idx)
+        if job_idx is not None:
+            return self._compute_pairs(user_idx, np.asarray(job_idx, dtype=np.intp))
+        if self.cache_size <= 0:
+            return self._compute(user_idx)
+
+        found = {}
+        missing = []
+        for user in dict.fromkeys(user_idx.tolist()):
+            if user in self._cache:
+                self._cache.move_to_end(user)
+                found[user] = self._cache[user]
+                self.hits += 1
+            else:
+                missing.append(user)
+                self.misses += 1
+        if missing:
+            computed = self._compute(np.asarray(missing, dtype=np.intp))
+            for k, user in enumerate(missing):
+                found[user] = {name: computed[name][k].copy() for name in self.names}
+                self._cache[user] = found[user]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {name: np.stack([found[user][name] for user in user_idx.tolist()]) for name in self.names}
+
+    # Parcourir les utilisateurs par blocs de block_size : (tranche, similarités)
+    def iter_blocks(self, user_idx):
+        user_idx = np.asarray(user_idx, dtype=np.intp)
+        for start in range(0, len(user_idx), self.block_size):
+            block = slice(start, min(start + self.block_size, len(user_idx)))
+            yield block, self.rows(user_idx[block])
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache), 'max_size': self.cache_size}
+
+    def clear_cache(self):
+        self._cache.clear()
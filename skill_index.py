@@ -0,0 +1,165 @@
+import ast
+
+import numpy as np
+from scipy import sparse
+
+
+# Index inversé terme -> offres, construit une fois à partir d'une matrice
+# (offres x termes) : pour chaque terme (compétence ou token TF-IDF), la liste
+# triée des offres qui le contiennent et les poids associés. Les scores d'un
+# utilisateur ne sont calculés que pour les offres partageant au moins un
+# terme avec lui. Les offres ajoutées ensuite (append) forment un segment
+# delta en CSR, parcouru en plus des listes jusqu'à la prochaine
+# reconstruction de l'index (compaction du catalogue, job_catalogue.py).
+class InvertedIndex:
+    def __init__(self, job_matrix):
+        postings = sparse.csc_matrix(job_matrix)
+        postings.sort_indices()
+        self.n_jobs, self.n_terms = postings.shape
+        self.n_indexed = self.n_jobs
+        self.indptr = postings.indptr
+        self.job_ids = postings.indices.astype(np.intp)
+        self.weights = postings.data
+        self.delta = None
+
+    # Index reconstruit depuis ses tableaux (par exemple relus en mmap)
+    @classmethod
+    def from_postings(cls, indptr, job_ids, weights, n_jobs):
+        index = cls.__new__(cls)
+        index.n_jobs, index.n_terms = int(n_jobs), len(indptr) - 1
+        index.n_indexed = index.n_jobs
+        index.indptr = indptr
+        index.job_ids = job_ids
+        index.weights = weights
+        index.delta = None
+        return index
+
+    # Ajouter des offres (lignes offres x termes) en fin d'index
+    def append(self, job_matrix):
+        job_matrix = sparse.csr_matrix(job_matrix, dtype=np.float64)
+        self.delta = job_matrix if self.delta is None else sparse.vstack([self.delta, job_matrix], format='csr')
+        self.n_jobs += job_matrix.shape[0]
+
+    def postings_arrays(self):
+        return {'indptr': self.indptr, 'job_ids': self.job_ids, 'weights': self.weights}
+
+    def postings(self, term):
+        postings = self.job_ids[self.indptr[term]:self.indptr[term + 1]]
+        if self.delta is None:
+            return postings
+        return np.concatenate([postings, self.n_indexed + self.delta[:, [term]].nonzero()[0]])
+
+    # Offres (triées) partageant au moins un terme, et score = somme des
+    # produits des poids (nombre de termes communs si binaire, cosinus si
+    # les deux côtés sont des vecteurs TF-IDF normalisés)
+    def match(self, terms, weights=None, job_mask=None):
+        terms = np.asarray(terms, dtype=np.intp)
+        weights = np.ones(len(terms)) if weights is None else np.asarray(weights, dtype=np.float64)
+        starts = self.indptr[terms]
+        lengths = self.indptr[terms + 1] - starts
+        if lengths.sum() == 0:
+            jobs, scores = np.empty(0, dtype=np.intp), np.empty(0)
+        else:
+            # Positions de toutes les entrées des listes concernées, sans boucle Python
+            offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+            positions = offsets + np.arange(lengths.sum())
+            jobs, inverse = np.unique(self.job_ids[positions], return_inverse=True)
+            scores = np.bincount(inverse, weights=self.weights[positions] * np.repeat(weights, lengths),
+                                 minlength=len(jobs))
+        if self.delta is not None:
+            query = sparse.csr_matrix((weights, terms, [0, len(terms)]), shape=(1, self.n_terms))
+            delta_scores = (self.delta @ query.T).tocoo()
+            order = np.argsort(delta_scores.row, kind='stable')
+            jobs = np.concatenate([jobs, self.n_indexed + delta_scores.row[order].astype(np.intp)])
+            scores = np.concatenate([scores, delta_scores.data[order]])
+        if job_mask is not None:
+            keep = job_mask[jobs]
+            jobs, scores = jobs[keep], scores[keep]
+        return jobs, scores
+
+    def match_row(self, row_vector, job_mask=None):
+        row_vector = sparse.csr_matrix(row_vector)
+        return self.match(row_vector.indices, row_vector.data, job_mask)
+
+    # (n_users, k) offres candidates : meilleurs scores d'abord (égalités par
+    # indice croissant), complétées si besoin par les offres restantes
+    # autorisées, dans l'ordre des indices
+    def search(self, user_vectors, k, job_mask=None):
+        user_vectors = sparse.csr_matrix(user_vectors)
+        allowed = np.arange(self.n_jobs) if job_mask is None else np.flatnonzero(job_mask)
+        k = min(k, len(allowed))
+        candidates = np.empty((user_vectors.shape[0], k), dtype=np.intp)
+        for row in range(user_vectors.shape[0]):
+            jobs, scores = self.match_row(user_vectors[row], job_mask)
+            if len(jobs) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                jobs, scores = jobs[top], scores[top]
+            jobs = jobs[np.lexsort((jobs, -scores))]
+            if len(jobs) < k:
+                fill = allowed[~np.isin(allowed, jobs, assume_unique=True)][:k - len(jobs)]
+                jobs = np.concatenate([jobs, fill])
+            candidates[row] = jobs
+        return candidates
+
+
+# Appariement exact des compétences : nombre de compétences communes (index
+# sur les compétences) et cosinus TF-IDF (index sur les tokens TF-IDF)
+class SkillIndex:
+    def __init__(self, job_skills, job_skills_tfidf):
+        self.skills = InvertedIndex(sparse.csr_matrix(job_skills).astype(bool).astype(np.float64))
+        self.tfidf = InvertedIndex(job_skills_tfidf)
+
+    @classmethod
+    def from_indexes(cls, skills, tfidf):
+        index = cls.__new__(cls)
+        index.skills = skills
+        index.tfidf = tfidf
+        return index
+
+    @property
+    def n_jobs(self):
+        return self.skills.n_jobs
+
+    def overlap_counts(self, user_skill_ids, job_mask=None):
+        jobs, counts = self.skills.match(np.unique(user_skill_ids), job_mask=job_mask)
+        return jobs, counts.astype(np.int64)
+
+    def cosine(self, user_tfidf_row, job_mask=None):
+        return self.tfidf.match_row(user_tfidf_row, job_mask)
+
+    def search(self, user_skills_tfidf, k, job_mask=None):
+        return self.tfidf.search(user_skills_tfidf, k, job_mask)
+
+
+# Langues d'une offre : liste, texte d'une liste Python tel que lu dans un
+# CSV ("['Français', 'Anglais']") ou langue seule ; valeur manquante -> []
+def _as_languages(value):
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return [value]
+        if isinstance(value, str):
+            return [value]
+    return list(value) if isinstance(value, (list, tuple, set, np.ndarray)) else []
+
+
+# Filtre booléen sur les offres (domaine, localisation, langues requises).
+# Domaine et localisation sont ignorés s'ils valent None ou si la colonne
+# est absente ; les localisations sont normalisées comme la colonne
+# (str.capitalize au chargement). Un filtre de langues sans colonne
+# required_languages lève ValueError.
+def job_filter_mask(jobs_df, domains=None, locations=None, languages=None):
+    mask = np.ones(len(jobs_df), dtype=bool)
+    domain_column = 'domain' if 'domain' in jobs_df.columns else 'category'
+    if domains is not None and domain_column in jobs_df.columns:
+        mask &= jobs_df[domain_column].isin(list(domains)).to_numpy()
+    if locations is not None and 'location' in jobs_df.columns:
+        mask &= jobs_df['location'].isin([str(location).capitalize() for location in locations]).to_numpy()
+    if languages is not None:
+        if 'required_languages' not in jobs_df.columns:
+            raise ValueError("Cannot filter on languages: the jobs have no 'required_languages' column")
+        spoken = set(_as_languages(languages))
+        mask &= np.fromiter((set(_as_languages(required)) <= spoken for required in jobs_df['required_languages']),
+                            dtype=bool, count=len(jobs_df))
+    return mask
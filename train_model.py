@@ -1,197 +1,437 @@
-import pandas as pd
-import ast
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MinMaxScaler
-import numpy as np
+import argparse
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import joblib
+import numpy as np
+import pandas as pd
 
-# Charger les données
-try:
-    users_df = pd.read_csv('users_synthetic.csv')
-    jobs_df = pd.read_csv('jobs_synthetic.csv')
-    interactions_df = pd.read_csv('interactions_synthetic.csv')
-except FileNotFoundError as e:
-    print(f"Error: {e}. Please ensure the CSV files exist in the directory.")
-    exit(1)
-
-# Nettoyage des données
-def safe_eval(x):
-    try:
-        return ast.literal_eval(x)
-    except (ValueError, SyntaxError):
-        return []
+from instrumentation import instruments, start_metrics_server
+from recommender import MODEL_FILES, POSITIVE_TYPES, Recommender
+from scoring import FEATURE_COLUMNS
+
+# Pipeline d'entraînement : paires positives (interactions applied/saved),
+# négatifs échantillonnés (aléatoires + difficiles, proches en compétences),
+# features calculées avec le code du scoring (Recommender.pair_features),
+# puis apprentissage des quatre modèles en parallèle. Chaque entraînement
+# est publié dans un répertoire versionné models/vNNNN, avec métadonnées et
+# mesures de temps ; models/LATEST désigne la dernière version. Le mode
+# --incremental met à jour la dernière version avec les seules interactions
+# postérieures à son checkpoint.
+
+DEFAULT_ARTIFACTS_DIR = 'models'
+LATEST_FILE = 'LATEST'
+METADATA_FILE = 'metadata.json'
 
-users_df['skills'] = users_df['skills'].apply(safe_eval)
-jobs_df['required_skills'] = jobs_df['required_skills'].apply(safe_eval)
-
-# Gérer les valeurs nulles
-users_df['rating'] = users_df['rating'].fillna(users_df['rating'].mean())
-users_df['jobsCompleted'] = users_df['jobsCompleted'].fillna(0)
-users_df['location'] = users_df['location'].str.capitalize()
-jobs_df['location'] = jobs_df['location'].str.capitalize()
-
-# Vérifier les doublons
-users_df = users_df.drop_duplicates(subset=['id'])
-jobs_df = jobs_df.drop_duplicates(subset=['job_id'])
-
-# Normaliser jobsCompleted et duration_days
-scaler = MinMaxScaler()
-users_df['jobsCompleted_scaled'] = scaler.fit_transform(users_df[['jobsCompleted']])
-jobs_df['duration_scaled'] = scaler.fit_transform(jobs_df[['duration_days']])
-jobs_df['budget_scaled'] = scaler.fit_transform(jobs_df[['budget']])
-
-# Préparer les features pour le content-based
-users_df['skills_str'] = users_df['skills'].apply(lambda x: ' '.join(x))
-jobs_df['required_skills_str'] = jobs_df['required_skills'].apply(lambda x: ' '.join(x))
-
-tfidf = TfidfVectorizer()
-user_skills_tfidf = tfidf.fit_transform(users_df['skills_str'])
-job_skills_tfidf = tfidf.transform(jobs_df['required_skills_str'])
-skills_similarity = cosine_similarity(user_skills_tfidf, job_skills_tfidf)
-
-location_similarity = np.zeros((len(users_df), len(jobs_df)))
-for i, user_loc in enumerate(users_df['location']):
-    for j, job_loc in enumerate(jobs_df['location']):
-        location_similarity[i, j] = 1 if user_loc == job_loc else 0.5
-
-experience_similarity = np.zeros((len(users_df), len(jobs_df)))
-for i, user_exp in enumerate(users_df['jobsCompleted_scaled']):
-    for j, job_duration in enumerate(jobs_df['duration_scaled']):
-        experience_similarity[i, j] = 1 - abs(user_exp - job_duration)
-
-# Charger les modèles
-model_files = {
-    'Logistic Regression': 'logistic_regression.pkl',
-    'Random Forest': 'random_forest.pkl',
-    'Gradient Boosting': 'gradient_boosting.pkl',
-    'XGBoost': 'xgboost.pkl'
+# Modèles : (module, classe, hyperparamètres). Les bibliothèques ne sont
+# importées que dans le processus qui entraîne le modèle.
+MODEL_SPECS = {
+    'Logistic Regression': ('sklearn.linear_model', 'LogisticRegression', {'max_iter': 1000}),
+    'Random Forest': ('sklearn.ensemble', 'RandomForestClassifier',
+                      {'n_estimators': 100, 'max_depth': 12, 'random_state': 42, 'n_jobs': None}),
+    'Gradient Boosting': ('sklearn.ensemble', 'GradientBoostingClassifier',
+                          {'n_estimators': 100, 'max_depth': 3, 'random_state': 42}),
+    'XGBoost': ('xgboost', 'XGBClassifier',
+                {'n_estimators': 100, 'max_depth': 6, 'learning_rate': 0.1, 'eval_metric': 'logloss',
+                 'random_state': 42, 'n_jobs': None})
 }
-best_models = {}
-for name, file in model_files.items():
+
+
+# 1. Paires d'entraînement
+# ------------------------
+
+# Positions (utilisateur, offre) uniques des interactions positives ; les
+# identifiants inconnus du catalogue sont ignorés
+def positive_pairs(recommender, interactions_df, types=POSITIVE_TYPES):
+    positives = interactions_df[interactions_df['interaction_type'].isin(types)]
+    users = recommender.user_positions.rows(positives['user_id'].tolist())
+    jobs = recommender.job_positions.rows(positives['job_id'].tolist())
+    known = (users >= 0) & (jobs >= 0)
+    keys = np.unique(users[known] * len(recommender.job_positions) + jobs[known])
+    return keys // len(recommender.job_positions), keys % len(recommender.job_positions)
+
+
+# Négatifs : `ratio` offres tirées uniformément par positif, plus
+# `hard_ratio` négatifs difficiles par positif parmi les hard_k offres les
+# plus proches en compétences (index TF-IDF) sans interaction positive.
+# Les paires positives (ou les paires `exclude`, tableau (users, jobs)) et
+# les doublons sont retirés.
+def sample_negatives(recommender, pos_users, pos_jobs, ratio=4, hard_ratio=1, hard_k=50, seed=42, exclude=None):
+    rng = np.random.default_rng(seed)
+    n_jobs = len(recommender.job_positions)
+    users = [np.repeat(pos_users, ratio)]
+    jobs = [rng.integers(0, n_jobs, len(users[0]))]
+
+    if hard_ratio > 0 and len(pos_users):
+        unique_users, counts = np.unique(pos_users, return_counts=True)
+        candidates = recommender.skill_index.search(recommender.user_skills_tfidf[unique_users], hard_k)
+        shuffled = np.take_along_axis(candidates, np.argsort(rng.random(candidates.shape), axis=1), axis=1)
+        wanted = np.minimum(counts * hard_ratio, candidates.shape[1])
+        selected = np.arange(candidates.shape[1])[None, :] < wanted[:, None]
+        users.append(np.broadcast_to(unique_users[:, None], candidates.shape)[selected])
+        jobs.append(shuffled[selected])
+
+    keys = np.unique(np.concatenate(users).astype(np.int64) * n_jobs + np.concatenate(jobs))
+    excluded_users, excluded_jobs = (pos_users, pos_jobs) if exclude is None else exclude
+    keys = keys[~np.isin(keys, excluded_users.astype(np.int64) * n_jobs + excluded_jobs)]
+    return keys // n_jobs, keys % n_jobs
+
+
+# Date de la dernière interaction prise en compte (None sans horodatage)
+def interactions_checkpoint(interactions_df):
+    if 'timestamp' not in interactions_df.columns or interactions_df.empty:
+        return None
+    return pd.to_datetime(interactions_df['timestamp'].astype(str)).max().isoformat()
+
+
+# Interactions déjà prises en compte à la date du checkpoint : avec des
+# horodatages au jour près, d'autres interactions peuvent arriver ensuite à
+# la même date ; la mise à jour suivante reprend à >= checkpoint sans elles
+CHECKPOINT_KEY_COLUMNS = ['user_id', 'job_id', 'interaction_type']
+
+
+def checkpoint_rows(interactions_df, checkpoint):
+    if checkpoint is None:
+        return []
+    timestamps = pd.to_datetime(interactions_df['timestamp'].astype(str))
+    rows = interactions_df.loc[(timestamps == pd.Timestamp(checkpoint)).to_numpy(), CHECKPOINT_KEY_COLUMNS]
+    return rows.astype(str).values.tolist()
+
+
+# 2. Apprentissage parallèle
+# --------------------------
+
+def build_estimator(name, n_jobs=1):
+    module, class_name, params = MODEL_SPECS[name]
+    params = dict(params)
+    if 'n_jobs' in params:
+        params['n_jobs'] = n_jobs
+    return getattr(importlib.import_module(module), class_name)(**params)
+
+
+# Les features sont relues en mmap depuis le répertoire temporaire : une
+# seule copie physique pour tous les processus
+def _fit_model(task):
+    name, features_dir, n_jobs = task
+    X = pd.DataFrame(np.load(os.path.join(features_dir, 'X.npy'), mmap_mode='r'), columns=FEATURE_COLUMNS)
+    y = np.load(os.path.join(features_dir, 'y.npy'), mmap_mode='r')
+    estimator = build_estimator(name, n_jobs)
+    start = time.perf_counter()
+    estimator.fit(X, y)
+    return name, estimator, time.perf_counter() - start
+
+
+def fit_models(X, y, names, workers=1):
+    workers = max(1, min(workers, len(names)))
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    with tempfile.TemporaryDirectory(prefix='train_features_') as features_dir:
+        np.save(os.path.join(features_dir, 'X.npy'), X)
+        np.save(os.path.join(features_dir, 'y.npy'), y)
+        tasks = [(name, features_dir, n_jobs) for name in names]
+        if workers == 1:
+            results = [_fit_model(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_fit_model, tasks))
+    for name, _, seconds in results:
+        instruments.observe(f'train.fit:{name}', seconds)
+    return {name: (estimator, seconds) for name, estimator, seconds in results}
+
+
+# 3. Artefacts versionnés
+# -----------------------
+
+def latest_version(artifacts_dir=DEFAULT_ARTIFACTS_DIR):
     try:
-        best_models[name] = joblib.load(file)
-        print(f"Loaded {name} from {file}")
+        with open(os.path.join(artifacts_dir, LATEST_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
     except FileNotFoundError:
-        print(f"Error: {file} not found. Please run the training script first.")
-        exit(1)
+        return None
+
 
-# Fonction pour générer des recommandations avec un modèle
-def recommend_jobs(model, user_id, top_n=5):
+def next_version(artifacts_dir=DEFAULT_ARTIFACTS_DIR):
+    numbers = [int(name[1:]) for name in os.listdir(artifacts_dir)
+               if name.startswith('v') and name[1:].isdigit()] if os.path.isdir(artifacts_dir) else []
+    return f'v{max(numbers, default=0) + 1:04d}'
+
+
+# Fichiers des modèles d'une version (par défaut la dernière), au format de
+# MODEL_FILES : utilisable comme Recommender(model_files=...)
+def version_model_files(artifacts_dir=DEFAULT_ARTIFACTS_DIR, version=None):
+    version = version or latest_version(artifacts_dir)
+    if version is None:
+        raise FileNotFoundError(f"No published model version in {artifacts_dir}. Please run the training script first.")
+    return {name: os.path.join(artifacts_dir, version, file) for name, file in MODEL_FILES.items()}
+
+
+def read_metadata(artifacts_dir=DEFAULT_ARTIFACTS_DIR, version=None):
+    version = version or latest_version(artifacts_dir)
+    with open(os.path.join(artifacts_dir, version, METADATA_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Écrire la version dans un répertoire temporaire, la renommer, puis
+# remplacer LATEST : un lecteur voit l'ancienne ou la nouvelle version,
+# jamais une version partielle
+def publish_version(artifacts_dir, estimators, metadata, version=None):
+    os.makedirs(artifacts_dir, exist_ok=True)
+    version = version or next_version(artifacts_dir)
+    staging = tempfile.mkdtemp(prefix=f'.{version}.', dir=artifacts_dir)
     try:
-        user_idx = users_df[users_df['id'] == user_id].index[0]
-    except IndexError:
-        print(f"Error: User {user_id} not found in the dataset.")
-        return pd.DataFrame()
-    
-    test_data = []
-    for job_idx in range(len(jobs_df)):
-        test_data.append({
-            'skill_similarity': skills_similarity[user_idx, job_idx],
-            'location_similarity': location_similarity[user_idx, job_idx],
-            'experience_similarity': experience_similarity[user_idx, job_idx],
-            'user_rating': users_df.loc[user_idx, 'rating'],
-            'user_jobsCompleted': users_df.loc[user_idx, 'jobsCompleted_scaled'],
-            'job_budget': jobs_df.loc[job_idx, 'budget_scaled'],
-            'job_duration': jobs_df.loc[job_idx, 'duration_scaled']
-        })
-    
-    test_df = pd.DataFrame(test_data)
-    scores = model.predict_proba(test_df)[:, 1]
-    top_indices = np.argsort(scores)[::-1][:top_n]
-    recommended_jobs = jobs_df.iloc[top_indices][['job_id', 'title', 'category', 'location', 'required_skills']]
-    recommended_jobs['score'] = scores[top_indices]
-    return recommended_jobs
-
-# Fonction pour calculer nDCG@K
-def calculate_ndcg(recommended_jobs, relevant_jobs, top_n):
-    dcg = 0.0
-    idcg = 0.0
-    for i, job_id in enumerate(recommended_jobs['job_id'][:top_n], 1):
-        if job_id in relevant_jobs:
-            dcg += 1.0 / np.log2(i + 1)
-        idcg += 1.0 / np.log2(i + 1)
-    return dcg / idcg if idcg > 0 else 0.0
-
-# Fonction pour évaluer les recommandations
-def evaluate_recommendations(model, user_id, top_n=5):
-    recommended_jobs = recommend_jobs(model, user_id, top_n)
-    recommended_job_ids = set(recommended_jobs['job_id'].values)
-    
-    relevant_jobs = set(interactions_df[
-        (interactions_df['user_id'] == user_id) & 
-        (interactions_df['interaction_type'] == 'applied')
-    ]['job_id'].values)
-    
-    if len(recommended_job_ids) == 0:
-        precision = 0.0
-    else:
-        relevant_recommended = len(recommended_job_ids.intersection(relevant_jobs))
-        precision = relevant_recommended / len(recommended_job_ids)
-    
-    if len(relevant_jobs) == 0:
-        recall = 0.0
-    else:
-        relevant_recommended = len(recommended_job_ids.intersection(relevant_jobs))
-        recall = relevant_recommended / len(relevant_jobs)
-    
-    if precision + recall == 0:
-        f1_score = 0.0
+        for name, estimator in estimators.items():
+            joblib.dump(estimator, os.path.join(staging, MODEL_FILES[name]))
+        with open(os.path.join(staging, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(dict(metadata, version=version), f, ensure_ascii=False, indent=2)
+        os.replace(staging, os.path.join(artifacts_dir, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    latest_tmp = os.path.join(artifacts_dir, f'.{LATEST_FILE}.tmp')
+    with open(latest_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(artifacts_dir, LATEST_FILE))
+    return version
+
+
+# 4. Pipeline complet
+# -------------------
+
+# dataset : description libre des données d'entraînement (paramètres de
+# génération...), recopiée dans les métadonnées de la version
+def train(recommender=None, artifacts_dir=DEFAULT_ARTIFACTS_DIR, names=None, negatives=4, hard_negatives=1,
+          hard_k=50, validation=0.2, workers=None, seed=42, dataset=None):
+    recommender = Recommender(cache_size=0) if recommender is None else recommender
+    names = list(MODEL_SPECS if names is None else names)
+    workers = workers or min(len(names), os.cpu_count() or 1)
+    timings = {}
+    start = time.perf_counter()
+
+    with instruments.timer('train.load') as stage:
+        recommender.warm(models=False)
+    timings['load_s'] = stage.seconds
+
+    with instruments.timer('train.sampling') as stage:
+        pos_users, pos_jobs = positive_pairs(recommender, recommender.interactions_df)
+        neg_users, neg_jobs = sample_negatives(recommender, pos_users, pos_jobs, negatives, hard_negatives, hard_k,
+                                               seed)
+        user_idx = np.concatenate([pos_users, neg_users])
+        job_idx = np.concatenate([pos_jobs, neg_jobs])
+        y = np.concatenate([np.ones(len(pos_users), dtype=np.int8), np.zeros(len(neg_users), dtype=np.int8)])
+    timings['sampling_s'] = stage.seconds
+
+    with instruments.timer('train.features') as stage:
+        X = recommender.pair_features(user_idx, job_idx)
+    timings['features_s'] = stage.seconds
+
+    # Validation par utilisateur : les paires d'un même utilisateur restent du même côté
+    rng = np.random.default_rng(seed)
+    held_out_users = rng.random(len(recommender.user_positions)) < validation
+    held_out = held_out_users[user_idx]
+    with instruments.timer('train.fit') as stage:
+        fitted = fit_models(X[~held_out], y[~held_out], names, workers)
+    timings['fit_wall_s'] = stage.seconds
+
+    from sklearn.metrics import roc_auc_score
+    models = {}
+    with instruments.timer('train.validate'):
+        for name, (estimator, seconds) in fitted.items():
+            report = {'fit_s': seconds, 'fit_rows_per_s': int((~held_out).sum()) / seconds if seconds > 0 else None}
+            if held_out.any() and len(np.unique(y[held_out])) == 2:
+                scores = estimator.predict_proba(pd.DataFrame(X[held_out], columns=FEATURE_COLUMNS))[:, 1]
+                report['validation_auc'] = float(roc_auc_score(y[held_out], scores))
+            models[name] = report
+    instruments.count('train.pairs', len(y))
+    timings['total_s'] = time.perf_counter() - start
+
+    checkpoint = interactions_checkpoint(recommender.interactions_df)
+    metadata = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'checkpoint': checkpoint,
+        'checkpoint_rows': checkpoint_rows(recommender.interactions_df, checkpoint),
+        'feature_columns': FEATURE_COLUMNS,
+        'dataset': dataset,
+        'pairs': {'positive': int(len(pos_users)), 'negative': int(len(neg_users)),
+                  'train': int((~held_out).sum()), 'validation': int(held_out.sum())},
+        'sampling': {'negatives_per_positive': negatives, 'hard_negatives_per_positive': hard_negatives,
+                     'hard_k': hard_k, 'seed': seed},
+        'params': {name: MODEL_SPECS[name][2] for name in names},
+        'workers': workers,
+        'timings': timings,
+        'throughput': {'feature_pairs_per_s': len(y) / timings['features_s'] if timings['features_s'] > 0 else None},
+        'models': models
+    }
+    with instruments.timer('train.publish'):
+        version = publish_version(artifacts_dir, {name: estimator for name, (estimator, _) in fitted.items()},
+                                  metadata)
+    metadata['version'] = version
+    return metadata
+
+
+# 5. Mise à jour incrémentale
+# ---------------------------
+# Seules les interactions postérieures au checkpoint de la dernière version
+# sont utilisées : régression logistique poursuivie par SGD (log-loss) à
+# partir de ses poids, arbres supplémentaires (warm_start) pour la forêt et
+# le gradient boosting, tours de boosting supplémentaires pour XGBoost.
+# Le coût d'une mise à jour dépend du volume de nouvelles données.
+
+def update_estimator(name, estimator, X, y, extra_estimators=10, extra_rounds=10, learning_rate=0.01):
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+    if isinstance(estimator, SGDClassifier):
+        estimator.partial_fit(X, y)
+    elif isinstance(estimator, LogisticRegression):
+        # Premier passage : SGD initialisé avec les poids de la régression
+        sgd = SGDClassifier(loss='log_loss', alpha=1.0 / (estimator.C * max(len(y), 1)),
+                            learning_rate='constant', eta0=learning_rate, max_iter=1, tol=None,
+                            random_state=42)
+        sgd.fit(X, y, coef_init=estimator.coef_, intercept_init=estimator.intercept_)
+        estimator = sgd
+    elif name == 'XGBoost':
+        params = estimator.get_params()
+        params['n_estimators'] = extra_rounds
+        booster = estimator.get_booster()
+        estimator = type(estimator)(**params)
+        estimator.fit(X, y, xgb_model=booster)
     else:
-        f1_score = 2 * (precision * recall) / (precision + recall)
-    
-    mrr = 0.0
-    for rank, job_id in enumerate(recommended_jobs['job_id'], 1):
-        if job_id in relevant_jobs:
-            mrr = 1.0 / rank
-            break
-    
-    ndcg = calculate_ndcg(recommended_jobs, relevant_jobs, top_n)
-    binary_accuracy = 1.0 if len(recommended_job_ids.intersection(relevant_jobs)) > 0 else 0.0
-    
-    return {
-        'precision@{}'.format(top_n): precision,
-        'recall@{}'.format(top_n): recall,
-        'f1_score@{}'.format(top_n): f1_score,
-        'mrr': mrr,
-        'ndcg@{}'.format(top_n): ndcg,
-        'binary_accuracy': binary_accuracy
+        estimator.set_params(warm_start=True, n_estimators=estimator.n_estimators + extra_estimators)
+        estimator.fit(X, y)
+    return estimator
+
+
+def update(recommender=None, artifacts_dir=DEFAULT_ARTIFACTS_DIR, since=None, names=None, negatives=4,
+           hard_negatives=1, hard_k=50, extra_estimators=10, extra_rounds=10, seed=42):
+    recommender = Recommender(cache_size=0) if recommender is None else recommender
+    base_version = latest_version(artifacts_dir)
+    if base_version is None:
+        raise FileNotFoundError(f"No published model version in {artifacts_dir}. Please run the training script first.")
+    base = read_metadata(artifacts_dir, base_version)
+    names = list(MODEL_SPECS if names is None else names)
+    timings = {}
+    start = time.perf_counter()
+
+    with instruments.timer('update.load') as stage:
+        recommender.warm(models=False)
+        interactions_df = recommender.interactions_df
+        checkpoint = since or base.get('checkpoint')
+        if checkpoint is None or 'timestamp' not in interactions_df.columns:
+            raise ValueError("Incremental updates need interaction timestamps and a checkpoint (see --since)")
+        timestamps = pd.to_datetime(interactions_df['timestamp'].astype(str))
+        fresh = (timestamps > pd.Timestamp(checkpoint)).to_numpy()
+        at_checkpoint = (timestamps == pd.Timestamp(checkpoint)).to_numpy()
+        # --since : à partir de cette date. Checkpoint d'une version : les
+        # interactions à sa date qu'elle n'a pas vues (les versions sans
+        # checkpoint_rows reprennent après leur checkpoint)
+        if since is not None:
+            fresh = fresh | at_checkpoint
+        elif base.get('checkpoint_rows') is not None:
+            seen = pd.MultiIndex.from_frame(interactions_df.loc[at_checkpoint, CHECKPOINT_KEY_COLUMNS].astype(str))
+            unseen = at_checkpoint.copy()
+            unseen[at_checkpoint] = ~seen.isin([tuple(row) for row in base['checkpoint_rows']])
+            fresh = fresh | unseen
+        new_interactions = interactions_df[fresh]
+    timings['load_s'] = stage.seconds
+    if new_interactions.empty:
+        print(f"No new interactions since {checkpoint}; {base_version} is up to date.")
+        return None
+
+    # Les négatifs excluent toutes les paires positives connues, pas seulement les nouvelles
+    with instruments.timer('update.features') as stage:
+        pos_users, pos_jobs = positive_pairs(recommender, new_interactions)
+        known = positive_pairs(recommender, interactions_df)
+        neg_users, neg_jobs = sample_negatives(recommender, pos_users, pos_jobs, negatives, hard_negatives, hard_k,
+                                               [seed, int(base_version[1:])], exclude=known)
+        user_idx = np.concatenate([pos_users, neg_users])
+        job_idx = np.concatenate([pos_jobs, neg_jobs])
+        y = np.concatenate([np.ones(len(pos_users), dtype=np.int8), np.zeros(len(neg_users), dtype=np.int8)])
+        X = pd.DataFrame(recommender.pair_features(user_idx, job_idx), columns=FEATURE_COLUMNS)
+    timings['features_s'] = stage.seconds
+
+    with instruments.timer('update.load_models'):
+        estimators = {name: joblib.load(path)
+                      for name, path in version_model_files(artifacts_dir, base_version).items()}
+    models = {}
+    for name in names:
+        with instruments.timer(f'update.fit:{name}') as stage:
+            estimators[name] = update_estimator(name, estimators[name], X, y, extra_estimators, extra_rounds)
+        seconds = stage.seconds
+        models[name] = {'update_s': seconds, 'update_rows_per_s': len(y) / seconds if seconds > 0 else None}
+    timings['total_s'] = time.perf_counter() - start
+
+    checkpoint = interactions_checkpoint(new_interactions)
+    metadata = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'base_version': base_version,
+        'incremental': True,
+        'checkpoint': checkpoint,
+        'checkpoint_rows': checkpoint_rows(interactions_df, checkpoint),
+        'feature_columns': FEATURE_COLUMNS,
+        'pairs': {'new_interactions': int(len(new_interactions)), 'positive': int(len(pos_users)),
+                  'negative': int(len(neg_users))},
+        'update': {'extra_estimators': extra_estimators, 'extra_rounds': extra_rounds, 'seed': seed},
+        'timings': timings,
+        'models': models
     }
+    with instruments.timer('update.publish'):
+        version = publish_version(artifacts_dir, estimators, metadata)
+    metadata['version'] = version
+    return metadata
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the recommendation models and publish a versioned artifact.")
+    parser.add_argument('--artifacts-dir', default=DEFAULT_ARTIFACTS_DIR)
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_SPECS), default=None)
+    parser.add_argument('--negatives', type=int, default=4, help="Random negatives per positive pair")
+    parser.add_argument('--hard-negatives', type=int, default=1, help="Hard negatives per positive pair")
+    parser.add_argument('--hard-k', type=int, default=50, help="Skill-nearest jobs considered as hard negatives")
+    parser.add_argument('--validation', type=float, default=0.2, help="Fraction of users held out")
+    parser.add_argument('--workers', type=int, default=None, help="Models fitted in parallel processes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Update the latest version with interactions newer than its checkpoint")
+    parser.add_argument('--since', default=None,
+                        help="Override the checkpoint: use interactions at or after this ISO timestamp")
+    parser.add_argument('--extra-estimators', type=int, default=10, help="Trees added to RF/GB per update")
+    parser.add_argument('--extra-rounds', type=int, default=10, help="Boosting rounds added to XGBoost per update")
+    parser.add_argument('--metrics-report', default=None, help="Write per-stage timings and counters to this JSON file")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Expose Prometheus metrics on http://0.0.0.0:PORT/metrics while training")
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+
+    try:
+        if args.incremental:
+            metadata = update(artifacts_dir=args.artifacts_dir, since=args.since, names=args.models,
+                              negatives=args.negatives, hard_negatives=args.hard_negatives, hard_k=args.hard_k,
+                              extra_estimators=args.extra_estimators, extra_rounds=args.extra_rounds,
+                              seed=args.seed)
+        else:
+            metadata = train(artifacts_dir=args.artifacts_dir, names=args.models, negatives=args.negatives,
+                             hard_negatives=args.hard_negatives, hard_k=args.hard_k, validation=args.validation,
+                             workers=args.workers, seed=args.seed)
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Please ensure the CSV files exist in the directory.")
+        exit(1)
+    if args.metrics_report is not None:
+        instruments.write_report(args.metrics_report, script='train_model',
+                                 version=None if metadata is None else metadata['version'])
+        print(f"Metrics report written to {args.metrics_report}")
+    if metadata is None:
+        exit(0)
 
-# Fonction pour évaluer tous les modèles
-def evaluate_model(n_users=20, top_n=5):
-    results = {}
-    for name, model in best_models.items():
-        print(f"\nEvaluating {name}...")
-        metrics_list = []
-        for user_id in users_df['id'].sample(n_users, random_state=42):
-            recommendations = recommend_jobs(model, user_id, top_n)
-            if not recommendations.empty and user_id == 'user_1':
-                print(f"\nUser: {user_id}")
-                print("Recommended jobs:")
-                print(recommendations[['job_id', 'title', 'category', 'location', 'score']])
-                print("-" * 50)
-            
-            metrics = evaluate_recommendations(model, user_id, top_n)
-            metrics['user_id'] = user_id
-            metrics_list.append(metrics)
-        
-        metrics_df = pd.DataFrame(metrics_list)
-        mean_metrics = metrics_df[[
-            f'precision@{top_n}', 
-            f'recall@{top_n}', 
-            f'f1_score@{top_n}', 
-            'mrr',
-            f'ndcg@{top_n}',
-            'binary_accuracy'
-        ]].mean().to_dict()
-        results[name] = mean_metrics
-    
-    # Comparer les résultats
-    print("\nComparison of Models:")
-    metrics_comparison = pd.DataFrame(results).T
-    print(metrics_comparison)
-    
-    # Afficher le meilleur modèle
-    best_model_name = metrics_comparison['precision@5'].idxmax()
-    print(f"\nBest Model: {best_model_name}")
+    print(f"\nPublished {metadata['version']} in {args.artifacts_dir}")
+    print(f"Pairs: {metadata['pairs']}")
+    print(f"Checkpoint: {metadata['checkpoint']}")
+    print("Timings: " + ", ".join(f"{k}={v:.2f}" for k, v in metadata['timings'].items()))
+    if 'throughput' in metadata:
+        print(f"Feature throughput: {metadata['throughput']['feature_pairs_per_s']:.0f} pairs/s")
+    print("\nModel results:")
+    print(pd.DataFrame(metadata['models']).T)